@@ -0,0 +1,5 @@
+SELECT w.word, t.total_freq, t.video_count
+FROM WordTotals t
+JOIN Words w ON t.word_id = w.word_id
+WHERE t.video_count <= 2 AND t.total_freq > 10
+ORDER BY t.total_freq DESC;
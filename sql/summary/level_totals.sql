@@ -0,0 +1,3 @@
+SELECT topik_level, total_freq, word_count
+FROM LevelTotals
+ORDER BY topik_level ASC;
@@ -0,0 +1,5 @@
+SELECT w.word, t.video_count
+FROM WordTotals t
+JOIN Words w ON t.word_id = w.word_id
+ORDER BY t.video_count DESC, t.word_id ASC
+LIMIT 20;
@@ -0,0 +1,5 @@
+SELECT w.topik_level, w.word, SUM(t.total_freq) as total_freq
+FROM WordTotals t
+JOIN Words w ON t.word_id = w.word_id
+GROUP BY w.topik_level, w.word
+ORDER BY w.topik_level ASC, total_freq DESC;
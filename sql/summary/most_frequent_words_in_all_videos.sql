@@ -0,0 +1,5 @@
+SELECT w.word, w.pos_tag, w.topik_level, t.total_freq
+FROM WordTotals t
+JOIN Words w ON t.word_id = w.word_id
+ORDER BY t.total_freq DESC, t.word_id ASC
+LIMIT 20;
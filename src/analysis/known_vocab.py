@@ -0,0 +1,235 @@
+'''
+rank videos for a learner by how much of them they already know.
+
+give it the learner's known words (word_ids, or a file of words) and it
+scores every video by the share of its tokens that are known, and lists
+the most frequent unknown words of each video.
+
+scoring runs on a sparse video x word count matrix (CSR arrays in numpy)
+built from WordFrequency, so a ranking is a couple of array operations
+rather than an SQL join. the matrix is cached on disk next to the tag
+cache and rebuilt only when the database's DataVersion has moved (i.e.
+after an ingest changed the counts). several learners can be scored in
+one call: their known words become rows of a boolean matrix.
+
+the denominator is the same as in profiles.py: matched + unmatched tokens
+of the video, so words outside the TOPIK lists count as unknown.
+
+known words file: one entry per line, either a word (every pos / level of
+it counts as known) or "word<TAB>pos_tag"; blank lines and # comments are
+skipped.
+
+python known_vocab.py --db ../database/korean_vocab.db --known-file known.txt
+python known_vocab.py --db ../database/korean_vocab.db --known-file a.txt --known-file b.txt --top 5
+'''
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+from database.data_version import data_version
+
+DEFAULT_MATRIX_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "video_word_matrix.npz"
+LEARNER_CHUNK = 64  # learners scored per pass, bounds the (learners x nonzeros) temp array
+
+
+class VideoWordMatrix:
+    """CSR counts: row r is video_ids[r], its words are word_ids[indices[indptr[r]:indptr[r+1]]]"""
+
+    def __init__(self, video_ids, video_names, word_ids, words, indptr, indices, data, denominators,
+                 version=(None, 0)):
+        self.video_ids = video_ids
+        self.video_names = video_names
+        self.word_ids = word_ids        # sorted, column -> word_id
+        self.words = words              # column -> "word (pos)"
+        self.indptr = indptr
+        self.indices = indices
+        self.data = data
+        self.denominators = denominators
+        self.version = version
+
+    @classmethod
+    def from_db(cls, conn):
+        videos = conn.execute("""
+            SELECT v.video_id, v.video_name,
+                   COALESCE(s.matched_tokens + s.unmatched_tokens, -1)
+            FROM Videos v
+            LEFT JOIN VideoTokenStats s ON s.video_id = v.video_id
+            ORDER BY v.video_id
+        """).fetchall()
+        video_ids = np.array([v[0] for v in videos], dtype=np.int64)
+        video_names = np.array([v[1] for v in videos], dtype=object)
+        denominators = np.array([v[2] for v in videos], dtype=np.float64)
+
+        counts = np.array(conn.execute("""
+            SELECT video_id, word_id, frequency FROM WordFrequency
+            ORDER BY video_id, word_id
+        """).fetchall(), dtype=np.int64).reshape(-1, 3)
+        rows = np.searchsorted(video_ids, counts[:, 0])
+        keep = rows < len(video_ids)
+        keep[keep] = video_ids[rows[keep]] == counts[keep, 0]
+        rows, counts = rows[keep], counts[keep]
+
+        word_ids = np.unique(counts[:, 1])
+        indices = np.searchsorted(word_ids, counts[:, 1])
+        data = counts[:, 2].astype(np.float64)
+        indptr = np.concatenate(([0], np.cumsum(np.bincount(rows, minlength=len(video_ids)))))
+
+        # videos without stats (older dbs): fall back to their matched tokens
+        row_sums = np.add.reduceat(data, indptr[:-1]) if len(data) else np.zeros(len(video_ids))
+        row_sums[indptr[:-1] == indptr[1:]] = 0
+        missing = denominators < 0
+        denominators[missing] = row_sums[missing]
+
+        labels = dict(
+            (word_id, f"{word} ({pos_tag})")
+            for word_id, word, pos_tag in conn.execute("SELECT word_id, word, pos_tag FROM Words"))
+        words = np.array([labels.get(int(w), str(w)) for w in word_ids], dtype=object)
+        return cls(video_ids, video_names, word_ids, words, indptr, indices, data, denominators,
+                   data_version(conn))
+
+    @classmethod
+    def load(cls, conn, cache_path=DEFAULT_MATRIX_PATH):
+        """the cached matrix if it matches the db's DataVersion, else rebuilt and cached"""
+        cache_path = Path(cache_path)
+        version = data_version(conn)
+        if cache_path.exists():
+            with np.load(cache_path, allow_pickle=True) as f:
+                if (str(f["db_instance"]), int(f["generation"])) == version:
+                    return cls(f["video_ids"], f["video_names"], f["word_ids"], f["words"],
+                               f["indptr"], f["indices"], f["data"], f["denominators"], version)
+        matrix = cls.from_db(conn)
+        matrix.save(cache_path)
+        return matrix
+
+    def save(self, cache_path=DEFAULT_MATRIX_PATH):
+        cache_path = Path(cache_path)
+        cache_path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = cache_path.with_name(cache_path.name + ".tmp.npz")
+        np.savez(tmp_path, video_ids=self.video_ids, video_names=self.video_names,
+                 word_ids=self.word_ids, words=self.words, indptr=self.indptr,
+                 indices=self.indices, data=self.data, denominators=self.denominators,
+                 db_instance=str(self.version[0]), generation=self.version[1])
+        tmp_path.replace(cache_path)
+
+    def known_mask(self, known_word_ids):
+        """boolean vector over the matrix columns"""
+        known = np.asarray(list(known_word_ids), dtype=np.int64)
+        return np.isin(self.word_ids, known)
+
+    def score(self, masks):
+        """known share per video for each learner: (n_learners, n_videos)"""
+        masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+        scores = np.zeros((len(masks), len(self.video_ids)))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for start in range(0, len(masks), LEARNER_CHUNK):
+                chunk = masks[start:start + LEARNER_CHUNK]
+                known_tokens = chunk[:, self.indices] * self.data
+                cum = np.concatenate((np.zeros((len(chunk), 1)), np.cumsum(known_tokens, axis=1)), axis=1)
+                per_video = cum[:, self.indptr[1:]] - cum[:, self.indptr[:-1]]
+                scores[start:start + LEARNER_CHUNK] = np.where(
+                    self.denominators > 0, per_video / self.denominators, 0.0)
+        return scores
+
+    def top_unknown(self, row, mask, n=5):
+        """[(word, count)] most frequent unknown words of the video in row"""
+        start, end = self.indptr[row], self.indptr[row + 1]
+        cols = self.indices[start:end]
+        counts = self.data[start:end]
+        unknown = ~mask[cols]
+        cols, counts = cols[unknown], counts[unknown]
+        order = np.argsort(-counts, kind="stable")[:n]
+        return [(self.words[c], int(k)) for c, k in zip(cols[order], counts[order])]
+
+    def rank(self, masks, top=None, unknown=5):
+        """for each learner: [{video_id, video_name, known_share, top_unknown}] best first"""
+        masks = np.atleast_2d(np.asarray(masks, dtype=bool))
+        scores = self.score(masks)
+        results = []
+        for mask, learner_scores in zip(masks, scores):
+            order = np.argsort(-learner_scores, kind="stable")
+            if top is not None:
+                order = order[:top]
+            results.append([
+                {
+                    "video_id": int(self.video_ids[row]),
+                    "video_name": self.video_names[row],
+                    "known_share": float(learner_scores[row]),
+                    "top_unknown": self.top_unknown(row, mask, unknown) if unknown else [],
+                }
+                for row in order
+            ])
+        return results
+
+
+def load_known_file(conn, path):
+    """word_ids for the entries of a known words file"""
+    by_word = {}
+    for word_id, word, pos_tag in conn.execute("SELECT word_id, word, pos_tag FROM Words"):
+        by_word.setdefault(word, []).append((pos_tag, word_id))
+
+    known = set()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if not line:
+                continue
+            word, _, pos_tag = line.partition("\t")
+            pos_tag = pos_tag.strip()
+            for entry_pos, word_id in by_word.get(word.strip(), []):
+                if not pos_tag or entry_pos == pos_tag:
+                    known.add(word_id)
+    return known
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank videos by the share of tokens a learner already knows.")
+    parser.add_argument("--db", default="../database/korean_vocab.db", help="Path to SQLite database")
+    parser.add_argument("--known-file", action="append", default=[],
+                        help="File of known words (repeat for several learners)")
+    parser.add_argument("--known-ids", action="append", default=[],
+                        help="Comma separated known word_ids (repeat for several learners)")
+    parser.add_argument("--top", type=int, default=10, help="Videos to show per learner")
+    parser.add_argument("--unknown", type=int, default=5, help="Unknown words to show per video")
+    parser.add_argument("--matrix-cache", default=DEFAULT_MATRIX_PATH, help="Where the matrix is cached")
+    args = parser.parse_args()
+
+    conn = connect_readonly(args.db)
+    try:
+        learners = [(path, load_known_file(conn, path)) for path in args.known_file]
+        learners += [(ids, {int(i) for i in ids.split(",") if i.strip()}) for ids in args.known_ids]
+        if not learners:
+            parser.error("give at least one --known-file or --known-ids")
+
+        t0 = time.perf_counter()
+        matrix = VideoWordMatrix.load(conn, args.matrix_cache)
+        t1 = time.perf_counter()
+    finally:
+        conn.close()
+
+    masks = np.array([matrix.known_mask(known) for _, known in learners])
+    rankings = matrix.rank(masks, top=args.top, unknown=args.unknown)
+    t2 = time.perf_counter()
+
+    for (name, known), ranking in zip(learners, rankings):
+        print(f"\n=== {name}: {len(known)} known words ===")
+        for entry in ranking:
+            unknown = ", ".join(f"{word} ×{count}" for word, count in entry["top_unknown"])
+            print(f"{entry['known_share']:7.1%}  [{entry['video_id']}] {entry['video_name']}")
+            if unknown:
+                print(f"         unknown: {unknown}")
+    print(f"\nmatrix: {len(matrix.video_ids)} videos x {len(matrix.word_ids)} words, "
+          f"{len(matrix.data)} nonzeros ({(t1 - t0) * 1000:.1f} ms to load), "
+          f"scored {len(learners)} learner(s) in {(t2 - t1) * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,416 @@
+'''
+local read-only http service over korean_vocab.db (stdlib only), so a
+query is a url instead of opening the db and pasting sql from sql/.
+
+  GET /queries                       names of the queries in sql/ and sql/summary/
+  GET /query/<name>                  run one (e.g. /query/summary/level_totals)
+  GET /word/<word>?pos=&examples=5   Words rows, totals, top videos and example lines
+  GET /kwic/<term>?limit=20          keyword in context over the subtitle text
+  GET /videos                        every video with its token stats
+  GET /video/<video_id>              one video: stats, TOPIK coverage, top words
+  GET /coverage?level=3&min=0.9      videos by coverage at a level (profiles.py)
+  GET /health                        data version, pool and cache counters
+
+every answer is json: {"columns": [...], "rows": [[...]]} for tables.
+
+requests run on threads (ThreadingHTTPServer) and borrow one of
+--pool-size read-only connections (mode=ro, query_only) instead of
+opening the db per request. the sql of every endpoint is a fixed string
+with parameters, so each pooled connection prepares a statement once and
+reuses it from its statement cache. a rebuild with --atomic or --fresh
+puts a new file at the path (os.replace / delete and create), which open
+connections would never see: every checkout compares the file's
+identity (device, inode) with the one its connection was opened on and
+reconnects if the file was replaced.
+
+answers are kept in an LRU cache (--cache-size entries) tagged with the
+file's identity and its DataVersion (db_instance, generation), which the schema
+triggers bump on every ingest: one indexed read per request tells
+whether the cache is still good, and it is dropped as soon as the data
+moved. concurrent requests for the same uncached answer wait for the
+first one instead of running the same aggregate side by side.
+
+python query_service.py --db ../database/korean_vocab.db
+curl 'http://127.0.0.1:8765/word/버리다?examples=3'
+'''
+
+import argparse
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.data_version import data_version
+from database.occurrences import examples, kwic, word_ids_for
+from database.profiles import videos_with_coverage
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "korean_vocab.db"
+SQL_DIR = Path(__file__).resolve().parent.parent.parent / "sql"
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+DEFAULT_POOL_SIZE = 8
+DEFAULT_CACHE_SIZE = 512
+STATEMENT_CACHE = 256  # prepared statements kept per connection
+MAX_LIMIT = 500
+
+
+class NotFound(Exception):
+    pass
+
+
+class BadRequest(Exception):
+    pass
+
+
+class ConnectionPool:
+    """size read-only connections to db_path, handed out one request at a time. a connection opened
+    on a file that has since been replaced at db_path is closed and reopened when it is handed out"""
+
+    def __init__(self, db_path, size=DEFAULT_POOL_SIZE):
+        self.db_path = Path(db_path)
+        if not self.db_path.exists():
+            raise FileNotFoundError(f"no database at {self.db_path}")
+        self.size = size
+        self.identity = self._file_identity()
+        self._idle = queue.LifoQueue()
+        for _ in range(size):
+            self._idle.put((self._connect(), self.identity))
+        self.waits = 0
+        self.reconnects = 0
+
+    def _file_identity(self):
+        st = os.stat(self.db_path)
+        return st.st_dev, st.st_ino
+
+    def current_identity(self):
+        """identity of the file at db_path now (the last one seen while it is briefly missing)"""
+        try:
+            self.identity = self._file_identity()
+        except FileNotFoundError:
+            pass
+        return self.identity
+
+    def _connect(self):
+        conn = sqlite3.connect(f"{self.db_path.resolve().as_uri()}?mode=ro", uri=True,
+                               check_same_thread=False, cached_statements=STATEMENT_CACHE)
+        conn.execute("PRAGMA query_only = ON")
+        return conn
+
+    @contextmanager
+    def connection(self):
+        """(conn, identity of the file it reads)"""
+        try:
+            conn, identity = self._idle.get_nowait()
+        except queue.Empty:
+            self.waits += 1
+            conn, identity = self._idle.get()
+        try:
+            current = self.current_identity()
+            if identity != current:
+                # the db was swapped under us: conn still reads the old, unlinked file. identity
+                # stays None until it is reopened, so a failed reconnect is retried next time
+                conn.close()
+                identity = None
+                conn = self._connect()
+                identity = current
+                self.reconnects += 1
+            yield conn, identity
+        finally:
+            self._idle.put((conn, identity))
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait()[0].close()
+
+
+class ResultCache:
+    """LRU of encoded answers, emptied whenever the database version changes"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.version = None
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self._entries = OrderedDict()
+        self._inflight = {}  # key -> Event set when the first request for it is done
+        self._lock = threading.Lock()
+
+    def get_or_compute(self, version, key, compute):
+        """the cached answer for key, or compute() once while other callers for key wait"""
+        while True:
+            with self._lock:
+                if version != self.version:
+                    if self.version is not None:
+                        self.invalidations += 1
+                    self._entries.clear()
+                    self.version = version
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return self._entries[key]
+                event = self._inflight.get(key)
+                if event is None:
+                    event = self._inflight[key] = threading.Event()
+                    self.misses += 1
+                    break
+            event.wait()  # somebody else is computing it, then look again
+
+        try:
+            value = compute()
+            with self._lock:
+                if version == self.version and self.max_entries > 0:
+                    self._entries[key] = value
+                    if len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            return value
+        finally:
+            with self._lock:
+                del self._inflight[key]
+            event.set()
+
+    def stats(self):
+        with self._lock:
+            return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses,
+                    "invalidations": self.invalidations}
+
+
+def sql_queries(sql_dir=SQL_DIR):
+    """{"most_common_words_all": sql, "summary/level_totals": sql, ...}"""
+    sql_dir = Path(sql_dir)
+    return {path.relative_to(sql_dir).with_suffix("").as_posix(): path.read_text(encoding="utf-8")
+            for path in sorted(sql_dir.rglob("*.sql"))}
+
+
+def table(cursor):
+    return {"columns": [column[0] for column in cursor.description], "rows": [list(row) for row in cursor]}
+
+
+def _int(params, name, default, low=0, high=MAX_LIMIT):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise BadRequest(f"{name} must be a number")
+    return max(low, min(high, value))
+
+
+def _float(params, name, default):
+    try:
+        return float(params.get(name, default))
+    except ValueError:
+        raise BadRequest(f"{name} must be a number")
+
+
+class QueryService:
+    """the endpoints, as plain functions of (conn, path argument, params)"""
+
+    def __init__(self, db_path=DB_PATH, pool_size=DEFAULT_POOL_SIZE, cache_size=DEFAULT_CACHE_SIZE,
+                 sql_dir=SQL_DIR):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.cache = ResultCache(cache_size)
+        self.queries = sql_queries(sql_dir)
+        self.routes = {
+            "queries": self.list_queries,
+            "query": self.run_query,
+            "word": self.word,
+            "kwic": self.kwic,
+            "videos": self.videos,
+            "video": self.video,
+            "coverage": self.coverage,
+        }
+
+    def close(self):
+        self.pool.close()
+
+    def handle(self, path, params):
+        """(status, json bytes) for one GET"""
+        route, _, arg = path.strip("/").partition("/")
+        arg = unquote(arg)
+        params = {name: values[-1] for name, values in params.items()}
+        try:
+            if route == "health":
+                return 200, self._encode(self.health())
+            endpoint = self.routes.get(route)
+            if endpoint is None:
+                raise NotFound(f"no endpoint /{route}")
+            key = (route, arg, tuple(sorted(params.items())))
+            with self.pool.connection() as (conn, identity):
+                version = (identity, data_version(conn))
+                return 200, self.cache.get_or_compute(
+                    version, key, lambda: self._encode(endpoint(conn, arg, params)))
+        except NotFound as e:
+            return 404, self._encode({"error": str(e)})
+        except BadRequest as e:
+            return 400, self._encode({"error": str(e)})
+        except sqlite3.Error as e:
+            return 500, self._encode({"error": f"database error: {e}"})
+
+    @staticmethod
+    def _encode(obj):
+        return json.dumps(obj, ensure_ascii=False).encode("utf-8")
+
+    def health(self):
+        with self.pool.connection() as (conn, identity):
+            instance, generation = data_version(conn)
+        return {"db_instance": instance, "generation": generation, "inode": identity[1],
+                "pool": {"size": self.pool.size, "waits": self.pool.waits, "reconnects": self.pool.reconnects},
+                "cache": self.cache.stats()}
+
+    # endpoints
+
+    def list_queries(self, conn, arg, params):
+        return {"queries": list(self.queries)}
+
+    def run_query(self, conn, name, params):
+        sql = self.queries.get(name)
+        if sql is None:
+            raise NotFound(f"no query {name!r} in sql/")
+        return table(conn.execute(sql))
+
+    def word(self, conn, word, params):
+        if not word:
+            raise BadRequest("/word/<word>")
+        pos_tag = params.get("pos")
+        word_ids = word_ids_for(conn, word, pos_tag)
+        if not word_ids:
+            raise NotFound(f"{word} is not in the lexicon")
+        marks = ",".join("?" * len(word_ids))
+        entries = table(conn.execute(f"""
+            SELECT w.word_id, w.word, w.pos_tag, w.topik_level, w.homonym,
+                   COALESCE(t.total_freq, 0) AS total_freq, COALESCE(t.video_count, 0) AS video_count
+            FROM Words w LEFT JOIN WordTotals t ON t.word_id = w.word_id
+            WHERE w.word_id IN ({marks})
+            ORDER BY w.topik_level, w.pos_tag
+        """, word_ids))
+        videos = table(conn.execute(f"""
+            SELECT v.video_id, v.video_name, SUM(wf.frequency) AS frequency
+            FROM WordFrequency wf JOIN Videos v ON v.video_id = wf.video_id
+            WHERE wf.word_id IN ({marks})
+            GROUP BY v.video_id
+            ORDER BY frequency DESC, v.video_id
+            LIMIT ?
+        """, word_ids + [_int(params, "videos", 10)]))
+        lines = examples(conn, word_ids, limit=_int(params, "examples", 5),
+                         per_video=_int(params, "per_video", 2, low=1))
+        return {"word": word, "entries": entries, "videos": videos,
+                "examples": {"columns": ["video_name", "subtitle_index", "start_ms", "end_ms", "text"],
+                             "rows": [list(row) for row in lines]}}
+
+    def kwic(self, conn, term, params):
+        if not term:
+            raise BadRequest("/kwic/<term>")
+        rows = kwic(conn, term, limit=_int(params, "limit", 20), prefix=params.get("exact") is None)
+        return {"columns": ["video_name", "start_ms", "left", "keyword", "right"],
+                "rows": [list(row) for row in rows]}
+
+    def videos(self, conn, arg, params):
+        return table(conn.execute("""
+            SELECT v.video_id, v.video_name, v.category, s.total_tokens, s.matched_tokens,
+                   s.unmatched_tokens, s.unmatched_types
+            FROM Videos v LEFT JOIN VideoTokenStats s ON s.video_id = v.video_id
+            ORDER BY v.video_id
+        """))
+
+    def video(self, conn, arg, params):
+        try:
+            video_id = int(arg)
+        except ValueError:
+            raise BadRequest("/video/<video_id>")
+        row = conn.execute("""
+            SELECT v.video_id, v.video_name, v.category, s.total_tokens, s.matched_tokens,
+                   s.ignored_tokens, s.unmatched_tokens, s.unmatched_types
+            FROM Videos v LEFT JOIN VideoTokenStats s ON s.video_id = v.video_id
+            WHERE v.video_id = ?
+        """, (video_id,))
+        video = table(row)
+        if not video["rows"]:
+            raise NotFound(f"no video {video_id}")
+        coverage = table(conn.execute("""
+            SELECT topik_level, token_coverage, type_coverage FROM VideoCoverage
+            WHERE video_id = ? ORDER BY topik_level
+        """, (video_id,)))
+        top_words = table(conn.execute("""
+            SELECT w.word, w.pos_tag, w.topik_level, wf.frequency
+            FROM WordFrequency wf JOIN Words w ON w.word_id = wf.word_id
+            WHERE wf.video_id = ?
+            ORDER BY wf.frequency DESC, w.word_id
+            LIMIT ?
+        """, (video_id, _int(params, "top", 20))))
+        return {"video": dict(zip(video["columns"], video["rows"][0])), "coverage": coverage,
+                "top_words": top_words}
+
+    def coverage(self, conn, arg, params):
+        by = params.get("by", "token")
+        if by not in ("token", "type"):
+            raise BadRequest("by is token or type")
+        rows = videos_with_coverage(conn, _int(params, "level", 3, low=1, high=6),
+                                    _float(params, "min", 0.9), by)
+        return {"columns": ["video_id", "video_name", f"{by}_coverage"], "rows": [list(row) for row in rows]}
+
+
+def make_handler(service):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, so a client can reuse its connection
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            status, body = service.handle(url.path, parse_qs(url.query))
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # one line per request is too much at hundreds of requests a second
+
+    return Handler
+
+
+class QueryServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256  # listen backlog, for bursts of concurrent clients
+
+
+def serve(db_path=DB_PATH, host=DEFAULT_HOST, port=DEFAULT_PORT, pool_size=DEFAULT_POOL_SIZE,
+          cache_size=DEFAULT_CACHE_SIZE):
+    service = QueryService(db_path, pool_size, cache_size)
+    server = QueryServer((host, port), make_handler(service))
+    print(f"🌐 serving {db_path} on http://{host}:{server.server_port} "
+          f"({pool_size} connections, {cache_size} cached answers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        print(f"🗃️ Result cache: {service.cache.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Read-only HTTP query service over the vocab database.")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Database to serve")
+    parser.add_argument("--host", default=DEFAULT_HOST, help=f"Address to listen on (default {DEFAULT_HOST})")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"Port (default {DEFAULT_PORT})")
+    parser.add_argument("--pool-size", type=int, default=DEFAULT_POOL_SIZE,
+                        help="Read-only database connections shared by the request threads")
+    parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                        help="Answers kept in the result cache (0 = no cache)")
+    args = parser.parse_args()
+    serve(args.db, args.host, args.port, args.pool_size, args.cache_size)
+
+
+if __name__ == "__main__":
+    main()
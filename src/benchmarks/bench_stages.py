@@ -0,0 +1,276 @@
+'''
+stage-level benchmark over the bundled raw/ corpus.
+
+times each stage of the build on its own, in this process:
+
+  parse    subtitle files -> subtitle dicts (pipeline/subtitle_reader.py)
+  tag      subtitle dicts -> tagged dicts, no tag cache (--tagger stub, okt or fast)
+  match    tagged dicts -> TokenCounts against the lexicon (process_tokens.py)
+  resolve  the same with the fuzzy resolver for the misses (resolver.py),
+           starting from an empty memo; resolve_index is building its index
+  insert   Videos / WordFrequency / stats / lines / profiles into a scratch db,
+           then the end-of-build indexes and ANALYZE
+  query:*  every query in sql/ and sql/summary/ against that db
+
+each stage reports seconds, lines/sec and tokens/sec, and the process's
+peak RSS once the stage is done. results are written as JSON; with a
+baseline (--baseline, default benchmarks/baseline.json when it exists)
+every stage is compared to it and the run fails (exit 1) when one got
+slower than the baseline by more than --threshold.
+
+the stub tagger splits on hangul / latin / digit / punctuation runs and
+calls every hangul run a Noun: nothing like Okt's output, but it runs
+without a jvm and exercises the rest of the pipeline at full size.
+
+python benchmarks/bench_stages.py --save-baseline        # record a baseline
+python benchmarks/bench_stages.py                        # compare against it
+python benchmarks/bench_stages.py --tagger okt --output okt_run.json
+'''
+
+import argparse
+import json
+import platform
+import re
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.subtitle_reader import find_subtitle_files
+from pipeline.srt_to_json import iter_subtitles, tag_subtitles
+from pipeline.instrumentation import peak_rss_mb
+from pipeline.taggers import make_tagger as make_backend
+from database.init_db import apply_schema
+from database.insert_words import insert_words
+from database.lexicon import load_lexicon
+from database.resolver import FuzzyResolver
+from database.process_tokens import count_tokens, write_counts, write_token_stats
+from database.occurrences import write_lines
+from database.profiles import update_profiles
+from database.bulk_load import connect_for_build, finish_build
+
+REPO_DIR = Path(__file__).resolve().parent.parent.parent
+RAW_DIR = REPO_DIR / "raw"
+SQL_DIRS = (REPO_DIR / "sql", REPO_DIR / "sql" / "summary")
+DEFAULT_BASELINE = Path(__file__).resolve().parent / "baseline.json"
+DEFAULT_THRESHOLD = 0.20
+# timings this close to the baseline never count as a regression, whatever the ratio
+NOISE_FLOOR = 0.010
+
+
+class StubTagger:
+    """Okt-shaped tagger that needs no jvm"""
+
+    TOKEN = re.compile(r"[가-힣]+|[A-Za-z]+|\d+|[^\s\w]")
+
+    def pos(self, text, stem=False, norm=False, join=False):
+        tags = []
+        for token in self.TOKEN.findall(text):
+            if "가" <= token[0] <= "힣":
+                tags.append((token, "Noun"))
+            elif token.isalpha():
+                tags.append((token, "Alpha"))
+            elif token.isdigit():
+                tags.append((token, "Number"))
+            else:
+                tags.append((token, "Punctuation"))
+        return tags
+
+
+def make_tagger(name):
+    if name == "stub":
+        return StubTagger()
+    tagger = make_backend(name)
+    tagger.warm_up()  # load the dictionaries outside the timed stage
+    return tagger
+
+
+def stage_result(seconds, lines=0, tokens=0):
+    return {
+        "seconds": seconds,
+        "lines": lines,
+        "tokens": tokens,
+        "lines_per_sec": lines / seconds if seconds and lines else None,
+        "tokens_per_sec": tokens / seconds if seconds and tokens else None,
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+
+def best_of(repeat, fn):
+    """(fastest wall time, last result) of repeat calls"""
+    best = None
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def run(tagger_name="stub", repeat=3, limit_files=None, query_repeat=5):
+    files = find_subtitle_files(RAW_DIR)
+    if limit_files:
+        files = files[:limit_files]
+    stages = {}
+
+    # parse
+    seconds, parsed = best_of(repeat, lambda: [list(iter_subtitles(path)) for path in files])
+    line_count = sum(len(subs) for subs in parsed)
+    stages["parse"] = stage_result(seconds, line_count)
+
+    # tag (once: with okt this is the slow one)
+    tagger = make_tagger(tagger_name)
+    seconds, tagged = best_of(1, lambda: [list(tag_subtitles([dict(s) for s in subs], tagger)) for subs in parsed])
+    token_count = sum(len(entry["filtered"]) for entries in tagged for entry in entries)
+    stages["tag"] = stage_result(seconds, line_count, token_count)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        conn = connect_for_build(Path(tmp) / "bench.db")
+        try:
+            apply_schema(conn)
+            with conn:
+                insert_words(conn)
+            lexicon = load_lexicon(conn)
+
+            # match
+            seconds, counts = best_of(repeat, lambda: [count_tokens(entries, lexicon, keep_lines=True)
+                                                        for entries in tagged])
+            stages["match"] = stage_result(seconds, line_count, token_count)
+
+            seconds, resolver = best_of(1, lambda: FuzzyResolver(lexicon))
+            stages["resolve_index"] = stage_result(seconds)
+
+            def resolve():
+                resolver.clear()
+                return [count_tokens(entries, lexicon, keep_lines=True, resolver=resolver) for entries in tagged]
+            seconds, _ = best_of(repeat, resolve)
+            stages["resolve"] = stage_result(seconds, line_count, token_count)
+
+            # insert, the way build_database.load_counts does it
+            def insert():
+                for path, video_counts in zip(files, counts):
+                    with conn:
+                        video_id = conn.execute("INSERT INTO Videos (video_name, category) VALUES (?, ?)",
+                                                (path.stem, path.parent.name)).lastrowid
+                        write_counts(conn, video_id, video_counts)
+                        write_token_stats(conn, video_id, video_counts)
+                        write_lines(conn, video_id, video_counts)
+                        update_profiles(conn, [video_id])
+                finish_build(conn)
+            seconds, _ = best_of(1, insert)
+            stages["insert"] = stage_result(seconds, line_count, token_count)
+
+            # queries
+            for sql_dir in SQL_DIRS:
+                for sql_path in sorted(sql_dir.glob("*.sql")):
+                    sql = sql_path.read_text(encoding="utf-8")
+                    seconds, rows = best_of(query_repeat, lambda: conn.execute(sql).fetchall())
+                    result = stage_result(seconds)
+                    result["rows"] = len(rows)
+                    stages[f"query:{sql_path.relative_to(REPO_DIR).as_posix()}"] = result
+        finally:
+            conn.close()
+
+    return {
+        "meta": {
+            "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "sqlite": sqlite3.sqlite_version,
+            "tagger": tagger_name,
+            "files": len(files),
+            "lines": line_count,
+            "tokens": token_count,
+            "repeat": repeat,
+        },
+        "stages": stages,
+    }
+
+
+def compare(results, baseline, threshold=DEFAULT_THRESHOLD, noise_floor=NOISE_FLOOR):
+    """[(stage, baseline_seconds, seconds, ratio, regressed)] for the stages both runs have"""
+    rows = []
+    for stage, result in results["stages"].items():
+        base = baseline["stages"].get(stage)
+        if base is None:
+            continue
+        ratio = result["seconds"] / base["seconds"] if base["seconds"] else float("inf")
+        regressed = ratio > 1 + threshold and result["seconds"] - base["seconds"] > noise_floor
+        rows.append((stage, base["seconds"], result["seconds"], ratio, regressed))
+    return rows
+
+
+def comparable(results, baseline):
+    """why two runs can't be compared, or None"""
+    for key in ("tagger", "files", "lines"):
+        if results["meta"].get(key) != baseline["meta"].get(key):
+            return f"{key} differs ({baseline['meta'].get(key)} in the baseline, {results['meta'].get(key)} now)"
+    return None
+
+
+def print_results(results):
+    meta = results["meta"]
+    print(f"=== {meta['files']} files, {meta['lines']} lines, {meta['tokens']} tokens, tagger={meta['tagger']} ===")
+    for stage, r in results["stages"].items():
+        rates = []
+        if r["lines_per_sec"]:
+            rates.append(f"{r['lines_per_sec']:>11,.0f} lines/s")
+        if r["tokens_per_sec"]:
+            rates.append(f"{r['tokens_per_sec']:>11,.0f} tokens/s")
+        if "rows" in r:
+            rates.append(f"{r['rows']} rows")
+        print(f"{stage:<55} {r['seconds'] * 1000:>10.1f} ms  {'  '.join(rates):<40} peak {r['peak_rss_mb']:.0f} MB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time each pipeline stage over raw/ and compare to a baseline.")
+    parser.add_argument("--tagger", choices=("stub", "okt", "fast"), default="stub",
+                        help="stub needs no jvm (default), okt times the real tagger, fast the lexicon tagger")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs of parse / match, fastest counts")
+    parser.add_argument("--limit-files", type=int, help="Only the first N files")
+    parser.add_argument("--output", type=Path, help="Write the results JSON here")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare to")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed slowdown per stage before failing (default 0.20 = 20%%)")
+    parser.add_argument("--noise-floor", type=float, default=NOISE_FLOOR,
+                        help="Slowdowns under this many seconds never fail (default 0.010)")
+    args = parser.parse_args()
+
+    results = run(args.tagger, args.repeat, args.limit_files)
+    print_results(results)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"📝 results written to {args.output}")
+
+    if args.save_baseline:
+        args.baseline.write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"📌 baseline saved to {args.baseline}")
+        return
+    if not args.baseline.exists():
+        print(f"(no baseline at {args.baseline}, run with --save-baseline to record one)")
+        return
+
+    baseline = json.loads(args.baseline.read_text(encoding="utf-8"))
+    reason = comparable(results, baseline)
+    if reason:
+        print(f"⚠️ not comparing to {args.baseline}: {reason}")
+        return
+    rows = compare(results, baseline, args.threshold, args.noise_floor)
+    regressions = [row for row in rows if row[4]]
+    print(f"\n=== against {args.baseline} ({baseline['meta']['created']}), threshold {args.threshold:.0%} ===")
+    for stage, base, now, ratio, regressed in rows:
+        mark = "❌" if regressed else "✅"
+        print(f"{mark} {stage:<55} {base * 1000:>10.1f} -> {now * 1000:>10.1f} ms ({ratio - 1:+.0%})")
+    if regressions:
+        print(f"❌ {len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,19 +1,62 @@
 '''
-the quick and dirty wrapper to subprocess call to each script
-- initializes database and tables
-- populates words table
-- for srt files in /raw/, process them into jsonl
-- for jsonl files in /json/ add an entry to the video table
-- for jsonl files in /json/ insert words into frequency table
+initialize and populate the database in one command
+- initializes database and tables, populates words table (from the
+  compiled topik snapshot, database/lexicon_snapshot.py)
+- for subtitle files in /raw/ (.srt, .vtt, .ass): drop boilerplate
+  (pipeline/boilerplate.py), tag and count their tokens on a pool of
+  worker processes while one writer thread loads the results
+- each video (Videos row, counts, lines, stats, coverage, pace, manifest
+  entry) goes in under one savepoint
+- files whose hash and tagger match the BuildManifest are skipped
+- --sharded: one db per series, built in parallel and merged (database/shards.py)
+- every run is timed into a report (database/build_runs.py)
+
+python build_database.py
+python build_database.py --fresh --atomic
+python build_database.py --sharded --series drama/Coffee_Prince
 '''
-import sqlite3
-import subprocess
 import sys
+import time
 import logging
+import argparse
+import cProfile
+import hashlib
+import io
+import multiprocessing
+import pstats
+import subprocess
+import traceback
+from collections import Counter
 from pathlib import Path
-from contextlib import contextmanager
 import os
 
+from pipeline.srt_to_json import iter_subtitles, tag_subtitles, tee_jsonl, open_tag_cache, tagger_version
+from pipeline.taggers import TAGGERS, DEFAULT_TAGGER, DEFAULT_BATCH_SIZE, make_tagger
+from pipeline.tag_cache import DEFAULT_CACHE_PATH, DEFAULT_MAX_ENTRIES
+from pipeline.token_store import tee_token_store, SUFFIX as TOKENS_SUFFIX
+from pipeline.subtitle_reader import find_subtitle_files
+from pipeline.instrumentation import StageClock, peak_rss_mb, reset_peak_rss, rss_mb, timed
+from pipeline.boilerplate import DEFAULT_FILTER_PATH, count_cues, load_filter, load_keep, save_filter, scan as scan_boilerplate
+from pipeline.scheduler import Writer, run_overlapped, ignore_sigint, COMMIT_EVERY
+from database.process_tokens import count_tokens, write_counts, write_token_stats, write_oov
+from database.lexicon import load_lexicon
+from database.lexicon_snapshot import load_snapshot, snapshot_for
+from database.resolver import FuzzyResolver, MIN_CONFIDENCE, resolution_rate, write_resolutions
+from database.init_db import apply_schema
+from database.insert_words import insert_words
+from database.user_lexicon import sync_user_words, user_entries
+from database.aggregates import ensure_aggregates
+from database.profiles import update_profiles
+from database.pace import update_pace, update_series
+from database.occurrences import LineSpool, write_lines, delete_lines
+from database.build_runs import RunReport
+from database.shards import series_of, shard_path, merge_shard, LexiconMismatch
+from database.bulk_load import (
+    connect_for_build, finish_build, build_target, savepoint,
+    DEFAULT_SYNCHRONOUS, DEFAULT_CACHE_SIZE, DEFAULT_TEMP_STORE,
+    SYNCHRONOUS_MODES, TEMP_STORE_MODES,
+)
+
 #BASE_DIR = Path(__file__).resolve().parent
 #RAW_DIR = BASE_DIR / Path("../raw").resolve()
 #DB_PATH = BASE_DIR / "database/korean_vocab.db"
@@ -25,128 +68,809 @@ PIPELINE_DIR = BASE_DIR / "pipeline"        # src/pipeline/
 
 RAW_DIR = BASE_DIR.parent / "raw"      # subtitle-studytool/raw/
 JSON_DIR = BASE_DIR.parent / "json"    # subtitle-studytool/json/
+TOKENS_DIR = BASE_DIR.parent / "tokens"  # subtitle-studytool/tokens/
 DB_PATH = DATABASE_DIR / "korean_vocab.db"  # src/database/korean_vocab.db (or wherever db is)
+LOG_DIR = Path("logs")
+SHARD_DIR = BASE_DIR.parent / "shards"  # subtitle-studytool/shards/, one db per series
+SHARD_POLL_SECONDS = 0.5
+
+
+def insert_video_and_get_id(conn, name, category):
+  """does not commit, the caller owns the transaction"""
+  logging.info(f" - inserting video: {name}, {category}")
+  cursor = conn.execute(
+        "INSERT INTO Videos (video_name, category) VALUES (?, ?)", (name, category)
+  )
+  return cursor.lastrowid
+
+
+# one tagger, tag cache connection and lexicon per worker process, created
+# once and kept for the lifetime of the pool
+_tagger_name = DEFAULT_TAGGER
+_tagger_options = {}
+_tagger = None
+_cache = None
+_lexicon = None
+_resolver = None
+_line_filter = None
+
 
+def _get_tagger():
+  global _tagger
+  if _tagger is None:
+    _tagger = make_tagger(_tagger_name, **_tagger_options)
+    _tagger.warm_up()  # first call loads the dictionaries
+  return _tagger
 
-@contextmanager
-def pushd(new_dir):
-  """temporarily change working dir"""
-  prev_dir = Path.cwd()
-  os.chdir(new_dir)
+
+def _init_worker(lexicon, tagger_name=DEFAULT_TAGGER, tagger_options=None, cache_path=None,
+                 cache_size=DEFAULT_MAX_ENTRIES, min_confidence=None, line_filter=None):
+  """pool initializer: keep the lexicon (a Lexicon, or the path of its compiled snapshot and the
+  user lexicon entries to add to it), index it for the resolver (min_confidence=None: no
+  resolver), keep the boilerplate filter (None: none), open the tag cache and warm up the
+  worker's tagger"""
+  global _cache, _lexicon, _resolver, _line_filter, _tagger_name, _tagger_options
+  ignore_sigint()  # Ctrl-C is handled by the main process
+  if isinstance(lexicon, tuple):
+    path, extra = lexicon
+    _lexicon = load_snapshot(path).lexicon(extra)
+  else:
+    _lexicon = lexicon
+  if min_confidence is not None:
+    _resolver = FuzzyResolver(_lexicon, min_confidence)
+  _line_filter = line_filter
+  _tagger_name = tagger_name
+  _tagger_options = tagger_options or {}
+  if cache_path is not None and TAGGERS[tagger_name].cacheable:
+    _cache = open_tag_cache(make_tagger(tagger_name), path=cache_path, max_entries=cache_size)
   try:
-    yield
-  finally:
-    os.chdir(prev_dir)
-
-
-def run_script(script_path: str):
-  script_path = (BASE_DIR / script_path).resolve()
-  script_dir = script_path.parent
-  if not script_dir.exists():
-    raise FileNotFoundError(f"Script dir not found: {script_dir}")
-  print(f"Running {script_path.name} in {script_dir}")
-  with pushd(script_dir):
-    subprocess.run([sys.executable, script_path.name], check=True)
-  
-  logging.info(f"> running {script_path.name} in {script_dir} ...")
-  
-  with pushd(script_dir):
-    try:
-      subprocess.run([sys.executable, script_path.name], check=True)
-    except subprocess.CalledProcessError as e:
-      logging.error(f" X Script {script_path.name} failed with exit code {e.returncode}")
-      sys.exit(e.returncode)
+    _get_tagger()
+  except Exception:
+    # leave it to the first job, so the error is reported against a file
+    pass
+
+
+def _drop_boilerplate(entries, srt_path):
+  """LineFilter.drop, counting the cues on the first next() so the clock times it too"""
+  yield from _line_filter.drop(entries, count_cues(srt_path))
+
+
+def _ingest_srt(job):
+  """worker: srt -> TokenCounts (and the .tok / jsonl if asked for).
 
-def run_command(args: list, cwd: Path = None):
-  logging.info(f"▶️ Running: {' '.join(map(str, args))}")
+  never raises, errors are sent back as text. also returns this file's
+  metrics: stage timings, tag cache hits/misses, boilerplate lines dropped
+  and memory: the peak RSS while this file was processed (the worker's
+  lifetime peak where the high-water mark can't be reset, see
+  "peak_rss_scope") and the RSS before and after it.
+  """
+  per_video = reset_peak_rss()
+  rss_start = rss_mb()
+  hits, misses = (_cache.hits, _cache.misses) if _cache is not None else (0, 0)
+  dropped = _line_filter.dropped if _line_filter is not None else 0
+  tagger_stats = dict(_tagger.stats) if _tagger is not None else {}
+  clock = StageClock()
+  counts = error = lines = None
   try:
-    subprocess.run(args, check=True, cwd=cwd)
-  except subprocess.CalledProcessError as e:
-    logging.error(f"❌ Command failed with exit code {e.returncode}")
-    sys.exit(e.returncode)
+    # the kept lines go to a temp file as they come, the writer reads them back
+    lines = LineSpool()
+    entries = clock.wrap("parse", iter_subtitles(job["srt_path"]))
+    if _line_filter is not None:
+      entries = clock.wrap("boilerplate", _drop_boilerplate(entries, job["srt_path"]))
+    entries = clock.wrap("tag", tag_subtitles(entries, _get_tagger(), _cache))
+    if job["tokens_path"] is not None:
+      meta = {"video_name": job["video_name"], "source": job["source"], "tagger_version": job["tagger_version"]}
+      entries = clock.wrap("write_tokens", tee_token_store(entries, job["tokens_path"], meta))
+    if job["json_path"] is not None:
+      with open(job["json_path"], "w", encoding="utf-8") as fout:
+        entries = clock.wrap("write_jsonl", tee_jsonl(entries, fout))
+        counts = clock.call("match", count_tokens, entries, _lexicon, keep_lines=lines, resolver=_resolver)
+    else:
+      counts = clock.call("match", count_tokens, entries, _lexicon, keep_lines=lines, resolver=_resolver)
+    if _cache is not None:
+      _cache.flush()
+  except Exception:
+    counts, error = None, traceback.format_exc()
+    if lines is not None:
+      lines.discard()
+  if _cache is not None:
+    hits, misses = _cache.hits - hits, _cache.misses - misses
+  rss_end = rss_mb()
+  metrics = {
+      "stages": clock.stages(),
+      "tag_cache": {"hits": hits, "misses": misses},
+      "boilerplate": _line_filter.dropped - dropped if _line_filter is not None else 0,
+      "tagger": {key: n - tagger_stats.get(key, 0) for key, n in _tagger.stats.items()} if _tagger else {},
+      # VmHWM is updated lazily, so it can trail the samples taken around it
+      "peak_rss_mb": round(max(peak_rss_mb(), rss_start or 0, rss_end or 0), 1),
+      "peak_rss_scope": "video" if per_video else "worker",
+      "rss_mb": {"start": _round_mb(rss_start), "end": _round_mb(rss_end)},
+  }
+  return job, counts, error, metrics
 
 
-def insert_video_and_get_id(conn, name, category):
-  logging.info(f" - inserting video: {name}, {category}")
-  cursor = conn.cursor()
-  cursor.execute(
-        "INSERT INTO Videos (video_name, category) VALUES (?, ?)", (name, category)
-  )
-  conn.commit()
-  cursor.execute(
-        "SELECT video_id FROM Videos WHERE video_name = ? AND category = ?", (name, category)
-  )
-  return cursor.fetchone()[0]
+def _round_mb(mb):
+  return round(mb, 1) if mb is not None else None
 
 
-def process_all_srts():
-  conn = sqlite3.connect(DB_PATH)
-  for srt_path in RAW_DIR.rglob("*.srt"):
-    # skip the file if already processed
-    if srt_path.with_suffix(".srt.done").exists():
-      logging.info(f" >> skipping already processed: {srt_path}")
+def _failed_result(job, exc):
+  """the writer's item for a job whose worker call itself failed (e.g. it could not be pickled)"""
+  error = "".join(traceback.format_exception(type(exc), exc, exc.__traceback__))
+  metrics = {"stages": {}, "tag_cache": {"hits": 0, "misses": 0}, "boilerplate": 0, "tagger": {},
+             "peak_rss_mb": 0.0, "peak_rss_scope": "video", "rss_mb": {"start": None, "end": None}}
+  return job, None, error, metrics
+
+
+def video_info(srt_path):
+  """(video_name, category) from the path under raw/"""
+  parts = srt_path.relative_to(RAW_DIR).parts
+  category = parts[0]  # this 'drama' or 'youtube'
+  show_and_ep = parts[1:]
+
+  if category == "drama":
+    show_name = show_and_ep[0]
+    episode_file = Path(show_and_ep[1]).stem
+    video_name = f"{show_name} {episode_file}"
+  else:
+    video_name = Path(show_and_ep[0]).stem
+  return video_name, category
+
+
+def file_hash(path):
+  h = hashlib.sha256()
+  with open(path, "rb") as f:
+    for chunk in iter(lambda: f.read(1 << 20), b""):
+      h.update(chunk)
+  return h.hexdigest()
+
+
+def load_manifest(conn):
+  """source_path -> (content_hash, tagger_version, line_filter, video_id)"""
+  rows = conn.execute(
+      "SELECT source_path, content_hash, tagger_version, line_filter, video_id FROM BuildManifest")
+  return {source: (content_hash, tagger, line_filter, video_id)
+          for source, content_hash, tagger, line_filter, video_id in rows}
+
+
+def find_srt_jobs(conn, write_jsonl=False, write_tokens=False, tagger_name=DEFAULT_TAGGER, series=None,
+                  line_filter=None):
+  """every subtitle file (.srt, .vtt, .ass) under raw/ that is new, or changed (or tagged by another tagger,
+  or filtered by another boilerplate list) since it was ingested. series: only the files of these series
+  directories (drama/Coffee_Prince, youtube). files line_filter lists as duplicates are left out"""
+  manifest = load_manifest(conn)
+  tagger = tagger_version(make_tagger(tagger_name))
+  digest = line_filter.digest if line_filter is not None else None
+  duplicates = line_filter.duplicates if line_filter is not None else {}
+  jobs = []
+  unchanged = skipped = 0
+  for srt_path in find_subtitle_files(RAW_DIR):
+    source = srt_path.relative_to(RAW_DIR).as_posix()
+    if series is not None and series_of(source) not in series:
+      continue
+    if source in duplicates:
+      skipped += 1
       continue
+    stat = srt_path.stat()
+    content_hash = file_hash(srt_path)
+
+    previous = manifest.get(source)
+    if previous and previous[:3] == (content_hash, tagger, digest):
+      unchanged += 1
+      continue
+
+    video_name, category = video_info(srt_path)
+    jobs.append({
+        "srt_path": srt_path,
+        "json_path": JSON_DIR / f"{video_name}.jsonl" if write_jsonl else None,
+        "tokens_path": TOKENS_DIR / f"{video_name}{TOKENS_SUFFIX}" if write_tokens else None,
+        "video_name": video_name,
+        "category": category,
+        "source": source,
+        "size": stat.st_size,
+        "mtime_ns": stat.st_mtime_ns,
+        "content_hash": content_hash,
+        "tagger_version": tagger,
+        "line_filter": digest,
+        "video_id": previous[3] if previous else None,
+    })
 
-    logging.info(f"  Processing SRT: {srt_path}")
+  if skipped:
+    logging.info(f" >> skipping {skipped} near-duplicate file(s) listed in the boilerplate filter")
+  if unchanged:
+    logging.info(f" >> skipping {unchanged} unchanged file(s)")
+    if not conn.execute("SELECT EXISTS (SELECT 1 FROM SubtitleLines)").fetchone()[0]:
+      logging.warning(
+          " ! this database has no SubtitleLines yet (it predates them); "
+          "rebuild with --fresh to fill the example lines / concordance")
+  leftover = list(RAW_DIR.rglob("*.srt.done"))
+  if leftover:
+    logging.warning(
+        f" ! {len(leftover)} *.srt.done file(s) in {RAW_DIR} are no longer picked up; "
+        "rename them back to .srt to have them tracked by the build manifest")
+  return jobs
 
-    #parts = srt_path.parts
-    parts = srt_path.relative_to(RAW_DIR).parts
-    category = parts[0]  # this 'drama' or 'youtube'
-    show_and_ep = parts[1:]
 
-    if category == "drama":
-      show_name = show_and_ep[0]
-      episode_file = Path(show_and_ep[1]).stem
-      video_name = f"{show_name} {episode_file}"
+def record_manifest(conn, job, video_id):
+  conn.execute("""
+      INSERT OR REPLACE INTO BuildManifest
+          (source_path, size, mtime_ns, content_hash, tagger_version, line_filter, video_id, ingested_at)
+      VALUES (?, ?, ?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+  """, (job["source"], job["size"], job["mtime_ns"], job["content_hash"],
+        job["tagger_version"], job["line_filter"], video_id))
+
+
+def find_removed_sources(conn, series=None, duplicates=()):
+  """(source_path, video_id) of manifest entries whose file is gone from raw/, or is one of
+  duplicates (within series, if given)"""
+  return [
+      (source, video_id)
+      for source, (_, _, _, video_id) in sorted(load_manifest(conn).items())
+      if (not (RAW_DIR / source).is_file() or source in duplicates)
+      and (series is None or series_of(source) in series)
+  ]
+
+
+def remove_video(conn, video_id):
+  """drop a video and everything hanging off it. does not commit"""
+  delete_lines(conn, video_id)
+  conn.execute("DELETE FROM WordFrequency WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM VideoTokenStats WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM TokenResolutions WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM UnmatchedTokens WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM IgnoredTokens WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM VideoCoverage WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM VideoPace WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM VideoDifficulty WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM BuildManifest WHERE video_id = ?", (video_id,))
+  conn.execute("DELETE FROM Videos WHERE video_id = ?", (video_id,))
+
+
+def prune_removed(conn, prune=False, series=None, line_filter=None):
+  duplicates = line_filter.duplicates if line_filter is not None else {}
+  removed = find_removed_sources(conn, series, duplicates)
+  if not removed:
+    return
+  if not prune:
+    logging.warning(
+        f" ! {len(removed)} ingested source(s) no longer exist in {RAW_DIR} or duplicate another one "
+        "(rebuild with --prune to remove them from the database)")
+    return
+  for source, video_id in removed:
+    reason = f"duplicate of {duplicates[source]}" if source in duplicates else "source gone"
+    logging.info(f" - pruning video {video_id}, {reason}: {source}")
+    with conn:
+      remove_video(conn, video_id)
+
+
+def load_counts(conn, job, counts):
+  """the database side for one ingested file, on the writer thread. returns the video_id.
+  does not commit, the writer commits a batch of videos at a time"""
+  # the video, its counts and its manifest entry land together or not at all
+  with savepoint(conn):
+    video_id = job["video_id"]
+    if video_id is None:
+      video_id = insert_video_and_get_id(conn, job["video_name"], job["category"])
     else:
-      video_name = Path(show_and_ep[0]).stem
-
-
-    # Step 1: Convert srt to jsonl
-    json_path = JSON_DIR / f"{video_name}.jsonl"
-    run_command([
-        sys.executable,
-        "pipeline/srt_to_json.py",
-        "--build-script",
-        "--srt", str(srt_path),
-        "--json", str(json_path)
-    ])
-    if not json_path.exists():
-      logging.error(f"X Expected json not found: {json_path}")
-      continue
-    
-    # Step 2: Insert video and get ID
-    video_id = insert_video_and_get_id(conn, video_name, category)
+      logging.info(f" - source changed, replacing counts of video {video_id}: {job['video_name']}")
+      conn.execute("DELETE FROM WordFrequency WHERE video_id = ?", (video_id,))
+      conn.execute("DELETE FROM VideoTokenStats WHERE video_id = ?", (video_id,))
+      conn.execute("DELETE FROM TokenResolutions WHERE video_id = ?", (video_id,))
+      conn.execute("DELETE FROM UnmatchedTokens WHERE video_id = ?", (video_id,))
+      conn.execute("DELETE FROM IgnoredTokens WHERE video_id = ?", (video_id,))
+      delete_lines(conn, video_id)
+    write_counts(conn, video_id, counts)
+    write_token_stats(conn, video_id, counts)
+    write_resolutions(conn, video_id, counts)
+    write_oov(conn, video_id, counts)
+    write_lines(conn, video_id, counts)
+    update_profiles(conn, [video_id])
+    update_pace(conn, [video_id])
+    record_manifest(conn, job, video_id)
+  logging.info(
+      f"   tokens: {counts.total} total, {counts.matched} matched ({counts.resolved} resolved), "
+      f"{counts.ignored} ignored, {counts.unmatched} unmatched")
+  return video_id
+
 
-    # Step 3: Insert transcript
-    run_command([
-        sys.executable, "database/process_tokens.py",
-        str(json_path),
-        "--db", str(DB_PATH),
-        "--video-id", str(video_id)
-    ])
+def video_record(job, video_id, counts, metrics):
+  """one video's entry in the run report"""
+  return {
+      "video": job["video_name"],
+      "source": job["source"],
+      "video_id": video_id,
+      "lines": len(counts.lines),
+      "tokens": counts.total,
+      "matched": counts.matched,
+      "ignored": counts.ignored,
+      "unmatched": counts.unmatched,
+      "resolved": counts.resolved,
+      "resolution_rate": round(counts.resolution_rate, 4),
+      "boilerplate": metrics["boilerplate"],
+      "stages": metrics["stages"],
+      "peak_rss_mb": metrics["peak_rss_mb"],
+      "peak_rss_scope": metrics["peak_rss_scope"],
+      "rss_mb": metrics["rss_mb"],
+      "tag_cache": metrics["tag_cache"],
+      "tagger": metrics["tagger"],
+  }
 
-    # Step 4: Mark files as done
-    srt_done = srt_path.with_suffix(".srt.done")
-    srt_path.rename(srt_done)
-    json_done = json_path.with_suffix(".jsonl.done")
-    json_path.rename(json_done)
 
-    logging.info(f"✅ Done processing: {video_name}")
+def process_all_srts(conn, workers=None, cache_path=DEFAULT_CACHE_PATH, cache_size=DEFAULT_MAX_ENTRIES,
+                     write_jsonl=False, write_tokens=False, report=None, tagger_name=DEFAULT_TAGGER,
+                     tagger_options=None, min_confidence=None, max_in_flight=None,
+                     commit_every=COMMIT_EVERY, series=None, line_filter=None):
+  """ingest every new srt on the worker pool while a writer thread loads the finished ones into conn.
 
-  conn.close()
+  cache_path=None disables the tag cache. tagger_options go to the
+  backend (batch_size / verify for okt). min_confidence=None counts exact
+  matches only, no resolver. at most max_in_flight files (default two per
+  worker) are being tagged or waiting for the writer at any time, and the
+  writer commits every commit_every videos (pipeline/scheduler.py). each
+  video's timings go into report (a RunReport) when one is given.
+  series limits the build to those series directories (find_srt_jobs).
+  line_filter (pipeline/boilerplate.py) drops boilerplate lines before
+  they are tagged and skips duplicate files. returns the list of (srt_path, error) that failed. Ctrl-C stops the
+  build after the video being written, keeping the ones already written.
+  """
+  jobs = find_srt_jobs(conn, write_jsonl, write_tokens, tagger_name, series, line_filter)
+  if not jobs:
+    logging.info(" >> nothing to do")
+    return []
+
+  workers = max(1, min(workers or os.cpu_count() or 1, len(jobs)))
+  max_in_flight = max_in_flight or 2 * workers
+  logging.info(f"  Ingesting {len(jobs)} SRT files on {workers} workers ({max_in_flight} in flight)")
+
+  failed = []
+  cache_hits = cache_misses = 0
+  tagger_stats = Counter()
+  resolved = unmatched = boilerplate = 0
+
+  def write_result(conn, result):
+    """writer thread: one finished file into the database (or into failed)"""
+    nonlocal cache_hits, cache_misses, resolved, unmatched, boilerplate
+    job, counts, error, metrics = result
+    video_name = job["video_name"]
+    cache_hits += metrics["tag_cache"]["hits"]
+    cache_misses += metrics["tag_cache"]["misses"]
+    boilerplate += metrics["boilerplate"]
+    tagger_stats.update(metrics["tagger"])
+    if error:
+      logging.error(f"X Tagging failed for {job['srt_path']}:\n{error}")
+      failed.append((job["srt_path"], error))
+      if report is not None:
+        report.add_failure(job["source"], error)
+      return
+
+    logging.info(f"  Processing SRT: {job['srt_path']}")
+    try:
+      video_id, metrics["stages"]["insert"] = timed(load_counts, conn, job, counts)
+    except Exception:
+      error = traceback.format_exc()
+      logging.error(f"X Loading failed for {video_name}:\n{error}")
+      failed.append((job["srt_path"], error))
+      if report is not None:
+        report.add_failure(job["source"], error)
+      return
+    finally:
+      counts.lines.discard()
+
+    resolved += counts.resolved
+    unmatched += counts.unmatched
+    if report is not None:
+      report.add_video(video_record(job, video_id, counts, metrics))
+    wall = sum(stage["wall"] for stage in metrics["stages"].values())
+    logging.info(f"✅ Done processing: {video_name} ({wall:.2f}s)")
+
+  # workers load the lexicon from its compiled snapshot (plus the few user lexicon words);
+  # a database whose Words did not come from one is read once here and a copy handed to every worker
+  snapshot = snapshot_for(conn)
+  lexicon = (snapshot, user_entries(conn)) if snapshot is not None else load_lexicon(conn)
+  writer = Writer(conn, write_result, commit_every)
+  # spawn rather than fork: every worker gets a clean interpreter to start its own jvm in
+  ctx = multiprocessing.get_context("spawn")
+  with ctx.Pool(processes=workers, initializer=_init_worker,
+                initargs=(lexicon, tagger_name, tagger_options, cache_path, cache_size, min_confidence,
+                          line_filter)) as pool:
+    try:
+      run_overlapped(pool, _ingest_srt, jobs, writer, max_in_flight, on_error=_failed_result)
+    except KeyboardInterrupt:
+      logging.warning(f" ! interrupted: {writer.written} of {len(jobs)} file(s) written and committed, "
+                      "the rest are picked up by the next run")
+      raise
+  logging.info(f" 💾 {writer.written} file(s) written in {writer.commits} commit(s)")
+
+  if cache_path is not None and TAGGERS[tagger_name].cacheable:
+    looked_up = cache_hits + cache_misses
+    rate = cache_hits / looked_up if looked_up else 0
+    logging.info(f" 🗃️ Tag cache: {cache_hits} hits, {cache_misses} misses ({rate:.1%} hit rate)")
+  if line_filter is not None:
+    logging.info(f" 🧹 Boilerplate: {boilerplate} line(s) dropped before tagging")
+  if min_confidence is not None:
+    logging.info(f" 🧩 Resolver: {resolved} tokens resolved, {unmatched} still unmatched "
+                 f"({resolution_rate(resolved, unmatched):.1%} resolution rate)")
+  if tagger_stats["lines"]:
+    logging.info(f" 🔗 Tagger: {tagger_stats['lines']} lines in {tagger_stats['calls']} calls, "
+                 f"{tagger_stats['fallbacks']} batch fallbacks")
+  if tagger_stats["verified"]:
+    level = logging.WARNING if tagger_stats["mismatches"] else logging.INFO
+    logging.log(level, f" 🔗 Batched tags checked on {tagger_stats['verified']} lines, "
+                       f"{tagger_stats['mismatches']} differed from one call per line")
+  return failed
+
+
+def profile_video(conn, record, prof_path, tagger_name=DEFAULT_TAGGER, min_confidence=None, top=25):
+  """parse -> tag -> match of one video again under cProfile, with no tag cache.
+
+  writes the stats to prof_path and returns the top functions by cumulative time as text.
+  """
+  lexicon = load_lexicon(conn)
+  tagger = make_tagger(tagger_name)
+  tagger.warm_up()  # loaded outside the profile, like in a warmed-up worker
+  resolver = FuzzyResolver(lexicon, min_confidence) if min_confidence is not None else None
+  profiler = cProfile.Profile()
+  profiler.runcall(lambda: count_tokens(
+      tag_subtitles(iter_subtitles(RAW_DIR / record["source"]), tagger), lexicon, keep_lines=True,
+      resolver=resolver))
+  prof_path.parent.mkdir(parents=True, exist_ok=True)
+  profiler.dump_stats(str(prof_path))
+  out = io.StringIO()
+  pstats.Stats(profiler, stream=out).sort_stats("cumulative").print_stats(top)
+  return out.getvalue()
+
+
+def print_report(report):
+  totals = report.to_dict()["totals"]
+  if not totals["videos"]:
+    return
+  logging.info(f" ⏱️ {totals['videos']} videos, {totals['lines']} lines, {totals['tokens']} tokens "
+               f"in {report.wall_seconds:.1f}s")
+  for name, times in totals["stages"].items():
+    logging.info(f"   {name:<13} {times['wall']:8.2f}s wall {times['cpu']:8.2f}s cpu")
+  for name, times in report.stages.items():
+    logging.info(f"   {name:<13} {times['wall']:8.2f}s wall {times['cpu']:8.2f}s cpu (once)")
+  slowest = report.slowest()
+  logging.info(f"   slowest: {slowest['video']} "
+               f"({sum(stage['wall'] for stage in slowest['stages'].values()):.2f}s)")
+
+
+def words_loaded(conn):
+  return conn.execute("SELECT EXISTS (SELECT 1 FROM Words)").fetchone()[0] == 1
+
+
+def prepare_database(conn):
+  """steps 1-2: schema (keeping an already loaded Words table, so word_ids stay stable) and words"""
+  apply_schema(conn, drop_words=False)
+  if ensure_aggregates(conn):
+    logging.info(" - filled summary tables from existing WordFrequency rows")
+  if not words_loaded(conn):
+    with conn:
+      inserted = insert_words(conn)
+    logging.info(f" - inserted {inserted} words")
+  with conn:
+    added, flagged = sync_user_words(conn)
+  if added:
+    logging.info(f" - added {added} user lexicon word(s), {flagged} video(s) to recount")
+
+
+def refresh_series(conn):
+  """series pace / difficulty from the per-video tables, once per build (database/pace.py)"""
+  def refresh():
+    with conn:
+      return update_series(conn)
+  n, times = timed(refresh)
+  logging.info(f" 🏃 pace of {n} series ({times['wall']:.2f}s)")
+
+
+def line_filter_for(args):
+  """the boilerplate filter list this build uses, None for none"""
+  if args.no_boilerplate_filter:
+    return None
+  line_filter = load_filter(args.boilerplate)
+  if line_filter is None and args.boilerplate != DEFAULT_FILTER_PATH:
+    logging.warning(f" ! no boilerplate filter list at {args.boilerplate}, every line is tagged")
+  return line_filter
+
+
+def detect_boilerplate(args):
+  """--detect-boilerplate: scan raw/ and save the filter list before building"""
+  # lines kept by hand (boilerplate.py --keep) stay kept
+  result, times = timed(scan_boilerplate, RAW_DIR, keep=load_keep(args.boilerplate))
+  save_filter(result, args.boilerplate)
+  logging.info(f" 🧹 {len(result['lines'])} boilerplate line(s) "
+               f"({result['stats']['boilerplate_cues']} of {result['stats']['cues']} cues) and "
+               f"{len(result['duplicates'])} duplicate file(s) found, saved to {args.boilerplate} "
+               f"({times['wall']:.2f}s)")
+
+
+def build(db_path, args, report=None):
+  """steps 1-4 against db_path on one connection. returns the failed files"""
+  # check_same_thread=False: the writer thread uses conn while the pool runs (and nobody else does)
+  conn = connect_for_build(db_path, synchronous=args.synchronous,
+                           cache_size=args.cache_size, temp_store=args.temp_store,
+                           check_same_thread=False)
+  try:
+    # step 1: init database, step 2: insert words
+    prepare_database(conn)
+    # step 3: the real work ...
+    logging.info(" ~ begin craziness...")
+    line_filter = line_filter_for(args)
+    prune_removed(conn, prune=args.prune, series=args.series, line_filter=line_filter)
+    failed = process_all_srts(
+        conn,
+        workers=args.workers,
+        cache_path=None if args.no_tag_cache else args.tag_cache,
+        cache_size=args.tag_cache_size,
+        write_jsonl=args.jsonl,
+        write_tokens=args.tokens,
+        report=report,
+        tagger_name=args.tagger,
+        tagger_options=tagger_options(args),
+        min_confidence=args.min_confidence if args.resolve else None,
+        max_in_flight=args.max_in_flight,
+        commit_every=args.commit_every,
+        series=args.series,
+        line_filter=line_filter)
+    refresh_series(conn)
+    # step 4: secondary indexes, stats, back to a single-file db
+    _, finish = timed(finish_build, conn)
+    if report is not None:
+      report.stages["finish_build"] = finish
+      if args.profile_slowest and report.videos:
+        slowest = report.slowest()
+        prof_path = report_path(args).with_suffix(".prof")
+        logging.info(f" 🔬 profiling the slowest video: {slowest['video']}")
+        logging.info(profile_video(conn, slowest, prof_path, args.tagger,
+                                   args.min_confidence if args.resolve else None))
+        report.profile = {"video": slowest["video"], "path": str(prof_path)}
+      report.finish()
+      run_id = report.record(conn)
+      logging.info(f" 📝 run {run_id} recorded in BuildRuns")
+  finally:
+    conn.close()
+  return failed
+
+
+def list_series(wanted=None):
+  """series directories under raw/ with subtitle files in them (all, or the wanted ones)"""
+  found = sorted({series_of(path.relative_to(RAW_DIR).as_posix()) for path in find_subtitle_files(RAW_DIR)})
+  if wanted is None:
+    return found
+  missing = sorted(set(wanted) - set(found))
+  if missing:
+    logging.warning(f" ! no subtitle files for series {', '.join(missing)}")
+  return [series for series in found if series in wanted]
+
+
+def shard_command(args, series, db_path, workers):
+  """build_database.py for one series into its shard, with this run's settings"""
+  cmd = [sys.executable, str(Path(__file__).resolve()),
+         "--db", str(db_path), "--series", series, "--workers", str(workers),
+         "--commit-every", str(args.commit_every), "--tagger", args.tagger,
+         "--tag-batch-size", str(args.tag_batch_size), "--min-confidence", str(args.min_confidence),
+         "--tag-cache", str(args.tag_cache), "--tag-cache-size", str(args.tag_cache_size),
+         "--synchronous", args.synchronous, "--cache-size", str(args.cache_size),
+         "--temp-store", args.temp_store, "--report", str(db_path.with_suffix(".json")),
+         "--boilerplate", str(args.boilerplate)]
+  if args.max_in_flight:
+    cmd += ["--max-in-flight", str(args.max_in_flight)]
+  for flag in ("verify_batches", "resolve", "no_tag_cache", "no_boilerplate_filter", "jsonl", "tokens",
+               "fresh", "prune"):
+    if getattr(args, flag):
+      cmd.append("--" + flag.replace("_", "-"))
+  return cmd
+
+
+def build_shards(args, series_list):
+  """build every series into its own shard db, --shard-jobs at a time, each in its own process
+  (with its own worker pool and writer). returns the series whose build had failures"""
+  args.shard_dir.mkdir(parents=True, exist_ok=True)
+  jobs = max(1, min(args.shard_jobs or os.cpu_count() or 1, len(series_list)))
+  workers = max(1, (args.workers or os.cpu_count() or 1) // jobs)
+  logging.info(f"  Building {len(series_list)} shard(s), {jobs} at a time with {workers} worker(s) each")
+
+  pending = list(series_list)
+  running = {}
+  failed = []
+  try:
+    while pending or running:
+      while pending and len(running) < jobs:
+        series = pending.pop(0)
+        path = shard_path(args.shard_dir, series)
+        log = open(path.with_suffix(".log"), "w", encoding="utf-8")
+        proc = subprocess.Popen(shard_command(args, series, path, workers), stdout=log, stderr=subprocess.STDOUT)
+        running[series] = (proc, log, time.perf_counter())
+      time.sleep(SHARD_POLL_SECONDS)
+      for series, (proc, log, start) in list(running.items()):
+        if proc.poll() is None:
+          continue
+        log.close()
+        del running[series]
+        if proc.returncode == 0:
+          logging.info(f"✅ shard {series} built ({time.perf_counter() - start:.1f}s)")
+        else:
+          logging.error(f"X shard {series} exited with {proc.returncode}, see {Path(log.name).name}")
+          failed.append(series)
+  except KeyboardInterrupt:
+    # the shard builds got the Ctrl-C too: let them keep what they have committed
+    for proc, log, _ in running.values():
+      proc.wait()
+      log.close()
+    raise
+  return failed
+
+
+def merge_shards(db_path, args, series_list):
+  """merge the shards of series_list into db_path (steps 1, 2 and 4 of a normal build around it)"""
+  conn = connect_for_build(db_path, synchronous=args.synchronous,
+                           cache_size=args.cache_size, temp_store=args.temp_store)
+  try:
+    prepare_database(conn)
+    prune_removed(conn, prune=args.prune, series=args.series, line_filter=line_filter_for(args))
+    for series in series_list:
+      path = shard_path(args.shard_dir, series)
+      if not path.exists():
+        logging.warning(f" ! no shard for {series} at {path}")
+        continue
+      try:
+        merged, times = timed(merge_shard, conn, path, series, args.force_merge)
+      except LexiconMismatch as e:
+        logging.error(f"X {e}: rebuild it with --fresh")
+        continue
+      if merged is None:
+        logging.info(f" >> {series}: unchanged since its last merge")
+      else:
+        logging.info(f" 🧱 {series}: {merged} video(s) merged ({times['wall']:.2f}s)")
+    refresh_series(conn)
+    _, finish = timed(finish_build, conn)
+    logging.info(f" ~ indexes and ANALYZE ({finish['wall']:.2f}s)")
+  finally:
+    conn.close()
+
+
+def build_sharded(args):
+  """--sharded: one shard per series, built in parallel, then merged into the master. returns the
+  series that had failures"""
+  series_list = list_series(args.series)
+  if not series_list:
+    logging.info(" >> nothing to do")
+    return []
+  start = time.perf_counter()
+  failed = build_shards(args, series_list)
+  logging.info(f" ⏱️ shards built in {time.perf_counter() - start:.1f}s")
+  start = time.perf_counter()
+  with build_target(args.db, atomic=args.atomic, fresh=args.fresh) as db_path:
+    merge_shards(db_path, args, series_list)
+  logging.info(f" ⏱️ merged in {time.perf_counter() - start:.1f}s")
+  return failed
+
+
+def tagger_options(args):
+  """constructor options for the chosen backend"""
+  if args.tagger == "okt":
+    return {"batch_size": args.tag_batch_size, "verify": args.verify_batches}
+  return {}
+
+
+def report_path(args):
+  """where this run's JSON report goes"""
+  if args.report is None:
+    args.report = LOG_DIR / f"build_report_{time.strftime('%Y%m%d_%H%M%S')}.json"
+  return args.report
 
 
 def main():
+  parser = argparse.ArgumentParser(description="Initialize and populate the vocab database.")
+  parser.add_argument("--db", type=Path, default=DB_PATH, help="Database to build (default database/korean_vocab.db)")
+  parser.add_argument("--series", nargs="+",
+                      help="Only ingest these series directories under raw/ (e.g. drama/Coffee_Prince youtube)")
+  parser.add_argument("--sharded", action="store_true",
+                      help="Build every series into its own shard db in parallel, then merge them into --db")
+  parser.add_argument("--shard-jobs", type=int,
+                      help="Shards built at once with --sharded (default: one per core, --workers split between them)")
+  parser.add_argument("--shard-dir", type=Path, default=SHARD_DIR, help="Where the shard databases go")
+  parser.add_argument("--force-merge", action="store_true",
+                      help="Merge every shard, even the ones unchanged since their last merge")
+  parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                      help="Number of tagging worker processes (default: one per core)")
+  parser.add_argument("--max-in-flight", type=int,
+                      help="Files being tagged or waiting to be written at once (default: 2 per worker)")
+  parser.add_argument("--commit-every", type=int, default=COMMIT_EVERY,
+                      help=f"Videos per commit when the writer has a backlog (default {COMMIT_EVERY})")
+  parser.add_argument("--tagger", choices=sorted(TAGGERS), default=DEFAULT_TAGGER,
+                      help="Tagger backend: okt (default) or fast (no jvm, approximate, for quick scans)")
+  parser.add_argument("--tag-batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                      help="Lines per Okt call into the jvm (1 = one call per line)")
+  parser.add_argument("--verify-batches", action="store_true",
+                      help="Also tag every line on its own and warn where batching changed Okt's output")
+  parser.add_argument("--resolve", action="store_true",
+                      help="Also count the tokens the resolver places (database/resolver.py), not only exact "
+                           "(word, pos_tag) matches")
+  parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE,
+                      help=f"With --resolve, the lowest confidence that still counts a token (default {MIN_CONFIDENCE})")
+  parser.add_argument("--tag-cache", type=Path, default=DEFAULT_CACHE_PATH,
+                      help="Path of the on-disk tag cache")
+  parser.add_argument("--tag-cache-size", type=int, default=DEFAULT_MAX_ENTRIES,
+                      help="Max cached lines before least recently used ones are evicted")
+  parser.add_argument("--no-tag-cache", action="store_true", help="Tag every line, skip the tag cache")
+  parser.add_argument("--boilerplate", type=Path, default=DEFAULT_FILTER_PATH,
+                      help="Boilerplate filter list (pipeline/boilerplate.py), used if it exists")
+  parser.add_argument("--no-boilerplate-filter", action="store_true",
+                      help="Tag every line and file, ignore the boilerplate filter list")
+  parser.add_argument("--detect-boilerplate", action="store_true",
+                      help="Scan raw/ for boilerplate lines and duplicate files and save the list before building")
+  parser.add_argument("--jsonl", action="store_true",
+                      help="Also write the tagged lines to json/ as jsonl")
+  parser.add_argument("--tokens", action="store_true",
+                      help="Also write the tagged lines to tokens/ as compact .tok files (for the annotation tools)")
+  parser.add_argument("--fresh", action="store_true",
+                      help="Rebuild everything from an empty database")
+  parser.add_argument("--prune", action="store_true",
+                      help="Remove videos whose source file is gone from raw/")
+  parser.add_argument("--atomic", action="store_true",
+                      help="Build into a temp file and swap it in when done")
+  parser.add_argument("--synchronous", default=DEFAULT_SYNCHRONOUS, choices=SYNCHRONOUS_MODES,
+                      type=str.upper, help="PRAGMA synchronous during the build")
+  parser.add_argument("--cache-size", type=int, default=DEFAULT_CACHE_SIZE,
+                      help="PRAGMA cache_size during the build (negative = KiB)")
+  parser.add_argument("--temp-store", default=DEFAULT_TEMP_STORE, choices=TEMP_STORE_MODES,
+                      type=str.upper, help="PRAGMA temp_store during the build")
+  parser.add_argument("--report", type=Path,
+                      help="Write the JSON run report here (default: logs/build_report_<time>.json)")
+  parser.add_argument("--profile-slowest", action="store_true",
+                      help="Rerun the slowest video under cProfile and save the .prof next to the report")
+  args = parser.parse_args()
+
   logging.basicConfig(level=logging.INFO, format="%(message)s")
-  # step 1: init database
-  run_script("database/init_db.py")
-  # step 2: insert words
-  run_script("database/insert_words.py")
-  # step 3: the real work ...
-  logging.info(" ~ begin craziness...")
-  JSON_DIR.mkdir(parents=True, exist_ok=True)
-  process_all_srts()
+  if args.jsonl:
+    JSON_DIR.mkdir(parents=True, exist_ok=True)
+  if args.tokens:
+    TOKENS_DIR.mkdir(parents=True, exist_ok=True)
+  if args.detect_boilerplate:
+    # once here, before any shard is started, so they all load the same list
+    detect_boilerplate(args)
+
+  if args.sharded:
+    try:
+      failed = build_sharded(args)
+    except KeyboardInterrupt:
+      logging.warning(" X build cancelled, rerun to finish it (each shard keeps what it committed)")
+      sys.exit(130)
+    if failed:
+      logging.error(f" X {len(failed)} shard(s) had failures: {', '.join(failed)}")
+      sys.exit(1)
+    logging.info(" > All done.")
+    return
+
+  report = RunReport(tagger_version=tagger_version(args.tagger), settings={
+      "tagger": args.tagger, "tag_batch_size": args.tag_batch_size, "workers": args.workers,
+      "max_in_flight": args.max_in_flight, "commit_every": args.commit_every,
+      "min_confidence": args.min_confidence if args.resolve else None,
+      "tag_cache": not args.no_tag_cache, "jsonl": args.jsonl, "tokens": args.tokens,
+      "fresh": args.fresh, "atomic": args.atomic, "synchronous": args.synchronous,
+      "cache_size": args.cache_size, "temp_store": args.temp_store, "series": args.series,
+      "boilerplate": None if args.no_boilerplate_filter else str(args.boilerplate),
+  })
+  try:
+    with build_target(args.db, atomic=args.atomic, fresh=args.fresh) as db_path:
+      if args.atomic:
+        logging.info(f" ~ building into {db_path.name}, swapped in when done")
+      failed = build(db_path, args, report)
+  except KeyboardInterrupt:
+    if args.atomic:
+      logging.warning(" X build cancelled, the database was left as it was")
+    else:
+      logging.warning(" X build cancelled, rerun to finish it (indexes are built at the end)")
+    sys.exit(130)
+
+  print_report(report)
+  logging.info(f" 📝 run report written to {report.write_json(report_path(args))}")
+
+  if failed:
+    logging.error(f" X {len(failed)} file(s) failed:")
+    for srt_path, _ in failed:
+      logging.error(f"   - {srt_path}")
+    sys.exit(1)
   logging.info(" > All done.")
 
 
@@ -0,0 +1,116 @@
+'''
+the WordTotals / LevelTotals summary tables (schema.sql) hold per-word
+corpus totals, per-word document frequency (how many videos a word is
+in) and per-level totals. the triggers on WordFrequency keep them in
+step with every ingest or removal, so the queries in sql/summary/ never
+have to GROUP BY the whole of WordFrequency.
+
+this file can recompute them from scratch and check the trigger
+maintained copies against that recomputation:
+
+python aggregates.py --db korean_vocab.db           # check
+python aggregates.py --db korean_vocab.db --rebuild # recompute, then check
+'''
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+
+# full recomputations, the same shape as the summary tables
+WORD_TOTALS_SQL = """
+    SELECT word_id, SUM(frequency), COUNT(DISTINCT video_id)
+    FROM WordFrequency
+    GROUP BY word_id
+"""
+
+LEVEL_TOTALS_SQL = """
+    SELECT w.topik_level, SUM(wf.frequency), COUNT(DISTINCT wf.word_id)
+    FROM WordFrequency wf
+    JOIN Words w ON wf.word_id = w.word_id
+    GROUP BY w.topik_level
+"""
+
+
+def rebuild_aggregates(conn):
+    """recompute both summary tables from WordFrequency. does not commit"""
+    conn.execute("DELETE FROM WordTotals")
+    conn.execute("DELETE FROM LevelTotals")
+    conn.execute(f"INSERT INTO WordTotals (word_id, total_freq, video_count) {WORD_TOTALS_SQL}")
+    conn.execute(f"INSERT INTO LevelTotals (topik_level, total_freq, word_count) {LEVEL_TOTALS_SQL}")
+
+
+def ensure_aggregates(conn):
+    """fill the summary tables of a db that had counts before they existed.
+
+    returns True when a rebuild was needed.
+    """
+    has_counts = conn.execute("SELECT EXISTS (SELECT 1 FROM WordFrequency)").fetchone()[0]
+    has_totals = conn.execute("SELECT EXISTS (SELECT 1 FROM WordTotals)").fetchone()[0]
+    if has_counts and not has_totals:
+        with conn:
+            rebuild_aggregates(conn)
+        return True
+    return False
+
+
+def _diff(conn, table, columns, count_column, recompute_sql):
+    """rows in the summary table but not in the recomputation, and the other way round"""
+    stored = f"SELECT {columns} FROM {table}"
+    # all-zero rows (a level nothing is left in) are fine, the recomputation just has no row for them
+    stored_nonzero = f"{stored} WHERE NOT (total_freq = 0 AND {count_column} = 0)"
+    extra = conn.execute(f"{stored_nonzero} EXCEPT {recompute_sql}").fetchall()
+    missing = conn.execute(f"{recompute_sql} EXCEPT {stored}").fetchall()
+    return extra, missing
+
+
+def check_aggregates(conn):
+    """compare the summary tables to a full recomputation.
+
+    returns a list of human readable problems, empty when consistent.
+    """
+    problems = []
+    for table, columns, count_column, sql in (
+        ("WordTotals", "word_id, total_freq, video_count", "video_count", WORD_TOTALS_SQL),
+        ("LevelTotals", "topik_level, total_freq, word_count", "word_count", LEVEL_TOTALS_SQL),
+    ):
+        extra, missing = _diff(conn, table, columns, count_column, sql)
+        for row in extra:
+            problems.append(f"{table}: stored {row} does not match WordFrequency")
+        for row in missing:
+            problems.append(f"{table}: expected {row} is missing or different")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check (or rebuild) the WordTotals / LevelTotals summary tables.")
+    parser.add_argument("--db", default="korean_vocab.db", help="Path to SQLite database")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute the summary tables first")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db) if args.rebuild else connect_readonly(args.db)
+    try:
+        if args.rebuild:
+            with conn:
+                rebuild_aggregates(conn)
+            print("🔁 Summary tables recomputed from WordFrequency")
+        problems = check_aggregates(conn)
+    finally:
+        conn.close()
+
+    if problems:
+        print(f"❌ {len(problems)} mismatch(es):")
+        for problem in problems[:50]:
+            print(f"  {problem}")
+        sys.exit(1)
+    print("✅ Summary tables match a full recomputation")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+'''
+run reports of build_database.py (the BuildRuns table).
+
+the build fills a RunReport as it goes: one record per ingested video
+with the wall / cpu seconds of each stage (parse, tag, match, insert, and
+writing .tok / jsonl when asked for), line and token counts, the
+worker's peak RSS and its tag cache hits. at the end the report is
+stored as one BuildRuns row (summary columns plus the full JSON) and
+written to a JSON file.
+
+python build_runs.py --db korean_vocab.db            # the last runs
+python build_runs.py --db korean_vocab.db --run 7    # one run's full report
+'''
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+from pipeline.instrumentation import peak_rss_mb, sum_stages
+
+
+def _now():
+    return time.strftime("%Y-%m-%dT%H:%M:%S")
+
+
+class RunReport:
+    def __init__(self, tagger_version=None, settings=None):
+        self.started_at = _now()
+        self.finished_at = None
+        self._t0 = time.perf_counter()
+        self.wall_seconds = None
+        self.tagger_version = tagger_version
+        self.settings = dict(settings or {})
+        self.videos = []
+        self.failed = []
+        self.stages = {}  # run-level steps outside the per-video stages (e.g. finish_build)
+        self.tag_cache = {"hits": 0, "misses": 0}
+        self.profile = None
+
+    def add_video(self, record):
+        self.videos.append(record)
+        cache = record.get("tag_cache") or {}
+        self.tag_cache["hits"] += cache.get("hits", 0)
+        self.tag_cache["misses"] += cache.get("misses", 0)
+
+    def add_failure(self, source, error):
+        self.failed.append({"source": str(source), "error": error})
+
+    def slowest(self):
+        """the video record with the most wall time over all its stages, or None"""
+        if not self.videos:
+            return None
+        return max(self.videos, key=lambda v: sum(s["wall"] for s in v["stages"].values()))
+
+    def finish(self):
+        self.finished_at = _now()
+        self.wall_seconds = time.perf_counter() - self._t0
+
+    def to_dict(self):
+        slowest = self.slowest()
+        return {
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "wall_seconds": self.wall_seconds,
+            "tagger_version": self.tagger_version,
+            "settings": self.settings,
+            "totals": {
+                "videos": len(self.videos),
+                "failed": len(self.failed),
+                "lines": sum(v["lines"] for v in self.videos),
+                "tokens": sum(v["tokens"] for v in self.videos),
+                "stages": sum_stages(self.videos),
+                "peak_rss_mb": {
+                    "parent": round(peak_rss_mb(), 1),
+                    "workers": max((v["peak_rss_mb"] for v in self.videos), default=None),
+                },
+                "tag_cache": self.tag_cache,
+            },
+            "stages": self.stages,
+            "slowest_video": slowest["video"] if slowest else None,
+            "profile": self.profile,
+            "videos": self.videos,
+            "failed": self.failed,
+        }
+
+    def write_json(self, path):
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(json.dumps(self.to_dict(), ensure_ascii=False, indent=2), encoding="utf-8")
+        return path
+
+    def record(self, conn):
+        """store the report as a BuildRuns row, returns its run_id. commits"""
+        report = self.to_dict()
+        totals = report["totals"]
+        with conn:
+            cursor = conn.execute("""
+                INSERT INTO BuildRuns
+                    (started_at, finished_at, wall_seconds, videos, failed, lines, tokens, tagger_version, report)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (report["started_at"], report["finished_at"], report["wall_seconds"], totals["videos"],
+                  totals["failed"], totals["lines"], totals["tokens"], report["tagger_version"],
+                  json.dumps(report, ensure_ascii=False)))
+        return cursor.lastrowid
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show build run reports stored in BuildRuns.")
+    parser.add_argument("--db", default="korean_vocab.db", help="Path to SQLite database")
+    parser.add_argument("--last", type=int, default=10, help="How many runs to list")
+    parser.add_argument("--run", type=int, help="Print this run's full JSON report")
+    args = parser.parse_args()
+
+    conn = connect_readonly(args.db)
+    try:
+        if args.run is not None:
+            row = conn.execute("SELECT report FROM BuildRuns WHERE run_id = ?", (args.run,)).fetchone()
+            if row is None:
+                print(f"❌ no run {args.run}")
+                sys.exit(1)
+            print(json.dumps(json.loads(row[0]), ensure_ascii=False, indent=2))
+            return
+        rows = conn.execute("""
+            SELECT run_id, started_at, wall_seconds, videos, failed, lines, tokens, report
+            FROM BuildRuns ORDER BY run_id DESC LIMIT ?
+        """, (args.last,)).fetchall()
+    finally:
+        conn.close()
+
+    for run_id, started_at, wall, videos, failed, lines, tokens, report in rows:
+        stages = json.loads(report)["totals"]["stages"]
+        split = ", ".join(f"{name} {times['wall']:.1f}s" for name, times in stages.items())
+        print(f"[{run_id}] {started_at}  {wall:7.1f}s  {videos} videos ({failed} failed), "
+              f"{lines} lines, {tokens} tokens  |  {split}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+'''
+shared bulk-load helpers for init_db.py, insert_words.py, process_tokens.py
+and build_database.py.
+
+- connect_for_build(): one connection with build-time pragmas (WAL
+  journaling plus configurable synchronous / cache_size / temp_store)
+- create_indexes(): secondary indexes from indexes.sql, run once the data
+  is in rather than maintained row by row during the load
+- finish_build(): indexes, ANALYZE, and back to a rollback journal so the
+  finished korean_vocab.db is a single self-contained file again
+- build_target(): build into a temp file next to the db and atomically
+  swap it in, so readers only ever see the old or the finished database
+- savepoint(): all of a block or none of it, without committing, so one
+  transaction can hold several videos and still drop a failed one
+- connect_readonly(): for the query and report scripts; none of the build
+  pragmas, so it leaves a finished db as it found it
+'''
+
+import os
+import sqlite3
+import stat
+import tempfile
+from contextlib import contextmanager
+from pathlib import Path
+
+INDEXES_PATH = Path(__file__).parent / "indexes.sql"
+
+# build-time defaults. synchronous=NORMAL is safe with WAL; OFF is faster
+# and fine when building into a temp file (a crash just loses the temp file)
+DEFAULT_SYNCHRONOUS = "NORMAL"
+DEFAULT_CACHE_SIZE = -64000  # negative = KiB, so ~64MB of page cache
+DEFAULT_TEMP_STORE = "MEMORY"
+
+SYNCHRONOUS_MODES = ("OFF", "NORMAL", "FULL", "EXTRA")
+TEMP_STORE_MODES = ("DEFAULT", "FILE", "MEMORY")
+
+
+def connect_for_build(db_path, synchronous=DEFAULT_SYNCHRONOUS, cache_size=DEFAULT_CACHE_SIZE,
+                      temp_store=DEFAULT_TEMP_STORE, check_same_thread=True):
+    """check_same_thread=False lets the connection be handed to another
+    thread (the build's writer thread); only one thread may use it at a time"""
+    synchronous = synchronous.upper()
+    temp_store = temp_store.upper()
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f"synchronous must be one of {SYNCHRONOUS_MODES}, got {synchronous!r}")
+    if temp_store not in TEMP_STORE_MODES:
+        raise ValueError(f"temp_store must be one of {TEMP_STORE_MODES}, got {temp_store!r}")
+
+    conn = sqlite3.connect(db_path, check_same_thread=check_same_thread)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute(f"PRAGMA synchronous={synchronous}")
+    conn.execute(f"PRAGMA cache_size={int(cache_size)}")
+    conn.execute(f"PRAGMA temp_store={temp_store}")
+    return conn
+
+
+def connect_readonly(db_path):
+    """mode=ro: fails on a missing file instead of creating an empty db"""
+    return sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+
+
+def create_indexes(conn):
+    with open(INDEXES_PATH, "r", encoding="utf-8") as f:
+        conn.executescript(f.read())
+
+
+def finish_build(conn):
+    """call once the load is done, before closing the build connection"""
+    create_indexes(conn)
+    conn.execute("ANALYZE")
+    conn.commit()
+    conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    conn.execute("PRAGMA journal_mode=DELETE")
+
+
+@contextmanager
+def savepoint(conn, name="video"):
+    """run the block inside the caller's transaction (opened if there is none),
+    rolling back only the block if it raises. does not commit"""
+    if not conn.in_transaction:
+        conn.execute("BEGIN")
+    conn.execute(f"SAVEPOINT {name}")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute(f"ROLLBACK TO {name}")
+        conn.execute(f"RELEASE {name}")
+        raise
+    conn.execute(f"RELEASE {name}")
+
+
+def _remove_db_files(path):
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+def _target_mode(db_path):
+    """mkstemp files are 0600: keep the mode of the db being replaced, or
+    what the umask would give a new one"""
+    try:
+        return stat.S_IMODE(db_path.stat().st_mode)
+    except FileNotFoundError:
+        umask = os.umask(0)
+        os.umask(umask)
+        return 0o666 & ~umask
+
+
+@contextmanager
+def build_target(db_path, atomic=False, fresh=False):
+    """yields the path to build into.
+
+    atomic=False: db_path itself (fresh=True deletes it first).
+    atomic=True: a temp file in the same directory, seeded with a copy of
+    db_path unless fresh=True, renamed over db_path when the block exits
+    cleanly and thrown away if it raises.
+    """
+    db_path = Path(db_path)
+    if not atomic:
+        if fresh:
+            _remove_db_files(db_path)
+        yield db_path
+        return
+
+    fd, tmp_name = tempfile.mkstemp(prefix=f".{db_path.name}.", suffix=".building", dir=db_path.parent)
+    os.close(fd)
+    tmp_path = Path(tmp_name)
+    try:
+        if db_path.exists() and not fresh:
+            src = sqlite3.connect(db_path)
+            dst = sqlite3.connect(tmp_path)
+            try:
+                src.backup(dst)
+            finally:
+                dst.close()
+                src.close()
+        yield tmp_path
+    except BaseException:
+        _remove_db_files(tmp_path)
+        raise
+    for suffix in ("-wal", "-shm"):
+        Path(f"{tmp_path}{suffix}").unlink(missing_ok=True)
+    os.chmod(tmp_path, _target_mode(db_path))
+    os.replace(tmp_path, db_path)
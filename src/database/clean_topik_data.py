@@ -1,8 +1,12 @@
-import re
+import sys
 from pathlib import Path
 import pandas as pd
 import unicodedata
 
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
 # Map Korean POS to OKT-style English POS
 POS_TRANSLATIONS = {
     "명사": "Noun",
@@ -38,98 +42,79 @@ POS_TRANSLATIONS = {
     "기타": "Unknown"
 }
 
-INPUT_DIR = Path("../../aux_data/topik/")  # adjust as needed
-OUTPUT_FILE = Path("../../aux_data/topik/cleaned_topik.csv")
+TOPIK_DIR = Path(__file__).resolve().parent.parent.parent / "aux_data/topik"
+INPUT_DIR = TOPIK_DIR
+OUTPUT_FILE = TOPIK_DIR / "cleaned_topik.csv"
+
+WORD_COLUMN = "어휘 Vocabulary"
+POS_COLUMN = "품사 Word class"
+LEVEL_COLUMN = "등급 Level"
+GUIDE_COLUMN = "길잡이말 Guide"
 
+# one entry can list several words / pos ("가까이01/가까이02", "부사/명사"),
+# and one pos several tags ("명사∙부사")
+ENTRY_SEPARATOR = "/"
+POS_SEPARATORS = r"[∙·・]"
+# what str.isalpha() drops: homonym numbers, hyphens, brackets, spaces
+NOT_LETTERS = r"[\W\d_]"
 
 
 def normalize_word(word):
     return unicodedata.normalize("NFC", word)
 
 
-def parse_multientry_rows(df):
-    rows = []
-
-    for _, row in df.iterrows():
-        base_forms_raw = str(row["어휘 Vocabulary"]).split("/")
-        pos_krs_raw = str(row["품사 Word class"]).split("/")
-        level = row["등급 Level"]
-
-        guide = row.get("길잡이말 Guide", "")
-        guide = guide.strip() if isinstance(guide, str) else ""
-
-        try:
-            level_int = int(str(level).replace("급", "").strip())
-        except Exception:
-            continue
-
-        # Expand base forms and pos tags to align by index, then further split pos on '∙'
-        for base_raw, pos_kr_raw in zip(base_forms_raw, pos_krs_raw):
-            clean_base = normalize_word("".join(filter(str.isalpha, base_raw)))
-#            pos_parts = re.split(r"[\∙·]", pos_kr_raw.strip())
-            pos_parts = re.split(r"[∙·・]", pos_kr_raw.strip())
-            
-            for pos_kr in pos_parts:
-                pos_en = POS_TRANSLATIONS.get(pos_kr.strip(), "Unknown")
-                rows.append({
-                    "base_word": clean_base,
-                    "pos_kr": pos_kr.strip(),
-                    "pos_tag": pos_en,
-                    "level": level_int,
-                    "guide": guide
-                })
-
-    return pd.DataFrame(rows)
-
+def _split_slots(column, name):
+    """one row per "/"-separated part, numbered by its slot within the entry"""
+    parts = column.astype(str).str.split(ENTRY_SEPARATOR).explode()
+    return parts.to_frame(name).assign(slot=parts.groupby(level=0).cumcount())
 
 
-'''
 def parse_multientry_rows(df):
-    rows = []
-
-    for _, row in df.iterrows():
-        base_forms = row["어휘 Vocabulary"].split("/")
-        pos_krs = row["품사 Word class"].split("/")
-        level = row["등급 Level"]
-#        guide = row.get("길잡이말 Guide", "").strip()
-        guide = row.get("길잡이말 Guide", "")
-        guide = guide.strip() if isinstance(guide, str) else ""
-
-
-        # Align lengths if mismatch by repeating or trimming
-        max_len = max(len(base_forms), len(pos_krs))
-        base_forms = (base_forms * max_len)[:max_len]
-        pos_krs = (pos_krs * max_len)[:max_len]
-
-        for base, pos_kr in zip(base_forms, pos_krs):
-            clean_base = normalize_word("".join(filter(str.isalpha, base)))
-            pos_en = POS_TRANSLATIONS.get(pos_kr.strip(), "Unknown")
-            try:
-                level_int = int(level.replace("급", "").strip())
-            except Exception:
-                continue  # skip malformed rows
-            rows.append({
-                "base_word": clean_base,
-                "pos_kr": pos_kr.strip(),
-                "pos_tag": pos_en,
-                "level": level_int,
-                "guide": guide
-            })
-
-    return pd.DataFrame(rows)
-'''
-
-def clean_topik_data():
+    """one row per (word, pos tag) of every list entry, as whole-column operations.
+
+    the i-th word of an entry goes with its i-th pos, extra words or pos
+    on either side are dropped (zip). rows whose level is not a number
+    are skipped.
+    """
+    df = df.reset_index(drop=True).rename_axis("row")
+    level = pd.to_numeric(df[LEVEL_COLUMN].astype(str).str.replace("급", "").str.strip(), errors="coerce")
+    guide = df[GUIDE_COLUMN] if GUIDE_COLUMN in df else pd.Series("", index=df.index)
+    entries = pd.DataFrame({"level": level, "guide": guide.fillna("").astype(str).str.strip()})
+    entries = entries[level.notna() & (level % 1 == 0)]
+    df = df.loc[entries.index]
+
+    pairs = _split_slots(df[WORD_COLUMN], "base_raw").reset_index().merge(
+        _split_slots(df[POS_COLUMN], "pos_raw").reset_index(), on=["row", "slot"])
+    pairs["base_word"] = pairs["base_raw"].str.replace(NOT_LETTERS, "", regex=True).str.normalize("NFC")
+    pairs["pos_kr"] = pairs["pos_raw"].str.strip().str.split(POS_SEPARATORS, regex=True)
+    pairs = pairs.explode("pos_kr", ignore_index=True)
+    pairs["pos_kr"] = pairs["pos_kr"].str.strip()
+    pairs["pos_tag"] = pairs["pos_kr"].map(POS_TRANSLATIONS).fillna("Unknown")
+    pairs = pairs.join(entries, on="row")
+    pairs["level"] = pairs["level"].astype(int)
+    return pairs[["base_word", "pos_kr", "pos_tag", "level", "guide"]]
+
+
+def source_files(input_dir=INPUT_DIR):
+    """the per-level topik lists, not the cleaned csv written next to them"""
+    return [file for file in sorted(Path(input_dir).glob("*.csv")) if file.resolve() != OUTPUT_FILE.resolve()]
+
+
+def clean_topik_data(input_dir=INPUT_DIR, output_file=OUTPUT_FILE):
     all_dfs = []
 
-    for file in sorted(INPUT_DIR.glob("*.csv")):
+    for file in source_files(input_dir):
         try:
             df = pd.read_csv(file, encoding="utf-8", delimiter=",")
         except Exception as e:
             print(f"Error reading {file}: {e}")
             continue
+        missing = {WORD_COLUMN, POS_COLUMN, LEVEL_COLUMN} - set(df.columns)
+        if missing:
+            print(f"Skipping {file}: no {', '.join(sorted(missing))} column")
+            continue
 
-        df = df.dropna(subset=["어휘 Vocabulary", "품사 Word class", "등급 Level"])
+        df = df.dropna(subset=[WORD_COLUMN, POS_COLUMN, LEVEL_COLUMN])
         parsed_df = parse_multientry_rows(df)
         all_dfs.append(parsed_df)
 
@@ -146,10 +131,12 @@ def clean_topik_data():
 
     # Sort and export
     final_df = final_df.sort_values(by=["level", "base_word", "pos_tag"])
-    final_df.to_csv(OUTPUT_FILE, index=False, encoding="utf-8")
-    print(f"Cleaned TOPIK data written to {OUTPUT_FILE}")
+    final_df.to_csv(output_file, index=False, encoding="utf-8")
+    print(f"Cleaned TOPIK data written to {output_file}")
+    return final_df
 
 if __name__ == "__main__":
     clean_topik_data()
-
-
+    # compile the lexicon snapshot of the new csv right away (lexicon_snapshot.py)
+    from database.lexicon_snapshot import ensure_snapshot
+    print(f"📦 Lexicon snapshot: {ensure_snapshot(OUTPUT_FILE)}")
@@ -0,0 +1,12 @@
+'''
+(db_instance, generation) of a database. the generation is bumped by
+triggers (schema.sql) on every change to Videos or WordFrequency, so
+caches built from the counts store this pair and rebuild when it moves.
+'''
+
+
+def data_version(conn):
+    row = conn.execute("SELECT db_instance, generation FROM DataVersion WHERE id = 1").fetchone()
+    if row is None:
+        return None, 0
+    return row[0], row[1]
@@ -0,0 +1,30 @@
+-- secondary indexes. kept out of schema.sql so a bulk load can fill the
+-- tables first and build these once at the end (bulk_load.create_indexes)
+
+CREATE INDEX IF NOT EXISTS idx_words_topik_level ON Words(topik_level);
+
+CREATE INDEX IF NOT EXISTS idx_wordfrequency_video ON WordFrequency(video_id);
+
+CREATE INDEX IF NOT EXISTS idx_buildmanifest_video ON BuildManifest(video_id);
+
+CREATE INDEX IF NOT EXISTS idx_wordtotals_total_freq ON WordTotals(total_freq);
+
+CREATE INDEX IF NOT EXISTS idx_wordtotals_video_count ON WordTotals(video_count);
+
+-- "videos with >= 90% token coverage at level 3" is a range scan on this
+CREATE INDEX IF NOT EXISTS idx_videocoverage_level_token ON VideoCoverage(topik_level, token_coverage);
+
+-- lines of a video in order (replace / prune) and the occurrences of a video
+CREATE INDEX IF NOT EXISTS idx_subtitlelines_video ON SubtitleLines(video_id, line_id);
+
+CREATE INDEX IF NOT EXISTS idx_wordoccurrences_video ON WordOccurrences(video_id);
+
+-- tokens of a video (replace / prune); the top OOV words by frequency
+CREATE INDEX IF NOT EXISTS idx_unmatchedtokens_video ON UnmatchedTokens(video_id);
+
+CREATE INDEX IF NOT EXISTS idx_ignoredtokens_video ON IgnoredTokens(video_id);
+
+CREATE INDEX IF NOT EXISTS idx_oovtotals_total_freq ON OovTotals(total_freq);
+
+-- videos by pace
+CREATE INDEX IF NOT EXISTS idx_videopace_syllables ON VideoPace(syllables_per_second);
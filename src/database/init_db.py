@@ -1,27 +1,61 @@
-import sqlite3
+import sys
 from pathlib import Path
-import pandas as pd
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_for_build, create_indexes
 
 DB_PATH = Path(__file__).parent / "korean_vocab.db"
 SCHEMA_PATH = Path(__file__).parent / "schema.sql"
 CLEANED_CSV_PATH = Path("../../aux_data/topik/cleaned_topik.csv")
 
-def initialize_database():
-    conn = sqlite3.connect(DB_PATH)
+# columns added to tables after they first shipped: CREATE TABLE IF NOT
+# EXISTS leaves an existing table alone, so these are ALTERed in
+ADDED_COLUMNS = {
+    "SubtitleLines": [("token_count", "INTEGER"), ("content_count", "INTEGER")],
+    "BuildManifest": [("line_filter", "TEXT")],
+}
+
+
+def add_missing_columns(conn):
+    for table, columns in ADDED_COLUMNS.items():
+        existing = {row[1] for row in conn.execute(f"PRAGMA table_info({table})")}
+        for column, decl in columns:
+            if column not in existing:
+                conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {decl}")
+
+
+def apply_schema(conn, drop_words=True):
+    """create any missing tables (no secondary indexes, see indexes.sql).
+    drop_words=False keeps the loaded lexicon (and so its word_ids) for
+    incremental builds"""
     cursor = conn.cursor()
 
-    cursor.execute("DROP TABLE IF EXISTS words")
+    if drop_words:
+        cursor.execute("DROP TABLE IF EXISTS words")
+        cursor.execute("DROP TABLE IF EXISTS LexiconSource")
 
     with open(SCHEMA_PATH, "r", encoding="utf-8") as f:
         schema_sql = f.read()
 
     cursor.executescript(schema_sql)
+    add_missing_columns(conn)
     conn.commit()
-    conn.close()
+
+
+def initialize_database(db_path=DB_PATH, drop_words=True):
+    conn = connect_for_build(db_path)
+    try:
+        apply_schema(conn, drop_words)
+        create_indexes(conn)
+        conn.commit()
+    finally:
+        conn.close()
     print(f"✅ Database initialized from schema at {SCHEMA_PATH}")
 
 
 if __name__ == "__main__":
   initialize_database()
 
-
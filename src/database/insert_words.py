@@ -1,34 +1,61 @@
-import sqlite3
 import csv
+import sys
+from pathlib import Path
 
-CLEANED_CSV_PATH = '../../aux_data/topik/cleaned_topik.csv'
-
-# Connect to the SQLite database
-conn = sqlite3.connect('./korean_vocab.db')
-# Change this to your actual .db file
-cursor = conn.cursor()
-
-# Open the CSV file
-with open(CLEANED_CSV_PATH, newline='', encoding='utf-8') as csvfile:
-    reader = csv.DictReader(csvfile)  # Use DictReader to map column headers
-
-    for row in reader:
-        # Extract and rename fields from CSV to match the DB schema
-        word = row['base_word']
-        pos_tag = row['pos_tag']
-        level = int(row['level'])  # topik_level in DB
-        hstr = row['homonym'].strip().lower()
-        homonym = 1 if hstr in ['1', 'true', 'yes'] else 0
-
-        try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO Words (word, pos_tag, topik_level, homonym)
-                VALUES (?, ?, ?, ?)
-            ''', (word, pos_tag, level, homonym))
-        except Exception as e:
-            print(f"Failed to insert row {row}: {e}")
-
-# Commit and close
-conn.commit()
-conn.close()
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
+from database.bulk_load import connect_for_build
+
+CLEANED_CSV_PATH = Path(__file__).resolve().parent.parent.parent / 'aux_data/topik/cleaned_topik.csv'
+DB_PATH = Path(__file__).parent / 'korean_vocab.db'
+
+
+def read_words(csv_path=CLEANED_CSV_PATH):
+    """(word, pos_tag, topik_level, homonym) rows from the cleaned csv"""
+    # Open the CSV file
+    with open(csv_path, newline='', encoding='utf-8') as csvfile:
+        reader = csv.DictReader(csvfile)  # Use DictReader to map column headers
+
+        for row in reader:
+            # Extract and rename fields from CSV to match the DB schema
+            try:
+                word = row['base_word']
+                pos_tag = row['pos_tag']
+                level = int(row['level'])  # topik_level in DB
+                hstr = row['homonym'].strip().lower()
+            except Exception as e:
+                print(f"Failed to insert row {row}: {e}")
+                continue
+            homonym = 1 if hstr in ['1', 'true', 'yes'] else 0
+            yield word, pos_tag, level, homonym
+
+
+def insert_words(conn, csv_path=CLEANED_CSV_PATH):
+    """bulk insert the lexicon in one executemany, from its compiled snapshot
+    (lexicon_snapshot.py) with the snapshot's word_ids. does not commit"""
+    # imported here: lexicon_snapshot reads the csv through read_words above
+    from database.lexicon_snapshot import ensure_snapshot, load_snapshot, record_source
+
+    snapshot = load_snapshot(ensure_snapshot(csv_path))
+    entries = snapshot.entries()
+    before = conn.total_changes
+    conn.executemany('''
+        INSERT OR IGNORE INTO Words (word_id, word, pos_tag, topik_level, homonym)
+        VALUES (?, ?, ?, ?, ?)
+    ''', ((word_id, word, pos_tag, level, homonym) for word, pos_tag, level, homonym, word_id in entries))
+    inserted = conn.total_changes - before
+    # only an empty Words table ends up exactly the snapshot
+    record_source(conn, snapshot.csv_sha256 if inserted == len(entries) else None)
+    return inserted
+
+
+if __name__ == "__main__":
+    # Connect to the SQLite database
+    conn = connect_for_build(DB_PATH)
+    # Commit and close
+    with conn:
+        inserted = insert_words(conn)
+    conn.close()
+    print(f"✅ Inserted {inserted} words from {CLEANED_CSV_PATH}")
@@ -0,0 +1,71 @@
+'''
+in-memory copy of the Words table for token matching.
+
+process_tokens used to run one SELECT per token; instead the whole
+lexicon (~11k rows) is read once and looked up in memory. the build loads
+it once and hands the same Lexicon to every video.
+
+entries are bucketed by pos tag ({pos_tag: {word: word_id}}) so there is
+one small dict per tag rather than a tuple key per row.
+
+when a (word, pos_tag) pair exists at several topik levels the lowest
+level wins, which is the row the old
+    SELECT word_id FROM Words WHERE word = ? AND pos_tag = ?
+returned (it walks the UNIQUE(word, pos_tag, topik_level) index).
+
+load_lexicon reads it from the compiled snapshot of the topik csv
+(lexicon_snapshot.py) when Words was loaded from one, so nothing is
+queried but the few user lexicon words (user_lexicon.py), and falls back
+to Words for older databases.
+'''
+
+_EMPTY = {}
+
+
+class Lexicon:
+    def __init__(self, entries=()):
+        """entries: iterable of (word, pos_tag, word_id), first one wins"""
+        self._by_pos = {}
+        self._size = 0
+        for word, pos_tag, word_id in entries:
+            bucket = self._by_pos.setdefault(pos_tag, {})
+            if word not in bucket:
+                bucket[word] = word_id
+                self._size += 1
+
+    @classmethod
+    def from_db(cls, conn):
+        rows = conn.execute("""
+            SELECT word, pos_tag, word_id FROM Words
+            ORDER BY word, pos_tag, topik_level
+        """)
+        return cls(rows)
+
+    def lookup(self, word, pos_tag):
+        """word_id or None"""
+        return self._by_pos.get(pos_tag, _EMPTY).get(word)
+
+    def items(self):
+        """(word, pos_tag, word_id) of every entry"""
+        for pos_tag, bucket in self._by_pos.items():
+            for word, word_id in bucket.items():
+                yield word, pos_tag, word_id
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        word, pos_tag = key
+        return self.lookup(word, pos_tag) is not None
+
+
+def load_lexicon(conn):
+    """from the compiled snapshot Words was loaded from (lexicon_snapshot.py) plus the
+    user lexicon words, else from Words"""
+    from database.lexicon_snapshot import load_snapshot, snapshot_for
+    from database.user_lexicon import user_entries
+
+    path = snapshot_for(conn)
+    if path is None:
+        return Lexicon.from_db(conn)
+    return load_snapshot(path).lexicon(user_entries(conn))
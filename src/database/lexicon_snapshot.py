@@ -0,0 +1,239 @@
+'''
+compiled lexicon snapshot: the cleaned topik csv as one small binary file
+(.klex), so nothing has to re-read the csv or query Words for the lexicon.
+
+one entry per distinct (word, pos_tag, topik_level) of the csv, sorted
+by (word, pos_tag, topik_level), as columns:
+
+  word_offsets, word_bytes   the utf-8 words: entry i is [word_offsets[i], word_offsets[i+1])
+  pos                        index into the header's pos tags
+  level, homonym             topik level, 1 if the csv marks it a homonym
+  word_id                    its Words.word_id
+
+word_ids are the csv row numbers, the ids INSERT OR IGNORE into an
+empty Words table hands out, and insert_words now inserts them explicitly
+from the snapshot, so a database loaded from a snapshot and the snapshot agree
+by construction. the LexiconSource table records which csv (sha256) the
+Words table came from.
+
+the file is named after the sha256 of the csv it was compiled from
+(cache/lexicon_<hash>.klex), so editing the csv or rerunning
+clean_topik_data.py just compiles a new one next to the old. layout as in
+pipeline/token_store.py: 8 byte magic, little-endian u64 header length, a
+json header (csv hash, pos tags, dtype / offset / count of each array),
+then the arrays, each 8-byte aligned.
+
+python lexicon_snapshot.py                      # compile (if needed) for the current csv
+python lexicon_snapshot.py --csv other.csv
+python lexicon_snapshot.py --info ../../cache/lexicon_0123456789abcdef.klex
+'''
+
+import argparse
+import hashlib
+import json
+import struct
+import sys
+import time
+from itertools import chain
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.insert_words import read_words, CLEANED_CSV_PATH
+from database.lexicon import Lexicon
+
+MAGIC = b"KLEX\x00\x00\x00\x01"
+FORMAT_VERSION = 1
+ALIGN = 8
+SUFFIX = ".klex"
+SNAPSHOT_DIR = Path(__file__).resolve().parent.parent.parent / "cache"
+
+ARRAYS = {
+    "word_offsets": "<u4",
+    "word_bytes": "u1",
+    "pos": "u1",
+    "level": "u1",
+    "homonym": "u1",
+    "word_id": "<u4",
+}
+
+
+def csv_sha256(csv_path=CLEANED_CSV_PATH):
+    return hashlib.sha256(Path(csv_path).read_bytes()).hexdigest()
+
+
+def snapshot_path(sha256, snapshot_dir=SNAPSHOT_DIR):
+    return Path(snapshot_dir) / f"lexicon_{sha256[:16]}{SUFFIX}"
+
+
+def csv_entries(csv_path=CLEANED_CSV_PATH):
+    """(word, pos_tag, topik_level, homonym, word_id) per distinct (word, pos_tag, topik_level).
+    first row wins and word_id is its row number, like INSERT OR IGNORE (which
+    uses up an id on every ignored duplicate too)"""
+    entries = {}
+    for row_number, (word, pos_tag, level, homonym) in enumerate(read_words(csv_path), 1):
+        key = (word, pos_tag, level)
+        if key not in entries:
+            entries[key] = (homonym, row_number)
+    return [key + value for key, value in entries.items()]
+
+
+def compile_snapshot(csv_path=CLEANED_CSV_PATH, path=None, sha256=None):
+    """write the snapshot of csv_path (via a temp file) and return its path"""
+    sha256 = sha256 or csv_sha256(csv_path)
+    path = Path(path) if path is not None else snapshot_path(sha256)
+    entries = sorted(csv_entries(csv_path))
+    pos_tags = sorted({pos_tag for _, pos_tag, _, _, _ in entries})
+    pos_ids = {pos_tag: i for i, pos_tag in enumerate(pos_tags)}
+
+    encoded = [word.encode("utf-8") for word, _, _, _, _ in entries]
+    columns = {
+        "word_offsets": np.concatenate(([0], np.cumsum([len(word) for word in encoded], dtype=np.int64))),
+        "word_bytes": np.frombuffer(b"".join(encoded), dtype=np.uint8),
+        "pos": [pos_ids[pos_tag] for _, pos_tag, _, _, _ in entries],
+        "level": [level for _, _, level, _, _ in entries],
+        "homonym": [homonym for _, _, _, homonym, _ in entries],
+        "word_id": [word_id for _, _, _, _, word_id in entries],
+    }
+
+    arrays = {}
+    body = bytearray()
+    for name, dtype in ARRAYS.items():
+        body.extend(b"\0" * (-len(body) % ALIGN))
+        data = np.asarray(columns[name]).astype(dtype)
+        arrays[name] = {"dtype": dtype, "offset": len(body), "count": len(data)}
+        body.extend(data.tobytes())
+
+    header = json.dumps({
+        "version": FORMAT_VERSION,
+        "csv_sha256": sha256,
+        "pos_tags": pos_tags,
+        "arrays": arrays,
+    }, ensure_ascii=False).encode("utf-8")
+    header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header)))
+        f.write(header)
+        f.write(body)
+    tmp_path.replace(path)
+    return path
+
+
+class LexiconSnapshot:
+    """the arrays of a .klex file, read in one go (a few hundred kB)"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        data = self.path.read_bytes()
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{self.path} is not a lexicon snapshot")
+        (header_len,) = struct.unpack_from("<Q", data, len(MAGIC))
+        start = len(MAGIC) + 8
+        header = json.loads(data[start:start + header_len].decode("utf-8"))
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: format version {header['version']}, expected {FORMAT_VERSION}")
+
+        self.csv_sha256 = header["csv_sha256"]
+        self.pos_tags = header["pos_tags"]
+        buf = np.frombuffer(data, dtype=np.uint8)
+        start += header_len
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            offset = start + spec["offset"]
+            setattr(self, name, buf[offset:offset + spec["count"] * dtype.itemsize].view(dtype))
+        self._words = None
+
+    def __len__(self):
+        return len(self.word_id)
+
+    @property
+    def words(self):
+        if self._words is None:
+            raw = self.word_bytes.tobytes()
+            offsets = self.word_offsets.tolist()
+            self._words = [raw[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+        return self._words
+
+    def entries(self):
+        """(word, pos_tag, topik_level, homonym, word_id), sorted by word, pos_tag, level"""
+        pos_tags = self.pos_tags
+        return [(word, pos_tags[pos], level, homonym, word_id) for word, pos, level, homonym, word_id
+                in zip(self.words, self.pos.tolist(), self.level.tolist(), self.homonym.tolist(),
+                       self.word_id.tolist())]
+
+    def lexicon(self, extra=()):
+        """the same Lexicon as Lexicon.from_db on a Words table loaded from this snapshot.
+        extra: more (word, pos_tag, word_id) entries, e.g. the user lexicon's"""
+        pos_tags = self.pos_tags
+        return Lexicon(chain(
+            zip(self.words, [pos_tags[pos] for pos in self.pos.tolist()], self.word_id.tolist()), extra))
+
+
+def load_snapshot(path):
+    return LexiconSnapshot(path)
+
+
+def ensure_snapshot(csv_path=CLEANED_CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """path of the snapshot of csv_path as it is now, compiled first if there is none"""
+    sha256 = csv_sha256(csv_path)
+    path = snapshot_path(sha256, snapshot_dir)
+    if not path.exists():
+        compile_snapshot(csv_path, path, sha256)
+    return path
+
+
+def record_source(conn, sha256):
+    """remember which csv the Words table was loaded from (None: not one snapshot)"""
+    conn.execute("DELETE FROM LexiconSource")
+    if sha256 is not None:
+        conn.execute("INSERT INTO LexiconSource (id, csv_sha256) VALUES (1, ?)", (sha256,))
+
+
+def snapshot_for(conn, csv_path=CLEANED_CSV_PATH, snapshot_dir=SNAPSHOT_DIR):
+    """the snapshot matching conn's Words table, or None if it wasn't loaded from one.
+
+    recompiled from csv_path when the file is gone but the csv still has
+    the hash the database recorded.
+    """
+    try:
+        row = conn.execute("SELECT csv_sha256 FROM LexiconSource WHERE id = 1").fetchone()
+    except Exception:
+        return None  # older database, no LexiconSource table
+    if row is None:
+        return None
+    path = snapshot_path(row[0], snapshot_dir)
+    if path.exists():
+        return path
+    if Path(csv_path).exists() and csv_sha256(csv_path) == row[0]:
+        return compile_snapshot(csv_path, path, row[0])
+    return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compile the cleaned TOPIK csv into a lexicon snapshot.")
+    parser.add_argument("--csv", type=Path, default=CLEANED_CSV_PATH, help="Cleaned TOPIK csv")
+    parser.add_argument("--out-dir", type=Path, default=SNAPSHOT_DIR, help="Where snapshots go")
+    parser.add_argument("--info", type=Path, help="Describe this snapshot instead")
+    args = parser.parse_args()
+
+    path = args.info or ensure_snapshot(args.csv, args.out_dir)
+    start = time.perf_counter()
+    snapshot = load_snapshot(path)
+    lexicon = snapshot.lexicon()
+    seconds = time.perf_counter() - start
+    print(f"📦 {path}")
+    print(f"   csv sha256 {snapshot.csv_sha256}")
+    print(f"   {len(snapshot)} entries, {len(lexicon)} (word, pos_tag) pairs, {len(snapshot.pos_tags)} pos tags")
+    print(f"   loaded in {seconds * 1000:.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
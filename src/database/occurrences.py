@@ -0,0 +1,270 @@
+'''
+subtitle lines, word occurrences and the concordance (schema.sql:
+SubtitleLines, WordOccurrences, SubtitleLinesFTS).
+
+the build keeps every subtitle line of a video (index, start / end in ms,
+text) and, for each matched word, the lines it occurs in. that gives two
+lookups straight from indexes instead of rescanning the jsonl files:
+
+- examples(): lines a word occurs in, with timestamps (by word_id, so
+  by lemma: 버리다 finds 버려, 버렸어, ...)
+- kwic(): keyword in context over the raw line text, through the fts5
+  index (a prefix match on the eojeol by default, so 진짜 finds 진짜로)
+
+both take a limit and an optional per_video cap, so a common word gives
+examples spread over many videos rather than the first 10 of one.
+
+python occurrences.py --db korean_vocab.db --word 버리다 --limit 10 --per-video 2
+python occurrences.py --db korean_vocab.db --kwic 진짜 --limit 20
+'''
+
+import argparse
+import os
+import pickle
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+
+# highlight() markers, split on again in kwic()
+_OPEN, _CLOSE = "\x02", "\x03"
+
+SPOOL_LINES = 1024  # lines a LineSpool holds in memory before writing them out
+
+
+def time_to_ms(value):
+    """ms from an int (already ms) or an "HH:MM:SS[.ffffff]" / "HH:MM:SS,mmm" string"""
+    if value is None or isinstance(value, int):
+        return value
+    hms, _, fraction = str(value).replace(",", ".").partition(".")
+    hours, minutes, seconds = (int(part) for part in hms.split(":"))
+    ms = int((fraction + "000")[:3]) if fraction else 0
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + ms
+
+
+def format_ms(ms):
+    if ms is None:
+        return "?"
+    seconds, ms = divmod(ms, 1000)
+    minutes, seconds = divmod(seconds, 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{hours:d}:{minutes:02d}:{seconds:02d}.{ms:03d}"
+
+
+class LineSpool:
+    """the kept lines of a TokenCounts, in a temp file a chunk at a time
+    rather than in a list, so a worker's memory doesn't grow with the
+    length of the file. pickles as its path, so the worker can hand it to
+    the writer, which reads it back (write_lines) and discards it"""
+
+    def __init__(self, dir=None):
+        fd, self.path = tempfile.mkstemp(prefix="lines.", suffix=".spool", dir=dir)
+        self._file = os.fdopen(fd, "wb")
+        self._chunk = []
+        self.count = 0
+
+    def append(self, line):
+        self._chunk.append(line)
+        self.count += 1
+        if len(self._chunk) >= SPOOL_LINES:
+            self._flush()
+
+    def _flush(self):
+        if self._chunk:
+            pickle.dump(self._chunk, self._file, protocol=pickle.HIGHEST_PROTOCOL)
+            self._chunk = []
+
+    def close(self):
+        if self._file is not None:
+            self._flush()
+            self._file.close()
+            self._file = None
+
+    def __len__(self):
+        return self.count
+
+    def __iter__(self):
+        self.close()
+        with open(self.path, "rb") as f:
+            while True:
+                try:
+                    chunk = pickle.load(f)
+                except EOFError:
+                    return
+                yield from chunk
+
+    def __getstate__(self):
+        self.close()
+        return {"path": self.path, "count": self.count}
+
+    def __setstate__(self, state):
+        self.__dict__.update(state, _file=None, _chunk=[])
+
+    def discard(self):
+        self.close()
+        Path(self.path).unlink(missing_ok=True)
+
+
+def write_lines(conn, video_id, counts):
+    """store the lines and word occurrences kept by a TokenCounts(keep_lines=...).
+
+    line_ids are handed out here, in file order, so the occurrences can
+    go in with the same executemany pass. the lines are streamed through,
+    a spooled TokenCounts is never loaded whole. does not commit.
+    """
+    if not counts.lines:
+        return 0
+    first = conn.execute("SELECT COALESCE(MAX(line_id), 0) + 1 FROM SubtitleLines").fetchone()[0]
+    conn.executemany("""
+        INSERT INTO SubtitleLines (line_id, video_id, subtitle_index, start_ms, end_ms, text,
+                                   token_count, content_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, (
+        (first + i, video_id, index, start_ms, end_ms, text, tokens, content)
+        for i, (index, start_ms, end_ms, text, _, tokens, content) in enumerate(counts.lines)
+    ))
+    conn.executemany("""
+        INSERT INTO WordOccurrences (word_id, video_id, line_id, frequency)
+        VALUES (?, ?, ?, ?)
+    """, (
+        (word_id, video_id, first + i, n)
+        for i, (_, _, _, _, line_words, _, _) in enumerate(counts.lines)
+        for word_id, n in line_words.items()
+    ))
+    return len(counts.lines)
+
+
+def delete_lines(conn, video_id):
+    """drop a video's lines and occurrences (the fts rows follow by trigger). does not commit"""
+    conn.execute("DELETE FROM WordOccurrences WHERE video_id = ?", (video_id,))
+    conn.execute("DELETE FROM SubtitleLines WHERE video_id = ?", (video_id,))
+
+
+def word_ids_for(conn, word, pos_tag=None):
+    """every word_id of a lemma (all pos and levels, or just pos_tag)"""
+    if pos_tag is None:
+        rows = conn.execute("SELECT word_id FROM Words WHERE word = ?", (word,))
+    else:
+        rows = conn.execute("SELECT word_id FROM Words WHERE word = ? AND pos_tag = ?", (word, pos_tag))
+    return [word_id for word_id, in rows]
+
+
+def _capped(inner_sql, per_video):
+    """keep at most per_video rows of each video from inner_sql (which selects line_id, video_id)"""
+    if per_video is None:
+        return inner_sql
+    return f"""
+        SELECT line_id, video_id FROM (
+            SELECT line_id, video_id,
+                   ROW_NUMBER() OVER (PARTITION BY video_id ORDER BY line_id) AS n
+            FROM ({inner_sql})
+        ) WHERE n <= {int(per_video)}
+    """
+
+
+def examples(conn, word_ids, limit=10, per_video=None):
+    """[(video_name, subtitle_index, start_ms, end_ms, text)] of lines containing any of word_ids,
+    in video / time order"""
+    word_ids = list(word_ids)
+    if not word_ids:
+        return []
+    inner = f"""
+        SELECT DISTINCT line_id, video_id FROM WordOccurrences
+        WHERE word_id IN ({','.join('?' * len(word_ids))})
+    """
+    return conn.execute(f"""
+        SELECT v.video_name, l.subtitle_index, l.start_ms, l.end_ms, l.text
+        FROM ({_capped(inner, per_video)}) o
+        JOIN SubtitleLines l ON l.line_id = o.line_id
+        JOIN Videos v ON v.video_id = o.video_id
+        ORDER BY o.video_id, o.line_id
+        LIMIT ?
+    """, word_ids + [limit]).fetchall()
+
+
+def fts_query(term, prefix=True):
+    """term as one quoted fts5 phrase, so user input can't be read as query syntax"""
+    return '"' + term.replace('"', '""') + '"' + ("*" if prefix else "")
+
+
+def _unmark(text):
+    return text.replace(_OPEN, "").replace(_CLOSE, "")
+
+
+def kwic(conn, term, limit=20, per_video=None, prefix=True):
+    """[(video_name, start_ms, left, keyword, right)] for lines whose text matches term"""
+    matching = """
+        SELECT f.rowid AS line_id, l.video_id
+        FROM SubtitleLinesFTS f
+        JOIN SubtitleLines l ON l.line_id = f.rowid
+        WHERE SubtitleLinesFTS MATCH :query
+    """
+    # pick (and cap / limit) the lines first, then highlight only those
+    picked = f"""
+        SELECT line_id FROM ({_capped(matching, per_video)})
+        ORDER BY video_id, line_id
+        LIMIT :limit
+    """
+    rows = conn.execute(f"""
+        SELECT v.video_name, l.start_ms, highlight(SubtitleLinesFTS, 0, :open, :close)
+        FROM SubtitleLinesFTS
+        JOIN SubtitleLines l ON l.line_id = SubtitleLinesFTS.rowid
+        JOIN Videos v ON v.video_id = l.video_id
+        WHERE SubtitleLinesFTS MATCH :query AND SubtitleLinesFTS.rowid IN ({picked})
+        ORDER BY l.video_id, l.line_id
+    """, {"query": fts_query(term, prefix), "open": _OPEN, "close": _CLOSE, "limit": limit}).fetchall()
+
+    results = []
+    for video_name, start_ms, marked in rows:
+        left, _, rest = marked.partition(_OPEN)
+        keyword, _, right = rest.partition(_CLOSE)
+        results.append((video_name, start_ms, _unmark(left).rstrip(), keyword, _unmark(right).lstrip()))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Example lines and keyword-in-context lookups.")
+    parser.add_argument("--db", default="korean_vocab.db", help="Path to SQLite database")
+    lookup = parser.add_mutually_exclusive_group(required=True)
+    lookup.add_argument("--word", help="Lemma as in the Words table (e.g. 버리다)")
+    lookup.add_argument("--kwic", help="Text to search the subtitle lines for")
+    parser.add_argument("--pos", help="Only this pos_tag of --word")
+    parser.add_argument("--exact", action="store_true", help="--kwic matches whole eojeol only, not prefixes")
+    parser.add_argument("--limit", type=int, default=10, help="Max lines (default 10)")
+    parser.add_argument("--per-video", type=int, help="Max lines per video")
+    parser.add_argument("--width", type=int, default=30, help="KWIC context width in characters")
+    args = parser.parse_args()
+
+    conn = connect_readonly(args.db)
+    try:
+        t0 = time.perf_counter()
+        if args.word:
+            word_ids = word_ids_for(conn, args.word, args.pos)
+            if not word_ids:
+                print(f"❌ {args.word} is not in the Words table")
+                sys.exit(1)
+            rows = examples(conn, word_ids, args.limit, args.per_video)
+            elapsed = time.perf_counter() - t0
+            print(f"=== {len(rows)} line(s) with {args.word} ===")
+            for video_name, _, start_ms, end_ms, text in rows:
+                print(f"[{video_name} {format_ms(start_ms)} - {format_ms(end_ms)}] {text}")
+        else:
+            rows = kwic(conn, args.kwic, args.limit, args.per_video, prefix=not args.exact)
+            elapsed = time.perf_counter() - t0
+            print(f"=== {len(rows)} line(s) matching {args.kwic} ===")
+            for video_name, start_ms, left, keyword, right in rows:
+                print(f"{left[-args.width:]:>{args.width}} [{keyword}] {right[:args.width]:<{args.width}}"
+                      f"  ({video_name} {format_ms(start_ms)})")
+        print(f"({elapsed * 1000:.1f} ms)")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
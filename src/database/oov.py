@@ -0,0 +1,211 @@
+'''
+out-of-vocabulary tokens across the corpus: what the tagger produced that
+the Words table does not have (UnmatchedTokens) and what was left out for
+its pos (IgnoredTokens), both counted per (word, pos_tag, video) by the
+build in the same transaction as WordFrequency.
+
+corpus totals of the unmatched tokens are kept in OovTotals by triggers
+(schema.sql), so the top OOV words are a walk down its total_freq index
+rather than a GROUP BY over every video. --check / --rebuild compare them
+with a recomputation, like aggregates.py does for WordTotals.
+
+--promote takes the top OOV words (seen in at least --min-videos videos)
+into the user lexicon (user_lexicon.py): appended to
+aux_data/user_lexicon.csv, added to Words, and the videos they occur in
+flagged so the next build_database.py run recounts them. --dry-run just
+shows what would be promoted.
+
+the per-video text logs the build used to write (logs/ignored_tokens_*.txt,
+logs/unmatched_tokens_*.txt) are an export now: --export-logs DIR writes
+them from the tables, with counts.
+
+python oov.py --db korean_vocab.db --top 50
+python oov.py --db korean_vocab.db --top 50 --pos Noun Verb --min-videos 5
+python oov.py --db korean_vocab.db --video 12
+python oov.py --db korean_vocab.db --ignored --top 20
+python oov.py --db korean_vocab.db --promote 30 --min-videos 5 --dry-run
+python oov.py --db korean_vocab.db --export-logs ../../logs
+'''
+
+import argparse
+import logging
+import sqlite3
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+from database.process_tokens import TokenCounts, write_logs
+from database.user_lexicon import USER_LEXICON_PATH, append_user_words, sync_user_words
+
+OOV_TOTALS_SQL = """
+    SELECT word, pos_tag, SUM(frequency), COUNT(*)
+    FROM UnmatchedTokens
+    GROUP BY word, pos_tag
+"""
+
+
+def _pos_filter(pos_tags, column="pos_tag"):
+    if not pos_tags:
+        return "", []
+    return f"AND {column} IN ({','.join('?' * len(pos_tags))})", list(pos_tags)
+
+
+def top_oov(conn, limit=50, min_videos=1, pos_tags=None):
+    """[(word, pos_tag, total_freq, video_count)] of the most frequent unmatched tokens.
+    words added to Words since (promoted, waiting for a recount) are left out"""
+    pos_where, params = _pos_filter(pos_tags, "o.pos_tag")
+    return conn.execute(f"""
+        SELECT o.word, o.pos_tag, o.total_freq, o.video_count
+        FROM OovTotals o
+        WHERE o.total_freq > 0 AND o.video_count >= ? {pos_where}
+          AND NOT EXISTS (SELECT 1 FROM Words w WHERE w.word = o.word AND w.pos_tag = o.pos_tag)
+        ORDER BY o.total_freq DESC
+        LIMIT ?
+    """, [min_videos, *params, limit]).fetchall()
+
+
+def top_ignored(conn, limit=50, pos_tags=None):
+    """[(word, pos_tag, total_freq, video_count)] of the most frequent tokens left out for their pos"""
+    pos_where, params = _pos_filter(pos_tags)
+    return conn.execute(f"""
+        SELECT word, pos_tag, SUM(frequency) AS n, COUNT(*)
+        FROM IgnoredTokens
+        WHERE 1 {pos_where}
+        GROUP BY word, pos_tag
+        ORDER BY n DESC
+        LIMIT ?
+    """, [*params, limit]).fetchall()
+
+
+def video_oov(conn, video_id, limit=50):
+    """[(word, pos_tag, frequency)] unmatched in one video, most frequent first"""
+    return conn.execute("""
+        SELECT word, pos_tag, frequency
+        FROM UnmatchedTokens
+        WHERE video_id = ?
+        ORDER BY frequency DESC, word
+        LIMIT ?
+    """, (video_id, limit)).fetchall()
+
+
+def videos_with(conn, word, pos_tag):
+    """[(video_id, video_name, frequency)] a (word, pos_tag) was unmatched in"""
+    return conn.execute("""
+        SELECT u.video_id, v.video_name, u.frequency
+        FROM UnmatchedTokens u
+        JOIN Videos v ON v.video_id = u.video_id
+        WHERE u.word = ? AND u.pos_tag = ?
+        ORDER BY u.frequency DESC
+    """, (word, pos_tag)).fetchall()
+
+
+def rebuild_oov_totals(conn):
+    """recompute OovTotals from UnmatchedTokens. does not commit"""
+    conn.execute("DELETE FROM OovTotals")
+    conn.execute(f"INSERT INTO OovTotals (word, pos_tag, total_freq, video_count) {OOV_TOTALS_SQL}")
+
+
+def check_oov_totals(conn):
+    """OovTotals rows that differ from a recomputation, as (extra, missing)"""
+    stored = "SELECT word, pos_tag, total_freq, video_count FROM OovTotals"
+    extra = conn.execute(f"{stored} EXCEPT {OOV_TOTALS_SQL}").fetchall()
+    missing = conn.execute(f"{OOV_TOTALS_SQL} EXCEPT {stored}").fetchall()
+    return extra, missing
+
+
+def promote(conn, limit, min_videos=1, pos_tags=None, csv_path=USER_LEXICON_PATH):
+    """the top OOV words into the user lexicon and Words. does not commit.
+
+    returns (promoted [(word, pos_tag, total_freq, video_count)], videos flagged for a recount)
+    """
+    candidates = top_oov(conn, limit, min_videos, pos_tags)
+    promoted = append_user_words(candidates, csv_path)
+    _, flagged = sync_user_words(conn, csv_path)
+    return promoted, flagged
+
+
+def export_logs(conn, log_dir, video_ids=None):
+    """the old per-video ignored / unmatched token logs, from the tables. returns how many videos"""
+    videos = conn.execute("SELECT video_id, video_name FROM Videos ORDER BY video_id").fetchall()
+    if video_ids is not None:
+        wanted = set(video_ids)
+        videos = [(video_id, name) for video_id, name in videos if video_id in wanted]
+    for video_id, name in videos:
+        counts = TokenCounts()
+        for table, words in (("UnmatchedTokens", counts.unmatched_words), ("IgnoredTokens", counts.ignored_words)):
+            for word, pos_tag, n in conn.execute(
+                    f"SELECT word, pos_tag, frequency FROM {table} WHERE video_id = ?", (video_id,)):
+                words[word, pos_tag] = n
+        write_logs(counts, name, log_dir)
+    return len(videos)
+
+
+def print_rows(rows):
+    for word, pos_tag, total, videos in rows:
+        print(f"{total:>7}  {videos:>4} videos  {word} ({pos_tag})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Out-of-vocabulary tokens across the corpus.")
+    parser.add_argument("--db", type=Path, required=True, help="Path to SQLite database")
+    parser.add_argument("--top", type=int, default=30, help="How many words to list")
+    parser.add_argument("--pos", nargs="+", help="Only these pos tags")
+    parser.add_argument("--min-videos", type=int, default=1, help="Only words unmatched in at least this many videos")
+    parser.add_argument("--ignored", action="store_true", help="List the most frequent ignored tokens instead")
+    parser.add_argument("--video", type=int, help="The unmatched tokens of this video_id")
+    parser.add_argument("--word", nargs=2, metavar=("WORD", "POS"), help="The videos a token was unmatched in")
+    parser.add_argument("--promote", type=int, metavar="N",
+                        help="Add the top N OOV words to the user lexicon and Words")
+    parser.add_argument("--dry-run", action="store_true", help="With --promote, only show the candidates")
+    parser.add_argument("--csv", type=Path, default=USER_LEXICON_PATH, help="User lexicon csv")
+    parser.add_argument("--export-logs", type=Path, metavar="DIR", help="Write the per-video text logs to DIR")
+    parser.add_argument("--check", action="store_true", help="Check OovTotals against UnmatchedTokens")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute OovTotals")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    writes = args.rebuild or (args.promote and not args.dry_run)
+    conn = sqlite3.connect(args.db) if writes else connect_readonly(args.db)
+    try:
+        if args.rebuild:
+            with conn:
+                rebuild_oov_totals(conn)
+            logging.info("✅ OovTotals recomputed")
+        if args.check or args.rebuild:
+            extra, missing = check_oov_totals(conn)
+            if extra or missing:
+                logging.error(f"X OovTotals: {len(extra)} stale row(s), {len(missing)} missing (--rebuild)")
+            else:
+                logging.info("✅ OovTotals consistent with UnmatchedTokens")
+        elif args.promote:
+            if args.dry_run:
+                print_rows(top_oov(conn, args.promote, args.min_videos, args.pos))
+            else:
+                with conn:
+                    promoted, flagged = promote(conn, args.promote, args.min_videos, args.pos, args.csv)
+                print_rows(promoted)
+                logging.info(f"✅ {len(promoted)} word(s) promoted to {args.csv.name}, {flagged} video(s) "
+                             "flagged for a recount (rerun build_database.py)")
+        elif args.export_logs:
+            n = export_logs(conn, args.export_logs)
+            logging.info(f"✅ logs of {n} video(s) written to {args.export_logs}")
+        elif args.word:
+            for video_id, name, n in videos_with(conn, *args.word):
+                print(f"{n:>6}  {video_id:>5}  {name}")
+        elif args.video is not None:
+            for word, pos_tag, n in video_oov(conn, args.video, args.top):
+                print(f"{n:>6}  {word} ({pos_tag})")
+        elif args.ignored:
+            print_rows(top_ignored(conn, args.top, args.pos))
+        else:
+            print_rows(top_oov(conn, args.top, args.min_videos, args.pos))
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
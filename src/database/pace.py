@@ -0,0 +1,327 @@
+'''
+speech rate, lexical density and difficulty curves from the subtitle
+timestamps (VideoPace, VideoDifficulty, SeriesPace, SeriesDifficulty).
+
+per video, from its SubtitleLines (start / end ms, token counts) and the
+levels of the words matched in them (WordOccurrences):
+
+  tokens / syllables per second   over the summed duration of its lines
+                                  (syllables: the hangul in the line text)
+  lexical density                 content tokens over all tokens: what
+                                  isn't a particle, suffix, determiner, ...
+                                  over everything but punctuation
+  difficulty curve                the video cut into window_ms slices by
+                                  line start (2 minutes by default), and for
+                                  each slice and k = 1..6 the share of its
+                                  content tokens above level k (unmatched and
+                                  user lexicon words are above every level)
+
+the maths is done on numpy arrays for any number of videos at once
+(bincounts over line -> video and line -> window keys), so the whole
+corpus is one pass over SubtitleLines and WordOccurrences. the build
+refreshes a video's rows in the same transaction as its counts, and the
+series tables once at the end. a series is the directory of the source
+(drama/Coffee_Prince, youtube); its rates are totals over its speech
+time, not an average of per-episode rates, and p90_above_share is the
+90th percentile (nearest rank) of its windows.
+
+lines stored before their token counts were (token_count NULL) are left
+out; a --fresh build fills them in.
+
+python pace.py --db korean_vocab.db --rebuild                 # whole corpus
+python pace.py --db korean_vocab.db --rebuild --window 60     # one minute windows
+python pace.py --db korean_vocab.db --series                  # shows by pace
+python pace.py --db korean_vocab.db --series --by difficulty --level 3
+python pace.py --db korean_vocab.db --videos --top 20
+python pace.py --db korean_vocab.db --curve 12 --level 3
+'''
+
+import argparse
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+from database.profiles import TOPIK_LEVELS, MAX_LEVEL, _in_clause
+from database.shards import series_of
+
+WINDOW_MS = 120_000
+HANGUL_FIRST, HANGUL_LAST = 0xAC00, 0xD7A3
+PACE_COLUMNS = ("lines", "speech_seconds", "tokens", "content_tokens", "syllables")
+
+
+def syllable_counts(texts):
+    """hangul syllables in each text, one pass over all their code points"""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype="<u4")
+    hangul = np.concatenate(([0], np.cumsum((codes >= HANGUL_FIRST) & (codes <= HANGUL_LAST))))
+    ends = np.cumsum(lengths)
+    return hangul[ends] - hangul[ends - lengths]
+
+
+def current_window(conn):
+    """the window_ms the stored curves were cut with (WINDOW_MS if there are none)"""
+    row = conn.execute("SELECT window_ms FROM VideoPace LIMIT 1").fetchone()
+    return row[0] if row else WINDOW_MS
+
+
+def compute_pace(conn, video_ids=None, window_ms=WINDOW_MS):
+    """(video_ids, pace, windows) as numpy arrays.
+
+    pace maps each of PACE_COLUMNS to one value per video. windows is
+    (video row, window index, content tokens, above) for every window
+    with content tokens, above of shape (n_windows, 6): column k-1 is the
+    tokens above level k. only videos with counted lines are included.
+    """
+    lines_where = occ_where = ""
+    params = ()
+    if video_ids is not None:
+        params = list(video_ids)
+        lines_where = f"AND video_id {_in_clause(params)}"
+        occ_where = f"WHERE o.video_id {_in_clause(params)}"
+
+    lines = conn.execute(f"""
+        SELECT line_id, video_id, start_ms, end_ms, token_count, content_count, text
+        FROM SubtitleLines
+        WHERE token_count IS NOT NULL {lines_where}
+        ORDER BY line_id
+    """, params).fetchall()
+    if not lines:
+        empty = np.zeros(0, dtype=np.int64)
+        return empty, {column: empty for column in PACE_COLUMNS}, (empty, empty, empty, np.zeros((0, MAX_LEVEL)))
+
+    line_ids, video_of, start, end, tokens, content, texts = zip(*lines)
+    line_ids = np.array(line_ids, dtype=np.int64)
+    vids, row = np.unique(np.array(video_of, dtype=np.int64), return_inverse=True)
+    start = np.array(start, dtype=float)  # missing timestamps become nan
+    end = np.array(end, dtype=float)
+    tokens = np.array(tokens, dtype=np.int64)
+    content = np.array(content, dtype=np.int64)
+
+    # matched tokens of each line by level, then the content tokens above level k
+    occ = np.array(conn.execute(f"""
+        SELECT o.line_id, w.topik_level, o.frequency
+        FROM WordOccurrences o
+        JOIN Words w ON w.word_id = o.word_id
+        {occ_where}
+    """, params).fetchall(), dtype=np.int64).reshape(-1, 3)
+    line_row = np.searchsorted(line_ids, occ[:, 0])
+    keep = line_row < len(line_ids)
+    keep[keep] = line_ids[line_row[keep]] == occ[keep, 0]
+    n_bins = MAX_LEVEL + 1
+    by_level = np.bincount(line_row[keep] * n_bins + np.clip(occ[keep, 1], 0, MAX_LEVEL),
+                           weights=occ[keep, 2], minlength=len(line_ids) * n_bins).reshape(-1, n_bins)
+    above = np.clip(content[:, None] - np.cumsum(by_level[:, 1:], axis=1), 0, None)
+
+    n = len(vids)
+    duration = np.nan_to_num(np.clip(end - start, 0, None))
+    pace = {
+        "lines": np.bincount(row, minlength=n),
+        "speech_seconds": np.bincount(row, weights=duration, minlength=n) / 1000,
+        "tokens": np.bincount(row, weights=tokens, minlength=n).astype(np.int64),
+        "content_tokens": np.bincount(row, weights=content, minlength=n).astype(np.int64),
+        "syllables": np.bincount(row, weights=syllable_counts(texts), minlength=n).astype(np.int64),
+    }
+
+    # (video, window) keys of the timed lines, summed per key
+    timed = ~np.isnan(start)
+    window = (start[timed] // window_ms).astype(np.int64)
+    n_windows = int(window.max()) + 1 if len(window) else 1
+    keys, key_of = np.unique(row[timed] * n_windows + window, return_inverse=True)
+    win_content = np.bincount(key_of, weights=content[timed], minlength=len(keys))
+    flat = (key_of[:, None] * MAX_LEVEL + np.arange(MAX_LEVEL)).ravel()
+    win_above = np.bincount(flat, weights=above[timed].ravel(),
+                            minlength=len(keys) * MAX_LEVEL).reshape(-1, MAX_LEVEL)
+    has_content = win_content > 0
+    keys = keys[has_content]
+    windows = (keys // n_windows, keys % n_windows, win_content[has_content], win_above[has_content])
+    return vids, pace, windows
+
+
+def update_pace(conn, video_ids=None, window_ms=None):
+    """(re)write VideoPace and VideoDifficulty for video_ids, or every video. window_ms
+    defaults to the one the stored curves use. does not commit"""
+    window_ms = window_ms or current_window(conn)
+    vids, pace, (rows, window_index, win_content, win_above) = compute_pace(conn, video_ids, window_ms)
+    if video_ids is None:
+        conn.execute("DELETE FROM VideoPace")
+        conn.execute("DELETE FROM VideoDifficulty")
+    else:
+        video_ids = list(video_ids)
+        conn.execute(f"DELETE FROM VideoPace WHERE video_id {_in_clause(video_ids)}", video_ids)
+        conn.execute(f"DELETE FROM VideoDifficulty WHERE video_id {_in_clause(video_ids)}", video_ids)
+
+    seconds, tokens = pace["speech_seconds"], pace["tokens"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tokens_per_second = np.where(seconds > 0, tokens / seconds, 0.0)
+        syllables_per_second = np.where(seconds > 0, pace["syllables"] / seconds, 0.0)
+        density = np.where(tokens > 0, pace["content_tokens"] / tokens, 0.0)
+    conn.executemany("""
+        INSERT INTO VideoPace (video_id, lines, speech_seconds, tokens, content_tokens, syllables,
+                               tokens_per_second, syllables_per_second, lexical_density, window_ms)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, zip(vids.tolist(), pace["lines"].tolist(), seconds.round(3).tolist(), tokens.tolist(),
+             pace["content_tokens"].tolist(), pace["syllables"].tolist(), tokens_per_second.tolist(),
+             syllables_per_second.tolist(), density.tolist(), [window_ms] * len(vids)))
+
+    levels = np.array(TOPIK_LEVELS)
+    conn.executemany("""
+        INSERT INTO VideoDifficulty (video_id, topik_level, window_index, content_tokens, above_share)
+        VALUES (?, ?, ?, ?, ?)
+    """, zip(
+        np.repeat(vids[rows], len(levels)).tolist(),
+        np.tile(levels, len(rows)).tolist(),
+        np.repeat(window_index, len(levels)).tolist(),
+        np.repeat(win_content.astype(np.int64), len(levels)).tolist(),
+        (win_above / win_content[:, None]).ravel().tolist(),
+    ))
+    return len(vids)
+
+
+def video_series(conn):
+    """video_id -> series, from the manifest's source path (the category for a video without one)"""
+    series = {video_id: category or "unknown"
+              for video_id, category in conn.execute("SELECT video_id, category FROM Videos")}
+    for source, video_id in conn.execute("SELECT source_path, video_id FROM BuildManifest"):
+        series[video_id] = series_of(source)
+    return series
+
+
+def update_series(conn):
+    """recompute SeriesPace and SeriesDifficulty from the video tables. does not commit"""
+    of_video = video_series(conn)
+    conn.execute("DELETE FROM SeriesPace")
+    conn.execute("DELETE FROM SeriesDifficulty")
+
+    pace = np.array(conn.execute("""
+        SELECT video_id, speech_seconds, tokens, content_tokens, syllables FROM VideoPace ORDER BY video_id
+    """).fetchall(), dtype=float).reshape(-1, 5)
+    if not len(pace):
+        return 0
+    names, group = np.unique([of_video.get(int(v), "unknown") for v in pace[:, 0]], return_inverse=True)
+    n = len(names)
+    videos = np.bincount(group, minlength=n)
+    seconds, tokens, content, syllables = (np.bincount(group, weights=pace[:, i], minlength=n) for i in range(1, 5))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        tokens_per_second = np.where(seconds > 0, tokens / seconds, 0.0)
+        syllables_per_second = np.where(seconds > 0, syllables / seconds, 0.0)
+        density = np.where(tokens > 0, content / tokens, 0.0)
+    conn.executemany("""
+        INSERT INTO SeriesPace (series, videos, speech_seconds, tokens, content_tokens, syllables,
+                                tokens_per_second, syllables_per_second, lexical_density)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, zip(names.tolist(), videos.tolist(), seconds.round(3).tolist(), tokens.astype(np.int64).tolist(),
+             content.astype(np.int64).tolist(), syllables.astype(np.int64).tolist(),
+             tokens_per_second.tolist(), syllables_per_second.tolist(), density.tolist()))
+
+    windows = np.array(conn.execute(
+        "SELECT video_id, topik_level, content_tokens, above_share FROM VideoDifficulty"
+    ).fetchall(), dtype=float).reshape(-1, 4)
+    if len(windows):
+        series_index = {video_id: i for i, video_id in enumerate(pace[:, 0].astype(np.int64).tolist())}
+        keep = np.array([int(v) in series_index for v in windows[:, 0]], dtype=bool)
+        windows = windows[keep]
+        video_group = group[[series_index[int(v)] for v in windows[:, 0]]]
+        level = windows[:, 1].astype(np.int64)
+        key = video_group * MAX_LEVEL + (level - 1)
+        weight, share = windows[:, 2], windows[:, 3]
+
+        counts = np.bincount(key, minlength=n * MAX_LEVEL)
+        mean = np.bincount(key, weights=weight * share, minlength=n * MAX_LEVEL) / np.maximum(
+            np.bincount(key, weights=weight, minlength=n * MAX_LEVEL), 1)
+        # nearest-rank 90th percentile: sort by (key, share), pick inside each key's run
+        order = np.lexsort((share, key))
+        starts = np.cumsum(counts) - counts
+        present = counts > 0
+        p90 = np.zeros(len(counts))
+        p90[present] = share[order][starts[present] + np.floor(0.9 * (counts[present] - 1)).astype(np.int64)]
+        keys = np.flatnonzero(present)
+        conn.executemany("""
+            INSERT INTO SeriesDifficulty (series, topik_level, windows, mean_above_share, p90_above_share)
+            VALUES (?, ?, ?, ?, ?)
+        """, zip(names[keys // MAX_LEVEL].tolist(), (keys % MAX_LEVEL + 1).tolist(), counts[keys].tolist(),
+                 mean[keys].tolist(), p90[keys].tolist()))
+    return n
+
+
+def series_ranking(conn, level=3, by="pace"):
+    """[(series, videos, tokens/s, syllables/s, lexical density, mean above share, p90 above share)],
+    fastest (or hardest at level) first"""
+    order = {"pace": "p.syllables_per_second", "difficulty": "d.mean_above_share"}[by]
+    return conn.execute(f"""
+        SELECT p.series, p.videos, p.tokens_per_second, p.syllables_per_second, p.lexical_density,
+               COALESCE(d.mean_above_share, 0), COALESCE(d.p90_above_share, 0)
+        FROM SeriesPace p
+        LEFT JOIN SeriesDifficulty d ON d.series = p.series AND d.topik_level = ?
+        ORDER BY {order} DESC
+    """, (level,)).fetchall()
+
+
+def video_ranking(conn, limit=20):
+    """[(video_id, video_name, tokens/s, syllables/s, lexical density)], fastest first"""
+    return conn.execute("""
+        SELECT p.video_id, v.video_name, p.tokens_per_second, p.syllables_per_second, p.lexical_density
+        FROM VideoPace p
+        JOIN Videos v ON v.video_id = p.video_id
+        ORDER BY p.syllables_per_second DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def difficulty_curve(conn, video_id, level=3):
+    """[(start_ms, content_tokens, above_share)] of a video's windows, in order"""
+    window_ms = current_window(conn)
+    return [(window_index * window_ms, tokens, share) for window_index, tokens, share in conn.execute("""
+        SELECT window_index, content_tokens, above_share
+        FROM VideoDifficulty
+        WHERE video_id = ? AND topik_level = ?
+        ORDER BY window_index
+    """, (video_id, level))]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Speech rate and difficulty curves from subtitle timestamps.")
+    parser.add_argument("--db", type=Path, required=True, help="Path to SQLite database")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every video and series")
+    parser.add_argument("--window", type=float, help="Window width in seconds for --rebuild (default: as stored)")
+    parser.add_argument("--series", action="store_true", help="Rank series")
+    parser.add_argument("--by", choices=("pace", "difficulty"), default="pace", help="What --series ranks by")
+    parser.add_argument("--videos", action="store_true", help="Rank videos by syllables per second")
+    parser.add_argument("--curve", type=int, metavar="VIDEO_ID", help="Difficulty curve of one video")
+    parser.add_argument("--level", type=int, choices=TOPIK_LEVELS, default=3, help="TOPIK level for difficulty")
+    parser.add_argument("--top", type=int, default=20, help="How many videos --videos lists")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db) if args.rebuild else connect_readonly(args.db)
+    try:
+        if args.rebuild:
+            start = time.perf_counter()
+            with conn:
+                videos = update_pace(conn, window_ms=int(args.window * 1000) if args.window else None)
+                series = update_series(conn)
+            print(f"✅ pace of {videos} videos and {series} series in {time.perf_counter() - start:.2f}s")
+        if args.series:
+            print(f"{'series':<32} {'videos':>6} {'tok/s':>6} {'syl/s':>6} {'dens':>5} "
+                  f"{'>L' + str(args.level):>6} {'p90':>6}")
+            for series, videos, tps, sps, density, mean, p90 in series_ranking(conn, args.level, args.by):
+                print(f"{series:<32} {videos:>6} {tps:6.2f} {sps:6.2f} {density:5.2f} {mean:6.1%} {p90:6.1%}")
+        if args.videos:
+            for video_id, name, tps, sps, density in video_ranking(conn, args.top):
+                print(f"{sps:6.2f} syl/s  {tps:5.2f} tok/s  {density:4.2f}  {video_id:>5}  {name}")
+        if args.curve is not None:
+            for start_ms, tokens, share in difficulty_curve(conn, args.curve, args.level):
+                minutes, seconds = divmod(start_ms // 1000, 60)
+                print(f"{minutes:3d}:{seconds:02d}  {tokens:>4} tokens  {share:6.1%}  {'#' * round(share * 40)}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
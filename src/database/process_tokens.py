@@ -1,133 +1,299 @@
 '''
 this file takes in a json of the tokens from a video and adds
 words that match an entry from the topik/Words table to the database
-while counting the frequency, ignores and logs words with an ignorable
-pos, and logs and ignores words that do not match an entry from the 
-topik/Words table. 
+while counting the frequency, and counts the words with an ignorable
+pos and the ones that do not match an entry from the topik/Words table
+(IgnoredTokens / UnmatchedTokens).
 
 This is to ignore words that are potentially incorrectly parsed/tagged
 and still be able to inspect the parsed scripts for valid words not
-in the official topik lists. maybe in future we can add a new
-functionality where users can manually add their own entries to the
-Words table.
+in the official topik lists (oov.py, user_lexicon.py).
 
 run this file with: 
 python process_tokens.py episode1.json --db my.db --video-id 3
+python process_tokens.py episode1.json --db my.db --video-id 3 --logs ../../logs
 (after you have already added the entry to the videos table)
 
-this file can then be connected to another script to automatically add
-words from many json files
+build_database.py runs the same pieces (count_tokens -> write_counts)
+in-process, fed a line at a time straight from the tagger.
 '''
 
-import sqlite3
 import json
+import sys
 import argparse
 from collections import Counter, defaultdict
 from pathlib import Path
 
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.lexicon import load_lexicon
+from database.resolver import FuzzyResolver, MIN_CONFIDENCE, resolution_rate, write_resolutions
+from database.bulk_load import connect_for_build
+from database.profiles import update_profiles
+from database.pace import update_pace, update_series
+from database.occurrences import time_to_ms, write_lines
+from pipeline.token_store import iter_entries
+from pipeline.instrumentation import timed
+
 IGNORED_POS = {
     "Punctuation", "Josa", "Foreign", "Suffix", "Determiner",
     "Conjunction", "Exclamation"
 }
 
 
-# === Argument Parsing ===
-parser = argparse.ArgumentParser(description="Add word frequencies from JSON to WordFrequency table.")
-parser.add_argument("json_file", help="Path to the JSON subtitle file")
-parser.add_argument("--db", default="your_database.db", help="Path to SQLite database")
-parser.add_argument("--video-id", type=int, required=True, help="Video ID (must already exist in Videos table)")
-args = parser.parse_args()
-
-json_path = Path(args.json_file)
-basename = json_path.stem
-video_id = args.video_id
-
-
-# === Setup Logging Paths ===
-log_dir = Path("logs")
-log_dir.mkdir(parents=True, exist_ok=True)
-ignored_log_path = log_dir / f"ignored_tokens_{basename}.txt"
-unmatched_log_path = log_dir / f"unmatched_tokens_{basename}.txt"
-
-# === Connect to Database ===
-conn = sqlite3.connect(args.db)
-cursor = conn.cursor()
-
-# === Token Counters & Logs ===
-total_tokens = 0
-matched_tokens = 0
-unmatched_tokens = 0
-ignored_tokens = 0
-
-word_freq_counter = Counter()
-ignored_words_log = defaultdict(set)
-unmatched_tokens_log = set()
-
-# === Load JSON ===
-with open(json_path, encoding="utf-8") as f:
-    data = [json.loads(line) for line in f if line.strip()]
-    #data = json.load(f)
-
-# === Process Tokens ===
-for entry in data:
-    for word, pos_tag in entry.get("filtered", []):
-        total_tokens += 1
-
-        if pos_tag in IGNORED_POS:
-            ignored_tokens += 1
-            ignored_words_log[pos_tag].add(word)
-            continue
-
-        cursor.execute("""
-            SELECT word_id FROM Words
-            WHERE word = ? AND pos_tag = ?
-        """, (word, pos_tag))
-        result = cursor.fetchone()
-
-        if result:
-            matched_tokens += 1
-            word_id = result[0]
-            word_freq_counter[word_id] += 1
-        else:
-            unmatched_tokens += 1
-            unmatched_tokens_log.add((word, pos_tag))
-
-# === Insert Word Frequencies ===
-for word_id, count in word_freq_counter.items():
-    cursor.execute("""
+class TokenCounts:
+    """running totals for one video, filled one subtitle line at a time.
+
+    memory grows with the vocabulary of the video, not its length, unless
+    keep_lines is True: then every line and its matched word_ids are kept
+    in a list. keep_lines can also be a LineSpool (occurrences.py), which
+    keeps them on disk instead.
+    """
+
+    def __init__(self, keep_lines=False):
+        self.total = 0
+        self.matched = 0
+        self.ignored = 0
+        self.unmatched = 0
+        self.resolved = 0                      # of matched, via the resolver
+        self.word_freq = Counter()             # word_id -> count
+        self.ignored_words = Counter()         # (word, pos_tag) -> count
+        self.unmatched_words = Counter()       # (word, pos_tag) -> count
+        self.resolutions = {}                  # (word, pos_tag) -> [Resolution, count]
+        # [(subtitle_index, start_ms, end_ms, text, Counter(word_id), tokens, content tokens)]
+        # in file order; tokens leaves out punctuation, content tokens are matched + unmatched
+        if keep_lines is True:
+            keep_lines = []
+        self.lines = None if keep_lines is False else keep_lines
+
+    def add(self, tokens, lexicon, resolver=None):
+        """count one line's tokens, returns the Counter of word_ids matched in it"""
+        line_words = Counter()
+        for word, pos_tag in tokens:
+            self.total += 1
+
+            if pos_tag in IGNORED_POS:
+                self.ignored += 1
+                self.ignored_words[word, pos_tag] += 1
+                continue
+
+            word_id = lexicon.lookup(word, pos_tag)
+
+            if word_id is None and resolver is not None:
+                resolution = resolver.resolve(word, pos_tag)
+                if resolution is not None:
+                    word_id = resolution.word_id
+                    self.resolved += 1
+                    self.resolutions.setdefault((word, pos_tag), [resolution, 0])[1] += 1
+
+            if word_id is not None:
+                self.matched += 1
+                line_words[word_id] += 1
+            else:
+                self.unmatched += 1
+                self.unmatched_words[word, pos_tag] += 1
+
+        self.word_freq.update(line_words)
+        return line_words
+
+    def add_entry(self, entry, lexicon, resolver=None):
+        """count a tagged subtitle dict (srt_to_json), keeping the line if asked to"""
+        tokens = entry.get("filtered", [])
+        content = self.matched + self.unmatched
+        line_words = self.add(tokens, lexicon, resolver)
+        if self.lines is not None:
+            self.lines.append((
+                entry.get("index"),
+                time_to_ms(entry.get("start")),
+                time_to_ms(entry.get("end")),
+                entry.get("text", ""),
+                line_words,
+                sum(1 for _, pos_tag in tokens if pos_tag != "Punctuation"),
+                self.matched + self.unmatched - content,
+            ))
+
+    @property
+    def resolution_rate(self):
+        return resolution_rate(self.resolved, self.unmatched)
+
+    def summary(self, name, video_id):
+        return {
+            "file": name,
+            "total": self.total,
+            "matched": self.matched,
+            "ignored": self.ignored,
+            "unmatched": self.unmatched,
+            "resolved": self.resolved,
+            "resolution_rate": round(self.resolution_rate, 4),
+            "video_id": video_id,
+            "words_updated": len(self.word_freq),
+        }
+
+
+def iter_jsonl(json_path):
+    """one entry dict per non-blank line, without reading the whole file"""
+    with open(json_path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def count_tokens(entries, lexicon, counts=None, keep_lines=False, resolver=None):
+    """fold the "filtered" tokens of each entry into a TokenCounts"""
+    if counts is None:
+        counts = TokenCounts(keep_lines)
+    for entry in entries:
+        counts.add_entry(entry, lexicon, resolver)
+    return counts
+
+
+def write_counts(conn, video_id, counts):
+    """upsert a video's counts. does not commit, the caller owns the transaction"""
+    conn.executemany("""
         INSERT INTO WordFrequency (video_id, word_id, frequency)
         VALUES (?, ?, ?)
         ON CONFLICT(video_id, word_id)
         DO UPDATE SET frequency = frequency + excluded.frequency
-    """, (video_id, word_id, count))
+    """, [(video_id, word_id, count) for word_id, count in counts.word_freq.items()])
+
+
+def write_token_stats(conn, video_id, counts):
+    """add a video's token counts to VideoTokenStats. does not commit"""
+    conn.execute("""
+        INSERT INTO VideoTokenStats
+            (video_id, total_tokens, matched_tokens, ignored_tokens, unmatched_tokens, unmatched_types)
+        VALUES (?, ?, ?, ?, ?, ?)
+        ON CONFLICT(video_id) DO UPDATE SET
+            total_tokens = total_tokens + excluded.total_tokens,
+            matched_tokens = matched_tokens + excluded.matched_tokens,
+            ignored_tokens = ignored_tokens + excluded.ignored_tokens,
+            unmatched_tokens = unmatched_tokens + excluded.unmatched_tokens,
+            unmatched_types = unmatched_types + excluded.unmatched_types
+    """, (video_id, counts.total, counts.matched, counts.ignored, counts.unmatched,
+          len(counts.unmatched_words)))
+
+
+def write_oov(conn, video_id, counts):
+    """add a video's unmatched and ignored (word, pos_tag) counts. does not commit"""
+    for table, words in (("UnmatchedTokens", counts.unmatched_words), ("IgnoredTokens", counts.ignored_words)):
+        conn.executemany(f"""
+            INSERT INTO {table} (word, pos_tag, video_id, frequency)
+            VALUES (?, ?, ?, ?)
+            ON CONFLICT(word, pos_tag, video_id) DO UPDATE SET frequency = frequency + excluded.frequency
+        """, [(word, pos_tag, video_id, n) for (word, pos_tag), n in words.items()])
+
+
+def write_logs(counts, basename, log_dir=Path("logs")):
+    """ignored / unmatched token logs for one video, with counts, returns their paths"""
+    log_dir = Path(log_dir)
+    log_dir.mkdir(parents=True, exist_ok=True)
+    ignored_log_path = log_dir / f"ignored_tokens_{basename}.txt"
+    unmatched_log_path = log_dir / f"unmatched_tokens_{basename}.txt"
+
+    by_pos = defaultdict(dict)
+    for (word, pos_tag), n in counts.ignored_words.items():
+        by_pos[pos_tag][word] = n
+
+    with open(ignored_log_path, "w", encoding="utf-8") as f:
+        f.write("=== IGNORED TOKENS BY POS TAG ===\n")
+        for pos_tag, words in sorted(by_pos.items()):
+            f.write(f"\n[{pos_tag}] ({len(words)} words)\n")
+            for word, n in sorted(words.items()):
+                f.write(f"  {word}\t{n}\n")
+
+    with open(unmatched_log_path, "w", encoding="utf-8") as f:
+        f.write("=== UNMATCHED TOKENS (not in Words table) ===\n")
+        for (word, pos_tag), n in sorted(counts.unmatched_words.items()):
+            f.write(f"{word} ({pos_tag})\t{n}\n")
+
+    return ignored_log_path, unmatched_log_path
+
+
+def process_tokens(json_path, conn, video_id, lexicon=None, log_dir=None, resolver=None):
+    """count matched tokens of one jsonl (or .tok) file into WordFrequency.
+
+    lexicon is loaded from conn when not given. without a resolver only
+    exact (word, pos_tag) matches count. the text logs are only written
+    when given a log_dir.
+    returns a summary dict with the same counts the script prints, plus
+    the wall / cpu seconds of matching and inserting ("stages").
+    """
+    json_path = Path(json_path)
+
+    if lexicon is None:
+        lexicon = load_lexicon(conn)
+
+    # === Process Tokens ===
+    counts, match_time = timed(count_tokens, iter_entries(json_path), lexicon, keep_lines=True, resolver=resolver)
+
+    # === Insert Word Frequencies ===
+    def insert():
+        with conn:
+            write_counts(conn, video_id, counts)
+            write_token_stats(conn, video_id, counts)
+            write_resolutions(conn, video_id, counts)
+            write_oov(conn, video_id, counts)
+            write_lines(conn, video_id, counts)
+            update_profiles(conn, [video_id])
+            update_pace(conn, [video_id])
+            update_series(conn)
+    _, insert_time = timed(insert)
+
+    # === Write Logs ===
+    summary = counts.summary(json_path.name, video_id)
+    summary["stages"] = {"match": match_time, "insert": insert_time}
+    summary["logs"] = write_logs(counts, json_path.stem, log_dir) if log_dir is not None else None
+    return summary
 
-conn.commit()
 
-# === Write Logs ===
-with open(ignored_log_path, "w", encoding="utf-8") as f:
-    f.write("=== IGNORED TOKENS BY POS TAG ===\n")
-    for pos_tag, words in sorted(ignored_words_log.items()):
-        f.write(f"\n[{pos_tag}] ({len(words)} words)\n")
-        for word in sorted(words):
-            f.write(f"  {word}\n")
+def print_summary(summary):
+    print("=== SUMMARY ===")
+    print(f"Processed file:         {summary['file']}")
+    print(f"Total tokens:           {summary['total']}")
+    print(f"Matched tokens:         {summary['matched']}")
+    print(f"Ignored tokens:         {summary['ignored']}")
+    print(f"Unmatched tokens:       {summary['unmatched']}")
+    print(f"Resolved tokens:        {summary['resolved']} ({summary['resolution_rate']:.1%} of the misses)")
+    print(f"Video ID:               {summary['video_id']}")
+    print(f"WordFrequency updated:  {summary['words_updated']} words")
+    if summary["logs"]:
+        print(f"Logs saved:             {summary['logs'][0]}, {summary['logs'][1]}")
 
-with open(unmatched_log_path, "w", encoding="utf-8") as f:
-    f.write("=== UNMATCHED TOKENS (not in Words table) ===\n")
-    for word, pos_tag in sorted(unmatched_tokens_log):
-        f.write(f"{word} ({pos_tag})\n")
 
-# === Summary ===
-print("=== SUMMARY ===")
-print(f"Processed file:         {json_path.name}")
-print(f"Total tokens:           {total_tokens}")
-print(f"Matched tokens:         {matched_tokens}")
-print(f"Ignored tokens:         {ignored_tokens}")
-print(f"Unmatched tokens:       {unmatched_tokens}")
-print(f"Video ID:               {video_id}")
-print(f"WordFrequency updated:  {len(word_freq_counter)} words")
-print(f"Logs saved:             {ignored_log_path}, {unmatched_log_path}")
+def main():
+    # === Argument Parsing ===
+    parser = argparse.ArgumentParser(description="Add word frequencies from JSON to WordFrequency table.")
+    parser.add_argument("json_file", help="Path to the JSONL (or .tok) subtitle file")
+    parser.add_argument("--db", default="your_database.db", help="Path to SQLite database")
+    parser.add_argument("--video-id", type=int, required=True, help="Video ID (must already exist in Videos table)")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON instead")
+    parser.add_argument("--resolve", action="store_true",
+                        help="Also count the tokens the resolver places, not only exact (word, pos_tag) matches")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE,
+                        help="With --resolve, the lowest confidence of a resolved token that still counts")
+    parser.add_argument("--logs", type=Path, metavar="DIR",
+                        help="Also write the ignored / unmatched token logs to DIR")
+    args = parser.parse_args()
 
-conn.close()
+    # === Connect to Database ===
+    conn = connect_for_build(args.db)
+    try:
+        lexicon = load_lexicon(conn)
+        resolver = FuzzyResolver(lexicon, args.min_confidence) if args.resolve else None
+        summary = process_tokens(args.json_file, conn, args.video_id, lexicon, args.logs, resolver)
+    finally:
+        conn.close()
 
+    # === Summary ===
+    if args.json:
+        if summary["logs"]:
+            summary["logs"] = [str(path) for path in summary["logs"]]
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        print_summary(summary)
 
 
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+'''
+per-video comprehensibility profiles (the VideoCoverage table).
+
+for every video and k = 1..6: which share of its tokens, and of its
+distinct words, are TOPIK level k or below. tokens the tagger gave an
+ignored pos (particles, punctuation, ...) are left out; unmatched tokens
+count against coverage, since a learner can't look them up in the TOPIK
+lists either.
+
+the build calls update_profiles() for each video in the same transaction
+as its counts. the maths is done on numpy arrays for any number of
+videos at once, so recomputing the whole corpus is one pass:
+
+python profiles.py --db korean_vocab.db --rebuild
+python profiles.py --db korean_vocab.db --level 3 --min-coverage 0.9
+'''
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_readonly
+
+TOPIK_LEVELS = range(1, 7)
+MAX_LEVEL = TOPIK_LEVELS[-1]
+
+
+def _in_clause(video_ids):
+    return f"IN ({','.join('?' * len(video_ids))})"
+
+
+def compute_profiles(conn, video_ids=None):
+    """(video_ids, token_coverage, type_coverage) as numpy arrays.
+
+    coverage arrays have shape (n_videos, 6), column k-1 is level <= k.
+    only videos with a VideoTokenStats row get a profile.
+    """
+    stats_where = counts_where = ""
+    params = ()
+    if video_ids is not None:
+        params = list(video_ids)
+        stats_where = f"WHERE video_id {_in_clause(params)}"
+        counts_where = f"WHERE wf.video_id {_in_clause(params)}"
+
+    stats = np.array(conn.execute(f"""
+        SELECT video_id, matched_tokens, unmatched_tokens, unmatched_types
+        FROM VideoTokenStats {stats_where}
+        ORDER BY video_id
+    """, params).fetchall(), dtype=np.int64).reshape(-1, 4)
+    vids = stats[:, 0]
+
+    counts = np.array(conn.execute(f"""
+        SELECT wf.video_id, w.topik_level, wf.frequency
+        FROM WordFrequency wf
+        JOIN Words w ON wf.word_id = w.word_id
+        {counts_where}
+    """, params).fetchall(), dtype=np.int64).reshape(-1, 3)
+
+    # row of each count in the stats arrays; drop videos without stats
+    row = np.searchsorted(vids, counts[:, 0])
+    keep = row < len(vids)
+    keep[keep] = vids[row[keep]] == counts[keep, 0]
+    row, level, freq = row[keep], counts[keep, 1], counts[keep, 2]
+
+    # (video, level) histograms of tokens and of distinct words, then cumulative over levels
+    n_bins = MAX_LEVEL + 1
+    flat = row * n_bins + np.clip(level, 0, MAX_LEVEL)
+    tokens = np.bincount(flat, weights=freq, minlength=len(vids) * n_bins).reshape(-1, n_bins)
+    types = np.bincount(flat, minlength=len(vids) * n_bins).reshape(-1, n_bins)
+    cum_tokens = np.cumsum(tokens[:, 1:], axis=1)
+    cum_types = np.cumsum(types[:, 1:], axis=1)
+
+    token_denom = (stats[:, 1] + stats[:, 2]).astype(float)
+    type_denom = (types.sum(axis=1) + stats[:, 3]).astype(float)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        token_cov = np.where(token_denom[:, None] > 0, cum_tokens / token_denom[:, None], 0.0)
+        type_cov = np.where(type_denom[:, None] > 0, cum_types / type_denom[:, None], 0.0)
+    return vids, token_cov, type_cov
+
+
+def update_profiles(conn, video_ids=None):
+    """(re)write VideoCoverage for video_ids, or every video. does not commit"""
+    vids, token_cov, type_cov = compute_profiles(conn, video_ids)
+    if video_ids is None:
+        conn.execute("DELETE FROM VideoCoverage")
+    else:
+        video_ids = list(video_ids)
+        conn.execute(f"DELETE FROM VideoCoverage WHERE video_id {_in_clause(video_ids)}", video_ids)
+
+    levels = np.array(TOPIK_LEVELS)
+    conn.executemany("""
+        INSERT INTO VideoCoverage (video_id, topik_level, token_coverage, type_coverage)
+        VALUES (?, ?, ?, ?)
+    """, zip(
+        np.repeat(vids, len(levels)).tolist(),
+        np.tile(levels, len(vids)).tolist(),
+        token_cov.ravel().tolist(),
+        type_cov.ravel().tolist(),
+    ))
+    return len(vids)
+
+
+def videos_with_coverage(conn, level, min_coverage, by="token"):
+    """[(video_id, video_name, coverage)] with coverage >= min_coverage at level, best first"""
+    column = {"token": "token_coverage", "type": "type_coverage"}[by]
+    return conn.execute(f"""
+        SELECT c.video_id, v.video_name, c.{column}
+        FROM VideoCoverage c
+        JOIN Videos v ON v.video_id = c.video_id
+        WHERE c.topik_level = ? AND c.{column} >= ?
+        ORDER BY c.{column} DESC
+    """, (level, min_coverage)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-video TOPIK coverage profiles.")
+    parser.add_argument("--db", default="korean_vocab.db", help="Path to SQLite database")
+    parser.add_argument("--rebuild", action="store_true", help="Recompute every profile")
+    parser.add_argument("--level", type=int, choices=TOPIK_LEVELS, help="List videos by coverage at this level")
+    parser.add_argument("--min-coverage", type=float, default=0.9, help="Minimum coverage, 0..1 (default 0.9)")
+    parser.add_argument("--by", choices=("token", "type"), default="token", help="Token or type coverage")
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db) if args.rebuild else connect_readonly(args.db)
+    try:
+        if args.rebuild:
+            with conn:
+                n = update_profiles(conn)
+            print(f"🔁 Recomputed profiles for {n} videos")
+        if args.level is not None:
+            rows = videos_with_coverage(conn, args.level, args.min_coverage, args.by)
+            print(f"=== {len(rows)} videos with ≥{args.min_coverage:.0%} {args.by} coverage at level {args.level} ===")
+            for video_id, name, coverage in rows:
+                print(f"{coverage:7.1%}  [{video_id}] {name}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
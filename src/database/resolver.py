@@ -0,0 +1,330 @@
+'''
+second chance for tokens whose exact (word, pos_tag) is not in Words.
+
+process_tokens only counts a token when the lexicon has that exact pair,
+so Okt's quirks (좀 / 왜 tagged Noun where TOPIK has Adverb, 좋아하다 as
+Adjective, 돼다 for 되다, 재밌다 for 재미있다) all end up unmatched. the
+resolver tries, in order:
+
+  variant   a known colloquial spelling / contraction (VARIANTS)
+  pos       the same word under a related pos tag (RELATED_POS)
+  jamo      a lexicon word one or two jamo edits away, same or related pos
+
+fuzzy candidates come from a SymSpell-style deletion index over the jamo
+spelling of every lexicon word: each word is stored under all the strings
+it turns into with up to MAX_EDITS jamo deleted, so a token's candidates
+are the words sharing one of its own deletion strings. that is a few dict
+lookups per token, not a scan of the lexicon. candidates are then scored
+with a jamo edit distance in which the edits colloquial spelling makes
+cost half: swapping vowels written for one another (돼/되) and the
+object particle's ㄹ left on the last syllable (얘길, 머릴). any other edit
+costs a full one, and words one real jamo apart are usually just
+different words (장남 / 장님), so at the default min_confidence only the
+cheap edits get through. the search only goes as deep as min_confidence
+can still accept (one deletion at the default), and candidates whose
+length is off by more than that are skipped before any distance is
+computed.
+
+every resolution has a confidence in [0, 1] and a reason; only the ones
+at or above min_confidence are returned. a tie between several words
+divides the confidence between them, so ambiguous guesses drop out.
+results are memoized per (word, pos_tag).
+
+with --resolve (off by default: exact matches only), the build counts
+resolved tokens like matched ones and keeps what was resolved to what
+in TokenResolutions; the per-video resolution rate is
+resolved / (resolved + still unmatched) tokens.
+
+python resolver.py 돼다 Verb 좀 Noun 재밌다 Adjective
+python resolver.py --db korean_vocab.db --videos
+python resolver.py --db korean_vocab.db --top 30
+'''
+
+import argparse
+import sqlite3
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.lexicon import Lexicon
+from pipeline.hangul import MEDIALS, to_jamo
+
+MAX_EDITS = 2
+MIN_CONFIDENCE = 0.8
+EDIT_PENALTY = 0.3  # confidence lost per full jamo edit
+MIN_FUZZY_JAMO = 4  # shorter tokens (one syllable) have too many neighbours to guess from
+
+# okt tag -> lexicon tags the same word may be filed under, with how much
+# a match under that tag is trusted. okt's Modifier is TOPIK's Determiner,
+# and it tags many adverbs (좀, 왜, 또) as nouns
+RELATED_POS = {
+    "Noun": (("Adverb", 0.85), ("Determiner", 0.8), ("OtherReducedForm", 0.8)),
+    "Modifier": (("Determiner", 0.95),),
+    "VerbPrefix": (("Adverb", 0.9),),
+    "Adverb": (("Noun", 0.8),),
+    "Verb": (("Adjective", 0.85), ("OtherReducedForm", 0.8)),
+    "Adjective": (("Verb", 0.85), ("OtherReducedForm", 0.8)),
+}
+
+# colloquial forms okt keeps as they are -> the lexicon's word, looked up under the
+# token's own and related pos tags (RELATED_POS) like any other token
+VARIANTS = {
+    ("재밌다", "Adjective"): "재미있다",
+    ("뭔", "Modifier"): "무슨",
+    ("넌", "Noun"): "너",
+    ("난", "Noun"): "나",
+    ("우린", "Noun"): "우리",
+    ("어젠", "Noun"): "어제",
+    ("어딘", "Noun"): "어디",
+    ("그게", "Noun"): "그것",
+    ("그건", "Noun"): "그것",
+    ("이건", "Noun"): "이것",
+    ("뭘", "Noun"): "뭐",
+    ("누가", "Noun"): "누구",
+    ("걸", "Noun"): "것",
+    ("갖다", "Verb"): "가지다",
+}
+VARIANT_CONFIDENCE = 0.9
+
+# vowels that get written for one another; substituting within a group is half an edit.
+# ㅐ/ㅔ, ㅔ/ㅣ and ㅢ/ㅣ were tried too, but on subtitle text they mostly
+# turned unlisted words into listed ones (데리 -> 대리, 정이 -> 정의)
+CONFUSABLE_VOWELS = ("ㅙㅚㅞ", "ㅒㅖ")
+_CONFUSABLE = {(a, b) for group in CONFUSABLE_VOWELS for a in group for b in group if a != b}
+# finals a contracted particle leaves on an open syllable (얘기를 -> 얘길). the
+# topic particle's ㄴ is left out: too many nouns just end in ㄴ (사인, 나인)
+PARTICLE_FINALS = "ㄹ"
+
+
+class Resolution:
+    __slots__ = ("word", "pos_tag", "word_id", "confidence", "reason")
+
+    def __init__(self, word, pos_tag, word_id, confidence, reason):
+        self.word = word          # the lexicon entry it resolved to
+        self.pos_tag = pos_tag
+        self.word_id = word_id
+        self.confidence = confidence
+        self.reason = reason
+
+    def __repr__(self):
+        return f"Resolution({self.word} {self.pos_tag} #{self.word_id}, {self.confidence:.2f}, {self.reason})"
+
+
+def deletes(term, max_edits=MAX_EDITS):
+    """term with every combination of up to max_edits characters removed (term included)"""
+    found = {term}
+    frontier = {term}
+    for _ in range(max_edits):
+        frontier = {s[:i] + s[i + 1:] for s in frontier if len(s) > 1 for i in range(len(s))} - found
+        found |= frontier
+    return found
+
+
+def jamo_distance(a, b):
+    """optimal string alignment distance from token a to lexicon word b (both jamo strings).
+    confusable vowels and a trailing particle ㄹ on a cost 0.5"""
+    prev2 = None
+    prev = [float(j) for j in range(len(b) + 1)]
+    for i in range(1, len(a) + 1):
+        row = [float(i)] + [0.0] * len(b)
+        drop = 1.0
+        if i == len(a) > 1 and a[i - 1] in PARTICLE_FINALS and a[i - 2] in MEDIALS:
+            drop = 0.5
+        for j in range(1, len(b) + 1):
+            if a[i - 1] == b[j - 1]:
+                cost = 0.0
+            elif (a[i - 1], b[j - 1]) in _CONFUSABLE:
+                cost = 0.5
+            else:
+                cost = 1.0
+            row[j] = min(prev[j] + drop, row[j - 1] + 1, prev[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                row[j] = min(row[j], prev2[j - 2] + 1)
+        prev2, prev = prev, row
+    return prev[-1]
+
+
+class FuzzyResolver:
+    def __init__(self, lexicon, min_confidence=MIN_CONFIDENCE, max_edits=MAX_EDITS):
+        self.min_confidence = min_confidence
+        self.max_edits = max_edits
+        self._entries = {}  # word -> {pos_tag: word_id}
+        for word, pos_tag, word_id in lexicon.items():
+            self._entries.setdefault(word, {})[pos_tag] = word_id
+        self._jamo = {}     # jamo spelling -> [word]
+        for word in self._entries:
+            self._jamo.setdefault(to_jamo(word), []).append(word)
+        self._index = {}    # deletion string -> [jamo spelling]
+        for spelling in self._jamo:
+            for key in deletes(spelling, max_edits):
+                self._index.setdefault(key, []).append(spelling)
+        self._memo = {}
+
+    def clear(self):
+        """forget the memoized resolutions"""
+        self._memo.clear()
+
+    def resolve(self, word, pos_tag):
+        """a Resolution for a token the exact lookup missed, or None"""
+        key = (word, pos_tag)
+        if key not in self._memo:
+            resolution = self._resolve(word, pos_tag)
+            if resolution is not None and resolution.confidence < self.min_confidence:
+                resolution = None
+            self._memo[key] = resolution
+        return self._memo[key]
+
+    def _resolve(self, word, pos_tag):
+        variant = VARIANTS.get((word, pos_tag))
+        if variant is not None:
+            found = self._lookup(variant, pos_tag, VARIANT_CONFIDENCE, "variant")
+            if found is not None:
+                return found
+        found = self._lookup(word, pos_tag, 1.0, "pos", exact=False)
+        if found is not None:
+            return found
+        if pos_tag in RELATED_POS:
+            return self._fuzzy(word, pos_tag)
+        return None
+
+    def _pos_weights(self, pos_tag):
+        return ((pos_tag, 1.0),) + RELATED_POS.get(pos_tag, ())
+
+    def _lookup(self, word, pos_tag, confidence, reason, exact=True):
+        """word under pos_tag (exact) or under the best related tag"""
+        entries = self._entries.get(word)
+        if not entries:
+            return None
+        for tag, weight in self._pos_weights(pos_tag):
+            if tag == pos_tag and not exact:
+                continue
+            if tag in entries:
+                return Resolution(word, tag, entries[tag], confidence * weight, reason)
+        return None
+
+    def candidates(self, word, max_distance=None):
+        """lexicon words within max_distance (default max_edits) of word, with their distance"""
+        if max_distance is None:
+            max_distance = self.max_edits
+        # every edit costs at least 0.5, so this many of them at most
+        edits = min(self.max_edits, int(max_distance * 2))
+        spelling = to_jamo(word)
+        seen = {spelling}
+        for key in deletes(spelling, edits):
+            for candidate in self._index.get(key, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                if abs(len(candidate) - len(spelling)) > edits:
+                    continue
+                distance = jamo_distance(spelling, candidate)
+                if distance <= max_distance:
+                    for lexicon_word in self._jamo[candidate]:
+                        yield lexicon_word, distance
+
+    def _fuzzy(self, word, pos_tag):
+        spelling = to_jamo(word)
+        # the farthest a candidate can be and still reach min_confidence
+        max_distance = (1.0 - self.min_confidence) / EDIT_PENALTY
+        if len(spelling) < MIN_FUZZY_JAMO or max_distance < 0.5:
+            return None
+        weights = dict(self._pos_weights(pos_tag))
+        scored = []
+        for candidate, distance in self.candidates(word, max_distance):
+            similarity = max(0.0, 1.0 - EDIT_PENALTY * distance)
+            for tag, word_id in self._entries[candidate].items():
+                if tag in weights:
+                    scored.append((similarity * weights[tag], candidate, tag, word_id))
+        if not scored:
+            return None
+        best = max(score for score, _, _, _ in scored)
+        tied = [entry for entry in scored if entry[0] == best]
+        _, candidate, tag, word_id = min(tied, key=lambda entry: entry[3])
+        return Resolution(candidate, tag, word_id, best / len(tied), "jamo")
+
+
+def write_resolutions(conn, video_id, counts):
+    """store what a video's unmatched tokens were resolved to. does not commit"""
+    conn.executemany("""
+        INSERT INTO TokenResolutions (video_id, word, pos_tag, word_id, confidence, reason, frequency)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+        ON CONFLICT(video_id, word, pos_tag) DO UPDATE SET frequency = frequency + excluded.frequency
+    """, [(video_id, word, pos_tag, r.word_id, round(r.confidence, 3), r.reason, n)
+          for (word, pos_tag), (r, n) in counts.resolutions.items()])
+
+
+def resolution_rate(resolved, unmatched):
+    """share of the tokens exact lookup missed that the resolver placed"""
+    return resolved / (resolved + unmatched) if resolved + unmatched else 0.0
+
+
+def video_rates(conn):
+    """(video_name, resolved, still unmatched, rate) per video, lowest rate first"""
+    rows = conn.execute("""
+        SELECT v.video_name, COALESCE(r.resolved, 0), s.unmatched_tokens
+        FROM VideoTokenStats s
+        JOIN Videos v ON v.video_id = s.video_id
+        LEFT JOIN (SELECT video_id, SUM(frequency) AS resolved
+                   FROM TokenResolutions GROUP BY video_id) r ON r.video_id = s.video_id
+    """).fetchall()
+    rates = [(name, resolved, unmatched, resolution_rate(resolved, unmatched))
+             for name, resolved, unmatched in rows]
+    return sorted(rates, key=lambda row: row[3])
+
+
+def top_resolutions(conn, limit=20):
+    return conn.execute("""
+        SELECT r.word, r.pos_tag, w.word, w.pos_tag, r.reason, r.confidence, SUM(r.frequency) AS n
+        FROM TokenResolutions r
+        JOIN Words w ON w.word_id = r.word_id
+        GROUP BY r.word, r.pos_tag
+        ORDER BY n DESC
+        LIMIT ?
+    """, (limit,)).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Resolve tokens that are not in the Words table.")
+    parser.add_argument("tokens", nargs="*", help="word pos_tag pairs to try, e.g. 돼다 Verb")
+    parser.add_argument("--db", help="Database to read the lexicon / stored resolutions from (default: the topik csv)")
+    parser.add_argument("--videos", action="store_true", help="Resolution rate of every video in --db")
+    parser.add_argument("--top", type=int, help="The N most frequent resolutions in --db")
+    parser.add_argument("--min-confidence", type=float, default=MIN_CONFIDENCE)
+    args = parser.parse_args()
+
+    conn = sqlite3.connect(args.db) if args.db else None
+    try:
+        if args.tokens:
+            if len(args.tokens) % 2:
+                parser.error("tokens come in word pos_tag pairs")
+            if conn is not None:
+                lexicon = Lexicon.from_db(conn)
+            else:
+                from pipeline.tagger_agreement import topik_lexicon
+                lexicon = topik_lexicon()
+            resolver = FuzzyResolver(lexicon, args.min_confidence)
+            for word, pos_tag in zip(args.tokens[::2], args.tokens[1::2]):
+                if lexicon.lookup(word, pos_tag) is not None:
+                    print(f"{word} ({pos_tag}): in the lexicon")
+                    continue
+                r = resolver.resolve(word, pos_tag)
+                print(f"{word} ({pos_tag}): " + (f"-> {r.word} ({r.pos_tag}) {r.confidence:.2f} {r.reason}"
+                                                 if r else "unresolved"))
+        if conn is None:
+            return
+        if args.videos:
+            for name, resolved, unmatched, rate in video_rates(conn):
+                print(f"{rate:6.1%}  {resolved:>6} resolved  {unmatched:>6} unmatched  {name}")
+        if args.top:
+            for word, pos_tag, target, target_pos, reason, confidence, n in top_resolutions(conn, args.top):
+                print(f"{n:>6}  {word} ({pos_tag}) -> {target} ({target_pos})  {reason} {confidence:.2f}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
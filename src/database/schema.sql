@@ -7,6 +7,14 @@ CREATE TABLE IF NOT EXISTS Words (
     UNIQUE(word, pos_tag, topik_level)
 );
 
+-- which cleaned topik csv (sha256) the Words table was loaded from, so
+-- the build can use its compiled snapshot (lexicon_snapshot.py) as the lexicon
+CREATE TABLE IF NOT EXISTS LexiconSource (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    csv_sha256 TEXT NOT NULL,
+    loaded_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE IF NOT EXISTS Videos (
     video_id INTEGER PRIMARY KEY AUTOINCREMENT,
     video_name TEXT NOT NULL,
@@ -25,3 +33,357 @@ CREATE TABLE IF NOT EXISTS WordFrequency (
     FOREIGN KEY (video_id) REFERENCES Videos(video_id)
 );
 
+-- one row per ingested source file, so a rebuild can skip unchanged inputs
+-- and replace the counts of changed ones instead of adding a second video
+CREATE TABLE IF NOT EXISTS BuildManifest (
+    source_path TEXT PRIMARY KEY,   -- relative to raw/
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    content_hash TEXT NOT NULL,     -- sha256 of the file bytes
+    tagger_version TEXT NOT NULL,
+    video_id INTEGER NOT NULL,
+    ingested_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    line_filter TEXT,               -- digest of the boilerplate filter list (pipeline/boilerplate.py), NULL: none
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+);
+
+-- one row per build_database.py run (see build_runs.py)
+CREATE TABLE IF NOT EXISTS BuildRuns (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    finished_at TEXT NOT NULL,
+    wall_seconds REAL NOT NULL,
+    videos INTEGER NOT NULL,        -- ingested by this run
+    failed INTEGER NOT NULL,
+    lines INTEGER NOT NULL,
+    tokens INTEGER NOT NULL,
+    tagger_version TEXT,
+    report TEXT NOT NULL            -- the full JSON run report, per-video stage timings included
+);
+
+-- one row per series shard merged into this database (shards.py): the
+-- shard's DataVersion at the time, so an unchanged shard isn't merged twice
+CREATE TABLE IF NOT EXISTS ShardMerges (
+    series TEXT PRIMARY KEY,        -- e.g. drama/Coffee_Prince
+    shard_path TEXT NOT NULL,
+    shard_instance TEXT NOT NULL,
+    shard_generation INTEGER NOT NULL,
+    videos INTEGER NOT NULL,
+    merged_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+
+-- summary tables for the queries in sql/, kept up to date by the triggers
+-- below whenever WordFrequency rows are inserted, updated or deleted
+-- (see aggregates.py for the consistency check / full rebuild)
+CREATE TABLE IF NOT EXISTS WordTotals (
+    word_id INTEGER PRIMARY KEY,
+    total_freq INTEGER NOT NULL DEFAULT 0,   -- SUM(frequency) over all videos
+    video_count INTEGER NOT NULL DEFAULT 0,  -- number of videos the word appears in
+    FOREIGN KEY (word_id) REFERENCES Words(word_id)
+);
+
+CREATE TABLE IF NOT EXISTS LevelTotals (
+    topik_level INTEGER PRIMARY KEY,
+    total_freq INTEGER NOT NULL DEFAULT 0,   -- SUM(frequency) of all words at this level
+    word_count INTEGER NOT NULL DEFAULT 0    -- distinct words at this level seen in any video
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_wordfrequency_insert
+AFTER INSERT ON WordFrequency
+BEGIN
+    INSERT INTO WordTotals (word_id, total_freq, video_count)
+    VALUES (NEW.word_id, NEW.frequency, 1)
+    ON CONFLICT(word_id) DO UPDATE SET
+        total_freq = total_freq + excluded.total_freq,
+        video_count = video_count + 1;
+
+    INSERT INTO LevelTotals (topik_level, total_freq, word_count)
+    SELECT w.topik_level, NEW.frequency, t.video_count = 1
+    FROM Words w JOIN WordTotals t ON t.word_id = w.word_id
+    WHERE w.word_id = NEW.word_id
+    ON CONFLICT(topik_level) DO UPDATE SET
+        total_freq = total_freq + excluded.total_freq,
+        word_count = word_count + excluded.word_count;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_wordfrequency_update
+AFTER UPDATE OF frequency ON WordFrequency
+BEGIN
+    UPDATE WordTotals SET total_freq = total_freq + NEW.frequency - OLD.frequency
+    WHERE word_id = NEW.word_id;
+
+    UPDATE LevelTotals SET total_freq = total_freq + NEW.frequency - OLD.frequency
+    WHERE topik_level = (SELECT topik_level FROM Words WHERE word_id = NEW.word_id);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_wordfrequency_delete
+AFTER DELETE ON WordFrequency
+BEGIN
+    UPDATE WordTotals SET
+        total_freq = total_freq - OLD.frequency,
+        video_count = video_count - 1
+    WHERE word_id = OLD.word_id;
+
+    UPDATE LevelTotals SET
+        total_freq = total_freq - OLD.frequency,
+        word_count = word_count - (SELECT video_count = 0 FROM WordTotals WHERE word_id = OLD.word_id)
+    WHERE topik_level = (SELECT topik_level FROM Words WHERE word_id = OLD.word_id);
+
+    DELETE FROM WordTotals WHERE word_id = OLD.word_id AND video_count = 0;
+END;
+
+-- what process_tokens counted for each video (it used to only print these)
+CREATE TABLE IF NOT EXISTS VideoTokenStats (
+    video_id INTEGER PRIMARY KEY,
+    total_tokens INTEGER NOT NULL DEFAULT 0,
+    matched_tokens INTEGER NOT NULL DEFAULT 0,
+    ignored_tokens INTEGER NOT NULL DEFAULT 0,
+    unmatched_tokens INTEGER NOT NULL DEFAULT 0,
+    unmatched_types INTEGER NOT NULL DEFAULT 0,  -- distinct (word, pos_tag) not in Words
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+);
+
+-- tokens with no exact (word, pos_tag) in Words that the resolver matched
+-- to one anyway (resolver.py). they are already in WordFrequency and in
+-- VideoTokenStats.matched_tokens; this is what they were and why
+CREATE TABLE IF NOT EXISTS TokenResolutions (
+    video_id INTEGER NOT NULL,
+    word TEXT NOT NULL,             -- as tagged
+    pos_tag TEXT NOT NULL,
+    word_id INTEGER NOT NULL,       -- what it was counted as
+    confidence REAL NOT NULL,
+    reason TEXT NOT NULL,           -- variant, pos or jamo
+    frequency INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (video_id, word, pos_tag),
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id),
+    FOREIGN KEY (word_id) REFERENCES Words(word_id)
+);
+
+-- tokens that stayed unplaced, per video: no (word, pos_tag) in Words and
+-- not resolved (UnmatchedTokens), or a pos process_tokens ignores
+-- (IgnoredTokens). written in the same transaction as WordFrequency; they
+-- used to only go to logs/*_tokens_<video>.txt, without counts (oov.py)
+CREATE TABLE IF NOT EXISTS UnmatchedTokens (
+    word TEXT NOT NULL,             -- as tagged
+    pos_tag TEXT NOT NULL,
+    video_id INTEGER NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (word, pos_tag, video_id),
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS IgnoredTokens (
+    word TEXT NOT NULL,
+    pos_tag TEXT NOT NULL,
+    video_id INTEGER NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 1,
+    PRIMARY KEY (word, pos_tag, video_id),
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+) WITHOUT ROWID;
+
+-- corpus totals of UnmatchedTokens, the same way WordTotals follows
+-- WordFrequency, so "top OOV words" is an index walk instead of a GROUP BY
+CREATE TABLE IF NOT EXISTS OovTotals (
+    word TEXT NOT NULL,
+    pos_tag TEXT NOT NULL,
+    total_freq INTEGER NOT NULL DEFAULT 0,
+    video_count INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (word, pos_tag)
+) WITHOUT ROWID;
+
+CREATE TRIGGER IF NOT EXISTS trg_unmatchedtokens_insert
+AFTER INSERT ON UnmatchedTokens
+BEGIN
+    INSERT INTO OovTotals (word, pos_tag, total_freq, video_count)
+    VALUES (NEW.word, NEW.pos_tag, NEW.frequency, 1)
+    ON CONFLICT(word, pos_tag) DO UPDATE SET
+        total_freq = total_freq + excluded.total_freq,
+        video_count = video_count + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_unmatchedtokens_update
+AFTER UPDATE OF frequency ON UnmatchedTokens
+BEGIN
+    UPDATE OovTotals SET total_freq = total_freq + NEW.frequency - OLD.frequency
+    WHERE word = NEW.word AND pos_tag = NEW.pos_tag;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_unmatchedtokens_delete
+AFTER DELETE ON UnmatchedTokens
+BEGIN
+    UPDATE OovTotals SET
+        total_freq = total_freq - OLD.frequency,
+        video_count = video_count - 1
+    WHERE word = OLD.word AND pos_tag = OLD.pos_tag;
+
+    DELETE FROM OovTotals WHERE word = OLD.word AND pos_tag = OLD.pos_tag AND video_count = 0;
+END;
+
+-- comprehensibility profile: for k = 1..6, the share of a video's tokens
+-- (and distinct words) that are TOPIK level <= k. the denominator is
+-- matched + unmatched, ignored pos (particles, punctuation, ...) are left out
+CREATE TABLE IF NOT EXISTS VideoCoverage (
+    video_id INTEGER NOT NULL,
+    topik_level INTEGER NOT NULL,
+    token_coverage REAL NOT NULL,
+    type_coverage REAL NOT NULL,
+    PRIMARY KEY (video_id, topik_level),
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+);
+
+-- bumped by the triggers below whenever videos or counts change, so
+-- anything derived from the counts (e.g. the cached video x word matrix)
+-- can tell it is stale. db_instance is random per database file, so a
+-- fresh rebuild never reuses an old (instance, generation) pair
+CREATE TABLE IF NOT EXISTS DataVersion (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    db_instance TEXT NOT NULL DEFAULT (lower(hex(randomblob(8)))),
+    generation INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO DataVersion (id) VALUES (1);
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_wordfrequency_insert
+AFTER INSERT ON WordFrequency
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_wordfrequency_update
+AFTER UPDATE ON WordFrequency
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_wordfrequency_delete
+AFTER DELETE ON WordFrequency
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_videos_insert
+AFTER INSERT ON Videos
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_videos_update
+AFTER UPDATE ON Videos
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_dataversion_videos_delete
+AFTER DELETE ON Videos
+BEGIN
+    UPDATE DataVersion SET generation = generation + 1 WHERE id = 1;
+END;
+
+-- every subtitle line of every video, with its timestamps, so example
+-- sentences and concordance lines come from the db instead of re-reading
+-- the jsonl files. line_id is assigned in file order by the loader
+CREATE TABLE IF NOT EXISTS SubtitleLines (
+    line_id INTEGER PRIMARY KEY,
+    video_id INTEGER NOT NULL,
+    subtitle_index INTEGER,         -- the srt's own numbering
+    start_ms INTEGER,
+    end_ms INTEGER,
+    text TEXT NOT NULL,
+    token_count INTEGER,            -- tokens tagged in it, punctuation left out
+    content_count INTEGER,          -- of those, the ones of a counted pos (matched + unmatched)
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+);
+
+-- which lines a matched word occurs in. clustered on word_id, so "example
+-- lines for word X" is a range scan (occurrences.py)
+CREATE TABLE IF NOT EXISTS WordOccurrences (
+    word_id INTEGER NOT NULL,
+    video_id INTEGER NOT NULL,
+    line_id INTEGER NOT NULL,
+    frequency INTEGER NOT NULL DEFAULT 1,  -- times in that line
+    PRIMARY KEY (word_id, video_id, line_id),
+    FOREIGN KEY (word_id) REFERENCES Words(word_id),
+    FOREIGN KEY (line_id) REFERENCES SubtitleLines(line_id)
+) WITHOUT ROWID;
+
+-- full text index over the line text for keyword-in-context lookups.
+-- external content (the text is only stored once, in SubtitleLines) and
+-- kept in sync by the triggers below. unicode61 splits on spaces, i.e.
+-- into eojeol; the prefix indexes make "진짜*" (진짜, 진짜로, 진짜요, ...) cheap
+CREATE VIRTUAL TABLE IF NOT EXISTS SubtitleLinesFTS USING fts5(
+    text,
+    content='SubtitleLines',
+    content_rowid='line_id',
+    prefix='1 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_subtitlelines_insert
+AFTER INSERT ON SubtitleLines
+BEGIN
+    INSERT INTO SubtitleLinesFTS (rowid, text) VALUES (NEW.line_id, NEW.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_subtitlelines_delete
+AFTER DELETE ON SubtitleLines
+BEGIN
+    INSERT INTO SubtitleLinesFTS (SubtitleLinesFTS, rowid, text) VALUES ('delete', OLD.line_id, OLD.text);
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_subtitlelines_update
+AFTER UPDATE OF text ON SubtitleLines
+BEGIN
+    INSERT INTO SubtitleLinesFTS (SubtitleLinesFTS, rowid, text) VALUES ('delete', OLD.line_id, OLD.text);
+    INSERT INTO SubtitleLinesFTS (rowid, text) VALUES (NEW.line_id, NEW.text);
+END;
+
+-- pace and difficulty from the line timestamps (pace.py). speech time is
+-- the summed duration of a video's subtitle lines; rates are per second of it
+CREATE TABLE IF NOT EXISTS VideoPace (
+    video_id INTEGER PRIMARY KEY,
+    lines INTEGER NOT NULL,
+    speech_seconds REAL NOT NULL,
+    tokens INTEGER NOT NULL,            -- SubtitleLines.token_count summed
+    content_tokens INTEGER NOT NULL,    -- SubtitleLines.content_count summed
+    syllables INTEGER NOT NULL,         -- hangul syllables in the line text
+    tokens_per_second REAL NOT NULL,
+    syllables_per_second REAL NOT NULL,
+    lexical_density REAL NOT NULL,      -- content_tokens / tokens
+    window_ms INTEGER NOT NULL,         -- width of its VideoDifficulty windows
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+);
+
+-- difficulty curve: for k = 1..6 and each window_ms slice of the video (by
+-- line start), the share of its content tokens above level k (unmatched and
+-- user lexicon words included, like in VideoCoverage)
+CREATE TABLE IF NOT EXISTS VideoDifficulty (
+    video_id INTEGER NOT NULL,
+    topik_level INTEGER NOT NULL,
+    window_index INTEGER NOT NULL,      -- start_ms // window_ms
+    content_tokens INTEGER NOT NULL,
+    above_share REAL NOT NULL,
+    PRIMARY KEY (video_id, topik_level, window_index),
+    FOREIGN KEY (video_id) REFERENCES Videos(video_id)
+) WITHOUT ROWID;
+
+-- the same per series (drama/Coffee_Prince, youtube), recomputed from the
+-- video tables at the end of every build
+CREATE TABLE IF NOT EXISTS SeriesPace (
+    series TEXT PRIMARY KEY,
+    videos INTEGER NOT NULL,
+    speech_seconds REAL NOT NULL,
+    tokens INTEGER NOT NULL,
+    content_tokens INTEGER NOT NULL,
+    syllables INTEGER NOT NULL,
+    tokens_per_second REAL NOT NULL,
+    syllables_per_second REAL NOT NULL,
+    lexical_density REAL NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS SeriesDifficulty (
+    series TEXT NOT NULL,
+    topik_level INTEGER NOT NULL,
+    windows INTEGER NOT NULL,
+    mean_above_share REAL NOT NULL,     -- over all windows of the series, token weighted
+    p90_above_share REAL NOT NULL,      -- the hardest 10% of its windows start here
+    PRIMARY KEY (series, topik_level)
+) WITHOUT ROWID;
@@ -0,0 +1,235 @@
+'''
+sharded builds: one database per series, merged into the master.
+
+build_database.py --sharded ingests every series directory under raw/
+(raw/drama/<show>, and raw/youtube itself) into its own shard database
+(shards/<category>__<show>.db), several series at once, each shard with
+its own pool and its own writer, so the database side of the build runs
+on every core too. merge_shard() then ATTACHes a shard to the master and
+copies it over with INSERT ... SELECT, one transaction per shard:
+
+  lexicon    shards and master load Words from the same compiled snapshot
+             (lexicon_snapshot.py), so word_ids carry over as they are;
+             the merge checks a fingerprint of both Words tables first and
+             refuses a shard built against another lexicon (user lexicon
+             words included, user_lexicon.py)
+  video_id   a source the master already has keeps its video_id; new ones
+             get the next free ids in source path order. the same shards
+             merged in the same order always give the same ids
+  line_id    the shard's lines are moved past the master's highest line_id
+  replace    the master's videos of that series are dropped first (counts,
+             lines, stats, coverage, resolutions, oov tokens, manifest), so a shard
+             merged again replaces its series instead of adding to it
+
+every per-video table goes through the same remap (VIDEO_TABLES, LINE_TABLES);
+the summary tables, the fts index and DataVersion follow by trigger, the
+series pace tables (pace.py) are recomputed once all shards are in.
+ShardMerges records the shard DataVersion each series was merged at, so an
+unchanged shard is skipped on the next merge: rebuilding one series
+(--series drama/Coffee_Prince) only rebuilds and re-merges that one.
+
+python shards.py --db korean_vocab.db ../../shards/*.db       # merge shards by hand
+python shards.py --db korean_vocab.db --check ../../shards/drama__TrueBeauty.db
+'''
+
+import argparse
+import hashlib
+import logging
+import sys
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_for_build, connect_readonly
+from database.data_version import data_version
+
+SHARD_SUFFIX = ".db"
+
+# tables keyed by video_id, in insert order (Videos first, it is the parent)
+VIDEO_TABLES = ("Videos", "BuildManifest", "WordFrequency", "VideoTokenStats", "TokenResolutions",
+                "UnmatchedTokens", "IgnoredTokens", "VideoCoverage", "VideoPace", "VideoDifficulty")
+# tables that also carry a line_id
+LINE_TABLES = ("SubtitleLines", "WordOccurrences")
+
+
+class LexiconMismatch(ValueError):
+    pass
+
+
+def series_of(source):
+    """drama/Coffee_Prince/ep1.srt -> drama/Coffee_Prince, youtube/x.srt -> youtube"""
+    return Path(source).parent.as_posix()
+
+
+def shard_name(series):
+    return series.replace("/", "__")
+
+
+def shard_path(shard_dir, series):
+    return Path(shard_dir) / f"{shard_name(series)}{SHARD_SUFFIX}"
+
+
+def words_fingerprint(conn, schema="main"):
+    """sha256 over every Words row in word_id order: equal fingerprints, same word_ids"""
+    h = hashlib.sha256()
+    for row in conn.execute(f"""
+            SELECT word_id, word, pos_tag, topik_level, homonym FROM {schema}.Words ORDER BY word_id"""):
+        h.update("\x1f".join(map(str, row)).encode("utf-8"))
+        h.update(b"\x1e")
+    return h.hexdigest()
+
+
+def _columns(conn, table):
+    return [row[1] for row in conn.execute(f"PRAGMA main.table_info({table})")]
+
+
+def _copy(conn, table, video_map="temp.VideoMap", line_offset=None):
+    """INSERT the shard's rows of table into main, video_id (and line_id) remapped"""
+    columns = _columns(conn, table)
+    select = []
+    for column in columns:
+        if column == "video_id":
+            select.append("m.video_id")
+        elif column == "line_id":
+            select.append(f"t.line_id + {int(line_offset)}")
+        else:
+            select.append(f"t.{column}")
+    cursor = conn.execute(f"""
+        INSERT INTO main.{table} ({", ".join(columns)})
+        SELECT {", ".join(select)}
+        FROM shard.{table} t JOIN {video_map} m ON m.shard_video_id = t.video_id
+    """)
+    return cursor.rowcount
+
+
+def _drop_videos(conn, video_ids):
+    """every row of video_ids in main, children first. does not commit"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS DropVideos (video_id INTEGER PRIMARY KEY)")
+    conn.execute("DELETE FROM temp.DropVideos")
+    conn.executemany("INSERT INTO temp.DropVideos (video_id) VALUES (?)", [(v,) for v in video_ids])
+    for table in reversed(VIDEO_TABLES + LINE_TABLES):
+        conn.execute(f"DELETE FROM main.{table} WHERE video_id IN (SELECT video_id FROM temp.DropVideos)")
+
+
+def merged_version(conn, series):
+    """(shard_instance, shard_generation) the series was last merged at, or None"""
+    row = conn.execute("SELECT shard_instance, shard_generation FROM ShardMerges WHERE series = ?",
+                       (series,)).fetchone()
+    return tuple(row) if row else None
+
+
+def merge_shard(conn, path, series, force=False):
+    """copy shard path (the database of series) into conn's master database, replacing that series.
+
+    returns the number of videos merged, or None when the shard hasn't
+    changed since its last merge (force=True merges it anyway). raises
+    LexiconMismatch if the shard's Words differ from the master's.
+    """
+    path = Path(path)
+    conn.commit()  # ATTACH can't run inside a transaction
+    conn.execute("ATTACH DATABASE ? AS shard", (str(path),))
+    try:
+        if words_fingerprint(conn, "shard") != words_fingerprint(conn, "main"):
+            raise LexiconMismatch(f"{path.name} was built against another Words table than the master")
+        (instance, generation), = conn.execute("SELECT db_instance, generation FROM shard.DataVersion")
+        if not force and merged_version(conn, series) == (instance, generation):
+            return None
+
+        shard_sources = conn.execute(
+            "SELECT source_path, video_id FROM shard.BuildManifest ORDER BY source_path").fetchall()
+        master = {source: video_id for source, video_id in
+                  conn.execute("SELECT source_path, video_id FROM main.BuildManifest")}
+
+        with conn:
+            # the master's copy of the series goes, whether the shard still has the source or not
+            _drop_videos(conn, [video_id for source, video_id in master.items() if series_of(source) == series])
+
+            next_id = conn.execute("""
+                SELECT MAX(COALESCE((SELECT MAX(video_id) FROM main.Videos), 0),
+                           COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = 'Videos'), 0)) + 1
+            """).fetchone()[0]
+            mapping = []
+            for source, shard_video_id in shard_sources:
+                video_id = master.get(source)
+                if video_id is None:
+                    video_id, next_id = next_id, next_id + 1
+                mapping.append((shard_video_id, video_id))
+            conn.execute("CREATE TEMP TABLE IF NOT EXISTS VideoMap "
+                         "(shard_video_id INTEGER PRIMARY KEY, video_id INTEGER NOT NULL)")
+            conn.execute("DELETE FROM temp.VideoMap")
+            conn.executemany("INSERT INTO temp.VideoMap (shard_video_id, video_id) VALUES (?, ?)", mapping)
+
+            for table in VIDEO_TABLES:
+                _copy(conn, table)
+            # line_ids: shard lines start right after the master's last one
+            (line_offset,) = conn.execute("""
+                SELECT COALESCE((SELECT MAX(line_id) FROM main.SubtitleLines), 0) + 1
+                       - COALESCE((SELECT MIN(line_id) FROM shard.SubtitleLines), 1)
+            """).fetchone()
+            for table in LINE_TABLES:
+                _copy(conn, table, line_offset=line_offset)
+
+            conn.execute("""
+                INSERT OR REPLACE INTO ShardMerges
+                    (series, shard_path, shard_instance, shard_generation, videos, merged_at)
+                VALUES (?, ?, ?, ?, ?, CURRENT_TIMESTAMP)
+            """, (series, str(path), instance, generation, len(mapping)))
+        return len(mapping)
+    finally:
+        conn.execute("DETACH DATABASE shard")
+
+
+def shard_series(path):
+    """the series a shard holds, from its manifest (or its file name if it is empty)"""
+    if not Path(path).is_file():
+        raise FileNotFoundError(f"no shard at {path}")
+    conn = connect_readonly(path)
+    try:
+        sources = [source for source, in conn.execute("SELECT source_path FROM BuildManifest")]
+    finally:
+        conn.close()
+    series = {series_of(source) for source in sources}
+    if len(series) > 1:
+        raise ValueError(f"{path} holds more than one series: {sorted(series)}")
+    return series.pop() if series else Path(path).stem.replace("__", "/")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Merge series shard databases into the master.")
+    parser.add_argument("shards", nargs="+", type=Path, help="Shard databases")
+    parser.add_argument("--db", type=Path, required=True, help="Master database (already initialized)")
+    parser.add_argument("--force", action="store_true", help="Merge shards even if they haven't changed")
+    parser.add_argument("--check", action="store_true", help="Only compare the shards' Words with the master's")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    conn = connect_for_build(args.db)
+    try:
+        master = words_fingerprint(conn)
+        for path in sorted(args.shards):
+            series = shard_series(path)
+            if args.check:
+                shard = connect_readonly(path)
+                same = words_fingerprint(shard) == master
+                shard.close()
+                logging.info(f" {'✅' if same else '❌'} {path.name} ({series}): "
+                             f"{'same' if same else 'different'} lexicon")
+                continue
+            try:
+                merged = merge_shard(conn, path, series, args.force)
+            except LexiconMismatch as e:
+                logging.error(f"X {e}")
+                continue
+            if merged is None:
+                logging.info(f" >> {series}: unchanged since its last merge")
+            else:
+                logging.info(f" 🧱 {series}: {merged} video(s) merged from {path.name}")
+        logging.info(f" > master at generation {data_version(conn)[1]}")
+    finally:
+        conn.close()
+
+
+if __name__ == "__main__":
+    main()
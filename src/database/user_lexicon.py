@@ -0,0 +1,157 @@
+'''
+the user lexicon: words the TOPIK lists don't have but the corpus keeps
+using, added by hand or promoted from the unmatched tokens (oov.py).
+
+it lives next to the topik csv, in aux_data/user_lexicon.csv (word,
+pos_tag, plus how often the word was unmatched when it was promoted), so
+--fresh rebuilds and shard builds all load the same entries. every build
+adds the entries Words doesn't have yet (sync_user_words) at topik_level
+0: matched and counted like any other word, but below every TOPIK level,
+so the coverage profiles (profiles.py) still only count TOPIK words as
+covered. a (word, pos_tag) the TOPIK lists already have is skipped.
+
+word_ids: entry n of the csv (1-based) gets the highest TOPIK word_id + n,
+so databases loaded from the same two csvs agree on them (shards.py
+compares Words before a merge). the csv is append-only; taking an entry
+out again needs a --fresh build.
+
+videos that already counted a newly added word as unmatched (or had the
+resolver place it) are flagged for a recount by clearing their manifest
+hash, so the next build re-ingests just those, mostly from the tag cache.
+
+python user_lexicon.py --db korean_vocab.db         # add new csv entries to Words now
+python user_lexicon.py --add 꿀잼 Noun 갑분싸 Noun     # append entries to the csv by hand
+python user_lexicon.py                              # list the csv
+'''
+
+import argparse
+import csv
+import logging
+import sys
+from datetime import date
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.bulk_load import connect_for_build
+
+USER_LEXICON_PATH = Path(__file__).resolve().parent.parent.parent / "aux_data" / "user_lexicon.csv"
+USER_LEVEL = 0
+FIELDS = ["word", "pos_tag", "frequency", "videos", "added"]
+
+
+def read_user_words(csv_path=USER_LEXICON_PATH):
+    """[(n, word, pos_tag)] in file order, n the 1-based entry number"""
+    csv_path = Path(csv_path)
+    if not csv_path.exists():
+        return []
+    with open(csv_path, newline="", encoding="utf-8") as f:
+        return [(n, (row.get("word") or "").strip(), (row.get("pos_tag") or "").strip())
+                for n, row in enumerate(csv.DictReader(f), 1)]
+
+
+def append_user_words(entries, csv_path=USER_LEXICON_PATH):
+    """append (word, pos_tag, frequency, videos) entries the csv doesn't have yet, returns those"""
+    csv_path = Path(csv_path)
+    known = {(word, pos_tag) for _, word, pos_tag in read_user_words(csv_path)}
+    new = []
+    for word, pos_tag, frequency, videos in entries:
+        if (word, pos_tag) not in known:
+            known.add((word, pos_tag))
+            new.append((word, pos_tag, frequency, videos))
+    if not new:
+        return new
+
+    write_header = not csv_path.exists()
+    csv_path.parent.mkdir(parents=True, exist_ok=True)
+    with open(csv_path, "a", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        if write_header:
+            writer.writerow(FIELDS)
+        today = date.today().isoformat()
+        writer.writerows([word, pos_tag, frequency, videos, today] for word, pos_tag, frequency, videos in new)
+    return new
+
+
+def user_entries(conn):
+    """(word, pos_tag, word_id) of the user lexicon words in Words"""
+    return conn.execute(
+        "SELECT word, pos_tag, word_id FROM Words WHERE topik_level = ? ORDER BY word_id", (USER_LEVEL,)
+    ).fetchall()
+
+
+def flag_recount(conn, words):
+    """clear the manifest hash of every video that counted one of words ((word, pos_tag))
+    as unmatched or resolved, so the next build recounts it. returns how many. does not commit"""
+    conn.execute("CREATE TEMP TABLE IF NOT EXISTS RecountWords (word TEXT, pos_tag TEXT, PRIMARY KEY (word, pos_tag))")
+    conn.execute("DELETE FROM temp.RecountWords")
+    conn.executemany("INSERT OR IGNORE INTO temp.RecountWords (word, pos_tag) VALUES (?, ?)", words)
+    cursor = conn.execute("""
+        UPDATE BuildManifest SET content_hash = ''
+        WHERE content_hash != '' AND video_id IN (
+            SELECT u.video_id FROM UnmatchedTokens u JOIN temp.RecountWords USING (word, pos_tag)
+            UNION
+            SELECT r.video_id FROM TokenResolutions r JOIN temp.RecountWords USING (word, pos_tag))
+    """)
+    return cursor.rowcount
+
+
+def sync_user_words(conn, csv_path=USER_LEXICON_PATH):
+    """add the csv's entries that aren't in Words yet and flag the videos that need a recount.
+
+    returns (entries added, videos flagged). does not commit.
+    """
+    rows = read_user_words(csv_path)
+    if not rows:
+        return 0, 0
+    (base,) = conn.execute(
+        "SELECT COALESCE(MAX(word_id), 0) FROM Words WHERE topik_level != ?", (USER_LEVEL,)).fetchone()
+    known = set(conn.execute("SELECT word, pos_tag FROM Words"))
+    new = [(base + n, word, pos_tag) for n, word, pos_tag in rows if word and (word, pos_tag) not in known]
+    if not new:
+        return 0, 0
+
+    before = conn.total_changes
+    conn.executemany(f"""
+        INSERT OR IGNORE INTO Words (word_id, word, pos_tag, topik_level, homonym)
+        VALUES (?, ?, ?, {USER_LEVEL}, 0)
+    """, new)
+    added = conn.total_changes - before
+    if added < len(new):
+        logging.warning(f" ! {len(new) - added} user lexicon entries clash with word_ids already taken "
+                        f"(was {Path(csv_path).name} edited rather than appended to?); rebuild with --fresh")
+    return added, flag_recount(conn, [(word, pos_tag) for _, word, pos_tag in new])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintain the user lexicon (words beyond the TOPIK lists).")
+    parser.add_argument("--csv", type=Path, default=USER_LEXICON_PATH, help="User lexicon csv")
+    parser.add_argument("--db", type=Path, help="Add the csv's new entries to this database's Words")
+    parser.add_argument("--add", nargs="+", metavar="WORD POS", help="Append word pos_tag pairs to the csv")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(message)s")
+    if args.add:
+        if len(args.add) % 2:
+            parser.error("--add takes word pos_tag pairs")
+        added = append_user_words([(word, pos_tag, "", "") for word, pos_tag in zip(args.add[::2], args.add[1::2])],
+                                  args.csv)
+        logging.info(f"✅ {len(added)} entries appended to {args.csv}")
+    if args.db:
+        conn = connect_for_build(args.db)
+        try:
+            with conn:
+                added, flagged = sync_user_words(conn, args.csv)
+        finally:
+            conn.close()
+        logging.info(f"✅ {added} user words added to Words, {flagged} video(s) flagged for a recount "
+                     "(rerun build_database.py)")
+    if not args.add and not args.db:
+        for n, word, pos_tag in read_user_words(args.csv):
+            print(f"{n:>5}  {word} ({pos_tag})")
+
+
+if __name__ == "__main__":
+    main()
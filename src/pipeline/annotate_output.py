@@ -1,50 +1,146 @@
+'''
+judge the tags of a .tok / .jsonl file line by line, from the top
+(resume_annotations.py carries on where the last session stopped).
+judgements go to the annotation store (annotation_store.py), --export
+also appends them to a jsonl file.
+
+--sample judges a stratified random sample of lines from the built
+database instead of a file: drawn once (--size lines, strata by
+--strata), tagged with --tagger, and picked up where it was left on
+the next run. report_annotations.py --sample estimates the accuracy
+of the whole corpus from it.
+
+python annotate_output.py ../../tokens/TrueBeauty_ep1.tok
+python annotate_output.py --sample pilot --size 300 --db ../database/korean_vocab.db
+'''
+
+import argparse
 import json
+import sqlite3
+import sys
 from pathlib import Path
 
-def annotate_jsonl(input_path, output_path):
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.annotation_store import (
+    AnnotationStore, DEFAULT_STORE_PATH, STRATA, file_identity, count_lines, entries_after, entry_index,
+)
+from pipeline.taggers import TAGGERS, DEFAULT_TAGGER, make_tagger
+
+DB_PATH = Path(__file__).resolve().parent.parent / "database" / "korean_vocab.db"
+
+
+def ask(text, tokens):
+    """y / n / s / q from the annotator, and a note for a no"""
+    print(f"Original: {text or '(no text)'}")
+    print(f"Filtered: {tokens if tokens is not None else '(no filtered output)'}")
+
+    while True:
+        response = input("Is this satisfactory? [y/n/s=skip/q=quit] ").strip().lower()
+        if response in ['y', 'n', 's', 'q']:
+            break
+
+    note = ""
+    if response == 'n':
+        note = input("Optional note: ").strip()
+    return response, note
+
+
+def annotate_jsonl(input_path, output_path=None, store_path=DEFAULT_STORE_PATH, tagger_version=None):
     input_path = Path(input_path)
-    output_path = Path(output_path)
 
     if not input_path.exists():
         print(f"Input file {input_path} not found.")
         return
 
-    with input_path.open(encoding='utf-8') as infile, output_path.open('w', encoding='utf-8') as outfile:
-        for line_num, line in enumerate(infile, 1):
-            entry = json.loads(line.strip())
-            print(f"\n=== Line {line_num} ===")
-            print(f"Original: {entry.get('text', '(no text)')}")
-            print(f"Filtered: {entry.get('filtered', '(no filtered output)')}")
-
-            while True:
-                response = input("Is this satisfactory? [y/n/s=skip/q=quit] ").strip().lower()
-                if response in ['y', 'n', 's', 'q']:
+    video, tagger_version = file_identity(input_path, tagger_version)
+    with AnnotationStore(store_path) as store:
+        store.set_lines(video, tagger_version, count_lines(input_path))
+        outfile = open(output_path, 'a', encoding='utf-8') if output_path else None
+        try:
+            # input is a .jsonl or a .tok file
+            for line_num, entry in entries_after(input_path, None):
+                print(f"\n=== Line {line_num} ===")
+                response, note = ask(entry.get('text'), entry.get('filtered'))
+                if response == 'q':
+                    print("Quitting.")
                     break
 
+                correct = None if response == 's' else response == 'y'
+                index = entry_index(entry, line_num)
+                store.record(video, tagger_version, index, correct, note, entry.get("text"), entry.get("filtered"),
+                             sequential=True)
+                if outfile is not None:
+                    annotation = {
+                        "index": index,
+                        "text": entry.get("text"),
+                        "filtered": entry.get("filtered"),
+                        "correct": correct,
+                        "note": note,
+                    }
+                    outfile.write(json.dumps(annotation, ensure_ascii=False) + "\n")
+        finally:
+            if outfile is not None:
+                outfile.close()
+
+    print(f"\nAnnotations saved to: {store_path}")
+
+
+def annotate_sample(name, size=None, db_path=DB_PATH, store_path=DEFAULT_STORE_PATH, strata="series",
+                    tagger_name=DEFAULT_TAGGER, seed=0):
+    """judge the lines of stratified sample name (drawing it first if it is new)"""
+    tagger = make_tagger(tagger_name)
+    tagger_version = tagger.version_string()
+    with AnnotationStore(store_path) as store:
+        if name not in store.samples():
+            if not size:
+                print(f"No sample called {name!r} yet, give its --size to draw it.")
+                return
+            db_conn = sqlite3.connect(db_path)
+            try:
+                population = store.draw_sample(name, db_conn, size, strata, seed)
+            finally:
+                db_conn.close()
+            print(f"🎲 drew sample {name!r}: {size} lines from {len(population)} strata "
+                  f"({sum(population.values())} lines in the corpus)")
+
+        todo = store.sample_lines(name, tagger_version)
+        for n, (position, video, index, stratum, text) in enumerate(todo, 1):
+            print(f"\n=== {name} #{position + 1} ({n}/{len(todo)} left) · {video} line {index} ===")
+            tokens = [list(pair) for pair in tagger.tag(text)]
+            response, note = ask(text, tokens)
             if response == 'q':
                 print("Quitting.")
                 break
-            elif response == 's':
-                continue
+            store.record(video, tagger_version, index, None if response == 's' else response == 'y',
+                         note, text, tokens)
+
+    print(f"\nAnnotations saved to: {store_path}")
 
-            annotation = {
-                "index": entry.get("index", line_num),
-                "text": entry.get("text"),
-                "filtered": entry.get("filtered"),
-                "satisfactory": response == 'y'
-            }
 
-            if response == 'n':
-                note = input("Optional note: ").strip()
-                if note:
-                    annotation["note"] = note
+def main():
+    parser = argparse.ArgumentParser(description="Judge tagged subtitle lines one by one.")
+    parser.add_argument("input", nargs="?", help="Path to input JSONL (or .tok) file")
+    parser.add_argument("--export", type=Path, help="Also append the judgements to this jsonl file")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Annotation store")
+    parser.add_argument("--tagger-version", help="Tagger version of a jsonl's tags (a .tok knows its own)")
+    parser.add_argument("--sample", help="Judge this stratified sample of the built database instead")
+    parser.add_argument("--size", type=int, help="Lines to draw for a new sample")
+    parser.add_argument("--strata", choices=STRATA, default="series", help="What a new sample is stratified by")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed for a new sample")
+    parser.add_argument("--db", type=Path, default=DB_PATH, help="Database to draw a new sample from")
+    parser.add_argument("--tagger", choices=sorted(TAGGERS), default=DEFAULT_TAGGER,
+                        help="Tagger whose output the sample lines are judged on")
+    args = parser.parse_args()
 
-            outfile.write(json.dumps(annotation, ensure_ascii=False) + "\n")
+    if args.sample:
+        annotate_sample(args.sample, args.size, args.db, args.store, args.strata, args.tagger, args.seed)
+        return
+    input_file = args.input or input("Path to input JSONL (or .tok) file: ").strip()
+    annotate_jsonl(input_file, args.export, args.store, args.tagger_version)
 
-        print(f"\nAnnotations saved to: {output_path}")
 
 if __name__ == "__main__":
-    input_file = input("Path to input JSONL file: ").strip()
-    output_file = input("Path to save annotations: ").strip()
-    annotate_jsonl(input_file, output_file)
-
+    main()
@@ -0,0 +1,452 @@
+'''
+sqlite store for the manual tagging judgements of annotate_output.py and
+resume_annotations.py (they used to append to *_annotated.jsonl files,
+with "satisfactory" in one and "correct" in the other).
+
+one Annotations row per (video, tagger version, subtitle index):
+correct is 1 / 0, or NULL for a line that was skipped. video is the
+file's path under raw/ (the "source" a .tok file carries, and the key
+of BuildManifest), or the file name for files that don't know it.
+judgements only count for the tagger version that produced the tags.
+
+  resume       where to pick up is AnnotationTotals.resume_index for
+               (video, tagger version): the furthest line judged in file
+               order (annotate_output.py, resume_annotations.py, imports),
+               one lookup on the primary key. sample judgements land in
+               the same Annotations table but don't move it, so judging a
+               random line of a file never skips the ones before it
+  reports      AnnotationTotals holds running counts per video and tagger
+               version (annotated / correct / incorrect / skipped, and the
+               file's line count), kept up to date by triggers, so a
+               report reads one row instead of both files
+  sampling     a stratified random sample of subtitle lines from the built
+               database (strata: series, category or video), stored in
+               AnnotationSamples so the same lines come back on resume.
+               estimate() weighs each stratum's accuracy by its share of
+               the corpus and gives a confidence interval, so a few
+               hundred judgements say something about every line
+
+the store is its own file (annotations/annotations.db), not part of
+korean_vocab.db, so a --fresh or --atomic rebuild never drops judgements.
+
+python annotation_store.py --import ../../annotations/*_annotated.jsonl   # old jsonl annotations
+python annotation_store.py --export ../../annotations/export.jsonl
+'''
+
+import argparse
+import json
+import math
+import random
+import sqlite3
+import sys
+from collections import defaultdict
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.token_store import TokenStore, iter_entries, SUFFIX as TOKENS_SUFFIX
+
+DEFAULT_STORE_PATH = Path(__file__).resolve().parent.parent.parent / "annotations" / "annotations.db"
+UNKNOWN_VERSION = "unknown"  # tags from a jsonl, which doesn't record its tagger
+STRATA = ("series", "category", "video")
+Z_95 = 1.959964
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS Annotations (
+    video TEXT NOT NULL,            -- path under raw/, or the file name
+    tagger_version TEXT NOT NULL,
+    line_index INTEGER NOT NULL,    -- the subtitle's index
+    correct INTEGER,                -- 1 / 0, NULL: skipped
+    note TEXT,
+    text TEXT,
+    tokens TEXT,                    -- the (word, pos_tag) pairs that were judged, json
+    annotated_at TEXT DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (video, tagger_version, line_index)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS AnnotationTotals (
+    video TEXT NOT NULL,
+    tagger_version TEXT NOT NULL,
+    lines INTEGER,                  -- lines in the file, as last seen by the annotation tools
+    annotated INTEGER NOT NULL DEFAULT 0,
+    correct INTEGER NOT NULL DEFAULT 0,
+    incorrect INTEGER NOT NULL DEFAULT 0,
+    skipped INTEGER NOT NULL DEFAULT 0,
+    resume_index INTEGER,           -- furthest subtitle index judged in file order, NULL: none
+    PRIMARY KEY (video, tagger_version)
+);
+
+-- stratified samples: the lines in the order they are shown, and the
+-- corpus size of every stratum (for the weights)
+CREATE TABLE IF NOT EXISTS AnnotationSamples (
+    sample TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    video TEXT NOT NULL,
+    line_index INTEGER NOT NULL,
+    stratum TEXT NOT NULL,
+    text TEXT NOT NULL,
+    PRIMARY KEY (sample, position)
+);
+
+CREATE TABLE IF NOT EXISTS AnnotationStrata (
+    sample TEXT NOT NULL,
+    stratum TEXT NOT NULL,
+    population INTEGER NOT NULL,
+    PRIMARY KEY (sample, stratum)
+);
+
+CREATE TRIGGER IF NOT EXISTS trg_annotations_insert
+AFTER INSERT ON Annotations
+BEGIN
+    INSERT INTO AnnotationTotals (video, tagger_version, annotated, correct, incorrect, skipped)
+    VALUES (NEW.video, NEW.tagger_version, 1, NEW.correct IS 1, NEW.correct IS 0, NEW.correct IS NULL)
+    ON CONFLICT(video, tagger_version) DO UPDATE SET
+        annotated = annotated + 1,
+        correct = correct + excluded.correct,
+        incorrect = incorrect + excluded.incorrect,
+        skipped = skipped + excluded.skipped;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_annotations_update
+AFTER UPDATE OF correct ON Annotations
+BEGIN
+    UPDATE AnnotationTotals SET
+        correct = correct - (OLD.correct IS 1) + (NEW.correct IS 1),
+        incorrect = incorrect - (OLD.correct IS 0) + (NEW.correct IS 0),
+        skipped = skipped - (OLD.correct IS NULL) + (NEW.correct IS NULL)
+    WHERE video = NEW.video AND tagger_version = NEW.tagger_version;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_annotations_delete
+AFTER DELETE ON Annotations
+BEGIN
+    UPDATE AnnotationTotals SET
+        annotated = annotated - 1,
+        correct = correct - (OLD.correct IS 1),
+        incorrect = incorrect - (OLD.correct IS 0),
+        skipped = skipped - (OLD.correct IS NULL)
+    WHERE video = OLD.video AND tagger_version = OLD.tagger_version;
+END;
+"""
+
+
+def file_identity(path, tagger_version=None):
+    """(video, tagger_version) of a .tok / .jsonl file.
+
+    a .tok made by the build knows both; otherwise the video is the file
+    name and the tagger version tagger_version (or "unknown").
+    """
+    path = Path(path)
+    if path.suffix == TOKENS_SUFFIX:
+        with TokenStore(path) as store:
+            meta = store.meta
+        return meta.get("source") or path.name, tagger_version or meta.get("tagger_version") or UNKNOWN_VERSION
+    return path.name, tagger_version or UNKNOWN_VERSION
+
+
+def count_lines(path):
+    """subtitle lines in a .tok / .jsonl file, without parsing the json"""
+    path = Path(path)
+    if path.suffix == TOKENS_SUFFIX:
+        with TokenStore(path) as store:
+            return len(store)
+    with open(path, encoding="utf-8") as f:
+        return sum(1 for line in f if line.strip())
+
+
+def entries_after(path, last_index):
+    """(line number, entry) of the lines of path whose subtitle index is past last_index"""
+    path = Path(path)
+    if path.suffix == TOKENS_SUFFIX:
+        # a .tok has every line's index in one array: jump straight to the first one left
+        with TokenStore(path) as store:
+            later = np.flatnonzero(store.line_index > (-1 if last_index is None else last_index))
+            for i in range(int(later[0]) if len(later) else len(store), len(store)):
+                yield i + 1, store.entry(i)
+        return
+    for line_num, entry in enumerate(iter_entries(path), 1):
+        if last_index is None or entry_index(entry, line_num) > last_index:
+            yield line_num, entry
+
+
+def entry_index(entry, line_num):
+    index = entry.get("index")
+    return line_num if index is None else index
+
+
+def parse_correct(entry):
+    """True / False / None from either field the old jsonl files used"""
+    for field in ("correct", "satisfactory"):
+        if field in entry:
+            return bool(entry[field])
+    return None
+
+
+class AnnotationStore:
+    def __init__(self, path=DEFAULT_STORE_PATH):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(self.path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._add_resume_index()
+
+    def _add_resume_index(self):
+        """stores made before the resume cursor: add it, from the judgements that aren't sample lines"""
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(AnnotationTotals)")}
+        if "resume_index" in columns:
+            return
+        with self.conn:
+            self.conn.execute("ALTER TABLE AnnotationTotals ADD COLUMN resume_index INTEGER")
+            self.conn.execute("""
+                UPDATE AnnotationTotals SET resume_index = (
+                    SELECT MAX(a.line_index) FROM Annotations a
+                    WHERE a.video = AnnotationTotals.video AND a.tagger_version = AnnotationTotals.tagger_version
+                      AND NOT EXISTS (SELECT 1 FROM AnnotationSamples s
+                                      WHERE s.video = a.video AND s.line_index = a.line_index))
+            """)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+    def resume_point(self, video, tagger_version):
+        """subtitle index of the furthest line judged (or skipped) in file order, None if none was"""
+        row = self.conn.execute(
+            "SELECT resume_index FROM AnnotationTotals WHERE video = ? AND tagger_version = ?",
+            (video, tagger_version)).fetchone()
+        return row[0] if row else None
+
+    def _advance(self, video, tagger_version, line_index):
+        self.conn.execute("""
+            INSERT INTO AnnotationTotals (video, tagger_version, resume_index) VALUES (?, ?, ?)
+            ON CONFLICT(video, tagger_version) DO UPDATE SET
+                resume_index = MAX(COALESCE(resume_index, excluded.resume_index), excluded.resume_index)
+        """, (video, tagger_version, line_index))
+
+    def set_lines(self, video, tagger_version, lines):
+        self.conn.execute("""
+            INSERT INTO AnnotationTotals (video, tagger_version, lines) VALUES (?, ?, ?)
+            ON CONFLICT(video, tagger_version) DO UPDATE SET lines = excluded.lines
+        """, (video, tagger_version, lines))
+        self.conn.commit()
+
+    def record(self, video, tagger_version, line_index, correct, note=None, text=None, tokens=None,
+               sequential=False):
+        """one judgement (correct=None: skipped), replacing an earlier one of the same line. commits,
+        so quitting never loses a judgement. sequential: made going through the file in order, so
+        the resume point moves up to it"""
+        self.conn.execute("""
+            INSERT INTO Annotations (video, tagger_version, line_index, correct, note, text, tokens)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(video, tagger_version, line_index) DO UPDATE SET
+                correct = excluded.correct, note = excluded.note, text = excluded.text,
+                tokens = excluded.tokens, annotated_at = CURRENT_TIMESTAMP
+        """, (video, tagger_version, line_index, None if correct is None else int(correct), note or None,
+              text, None if tokens is None else json.dumps(tokens, ensure_ascii=False)))
+        if sequential:
+            self._advance(video, tagger_version, line_index)
+        self.conn.commit()
+
+    def totals(self, video=None, tagger_version=None):
+        """AnnotationTotals rows as dicts, all of them or one video's"""
+        query = "SELECT video, tagger_version, lines, annotated, correct, incorrect, skipped FROM AnnotationTotals"
+        args = ()
+        if video is not None:
+            query += " WHERE video = ?"
+            args = (video,)
+            if tagger_version is not None:
+                query += " AND tagger_version = ?"
+                args += (tagger_version,)
+        query += " ORDER BY video, tagger_version"
+        keys = ("video", "tagger_version", "lines", "annotated", "correct", "incorrect", "skipped")
+        return [dict(zip(keys, row)) for row in self.conn.execute(query, args)]
+
+    def import_jsonl(self, path, video=None, tagger_version=UNKNOWN_VERSION):
+        """load an old *_annotated.jsonl (either tool's fields). returns the number of lines"""
+        path = Path(path)
+        video = video or path.name.replace("_annotated", "")
+        n = 0
+        with self.conn:
+            for line_num, entry in enumerate(iter_entries(path), 1):
+                index = entry_index(entry, line_num)
+                self.conn.execute("""
+                    INSERT OR IGNORE INTO Annotations (video, tagger_version, line_index, correct, note, text, tokens)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                """, (video, tagger_version, index,
+                      None if parse_correct(entry) is None else int(parse_correct(entry)),
+                      entry.get("note") or None, entry.get("text"),
+                      json.dumps(entry.get("filtered"), ensure_ascii=False)))
+                self._advance(video, tagger_version, index)
+                n += 1
+        return n
+
+    def export_jsonl(self, out):
+        """every judgement as one json line (the unified fields), for the tools that read jsonl"""
+        n = 0
+        for video, tagger_version, index, correct, note, text, tokens in self.conn.execute("""
+                SELECT video, tagger_version, line_index, correct, note, text, tokens
+                FROM Annotations ORDER BY video, tagger_version, line_index"""):
+            entry = {"video": video, "tagger_version": tagger_version, "index": index, "text": text,
+                     "filtered": json.loads(tokens) if tokens else None, "note": note or ""}
+            if correct is not None:
+                entry["correct"] = bool(correct)
+            out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            n += 1
+        return n
+
+    # stratified sampling
+
+    def draw_sample(self, name, db_conn, size, strata="series", seed=0):
+        """store a stratified sample of size lines from the built database and return the strata sizes.
+
+        lines are allocated to strata in proportion to their size, at least
+        two per stratum (so each has a variance) where it has them, and
+        stored in random order, so stopping early still covers every stratum.
+        """
+        if self.conn.execute("SELECT 1 FROM AnnotationSamples WHERE sample = ?", (name,)).fetchone():
+            raise ValueError(f"there already is a sample called {name!r}")
+        rng = random.Random(seed)
+        lines = defaultdict(list)
+        for line_id, source in db_conn.execute("""
+                SELECT l.line_id, m.source_path FROM SubtitleLines l
+                JOIN BuildManifest m ON m.video_id = l.video_id"""):
+            lines[stratum_of(source, strata)].append(line_id)
+        population = {stratum: len(ids) for stratum, ids in lines.items()}
+        total = sum(population.values())
+        if not total:
+            raise ValueError("the database has no subtitle lines")
+
+        drawn = []
+        for stratum, n in allocate(population, size).items():
+            drawn.extend(rng.sample(lines[stratum], n))
+        rng.shuffle(drawn)
+
+        rows = []
+        for position, line_id in enumerate(drawn):
+            source, index, text = db_conn.execute("""
+                SELECT m.source_path, l.subtitle_index, l.text FROM SubtitleLines l
+                JOIN BuildManifest m ON m.video_id = l.video_id WHERE l.line_id = ?""", (line_id,)).fetchone()
+            rows.append((name, position, source, index, stratum_of(source, strata), text))
+        with self.conn:
+            self.conn.executemany("INSERT INTO AnnotationStrata (sample, stratum, population) VALUES (?, ?, ?)",
+                                  [(name, stratum, n) for stratum, n in population.items()])
+            self.conn.executemany("""
+                INSERT INTO AnnotationSamples (sample, position, video, line_index, stratum, text)
+                VALUES (?, ?, ?, ?, ?, ?)""", rows)
+        return population
+
+    def sample_lines(self, name, tagger_version):
+        """(position, video, line_index, stratum, text) of the sample lines not judged yet, in order"""
+        return self.conn.execute("""
+            SELECT s.position, s.video, s.line_index, s.stratum, s.text FROM AnnotationSamples s
+            WHERE s.sample = ? AND NOT EXISTS (
+                SELECT 1 FROM Annotations a
+                WHERE a.video = s.video AND a.tagger_version = ? AND a.line_index = s.line_index)
+            ORDER BY s.position""", (name, tagger_version)).fetchall()
+
+    def samples(self):
+        return [row[0] for row in self.conn.execute("SELECT DISTINCT sample FROM AnnotationSamples ORDER BY 1")]
+
+    def estimate(self, name, tagger_version, z=Z_95):
+        """stratified estimate of the share of correct lines in the whole corpus.
+
+        {"accuracy", "low", "high", "judged", "sample_size", "coverage", "strata": [...]};
+        coverage is the share of the corpus in strata with at least one
+        judgement, the estimate only speaks for those. None if nothing is judged yet.
+        """
+        population = dict(self.conn.execute(
+            "SELECT stratum, population FROM AnnotationStrata WHERE sample = ?", (name,)))
+        (sample_size,) = self.conn.execute(
+            "SELECT COUNT(*) FROM AnnotationSamples WHERE sample = ?", (name,)).fetchone()
+        judged = self.conn.execute("""
+            SELECT s.stratum, COUNT(*), SUM(a.correct) FROM AnnotationSamples s
+            JOIN Annotations a ON a.video = s.video AND a.tagger_version = ? AND a.line_index = s.line_index
+            WHERE s.sample = ? AND a.correct IS NOT NULL
+            GROUP BY s.stratum""", (tagger_version, name)).fetchall()
+        return stratified_estimate(population, {stratum: (n, c) for stratum, n, c in judged}, sample_size, z)
+
+
+def stratum_of(source, strata="series"):
+    """drama/Coffee_Prince/ep1.srt -> drama/Coffee_Prince (series), drama (category) or itself (video)"""
+    if strata == "video":
+        return source
+    parts = Path(source).parts
+    if strata == "category" or len(parts) < 3:
+        return parts[0] if len(parts) > 1 else ""
+    return str(Path(*parts[:-1]))
+
+
+def allocate(population, size):
+    """lines per stratum: proportional to its size (largest remainders), at least two, at most all"""
+    total = sum(population.values())
+    size = min(size, total)
+    shares = {stratum: size * n / total for stratum, n in population.items()}
+    counts = {stratum: min(population[stratum], max(2, int(share))) for stratum, share in shares.items()}
+    for stratum in sorted(shares, key=lambda s: shares[s] - int(shares[s]), reverse=True):
+        if sum(counts.values()) >= size:
+            break
+        if counts[stratum] < population[stratum]:
+            counts[stratum] += 1
+    return counts
+
+
+def stratified_estimate(population, judged, sample_size=None, z=Z_95):
+    """population {stratum: lines}, judged {stratum: (judged, correct)} -> estimate dict (see estimate)"""
+    covered = {stratum: judged[stratum] for stratum in population if judged.get(stratum, (0, 0))[0]}
+    if not covered:
+        return None
+    covered_total = sum(population[stratum] for stratum in covered)
+    accuracy = variance = 0.0
+    strata = []
+    for stratum, (n, c) in sorted(covered.items()):
+        weight = population[stratum] / covered_total
+        p = c / n
+        accuracy += weight * p
+        # finite population correction: a stratum judged in full has no sampling error
+        fpc = 1 - n / population[stratum]
+        variance += weight ** 2 * fpc * p * (1 - p) / max(n - 1, 1)
+        strata.append({"stratum": stratum, "population": population[stratum], "judged": n, "correct": c,
+                       "accuracy": p})
+    margin = z * math.sqrt(variance)
+    return {
+        "accuracy": accuracy,
+        "low": max(0.0, accuracy - margin),
+        "high": min(1.0, accuracy + margin),
+        "judged": sum(n for n, _ in covered.values()),
+        "sample_size": sample_size,
+        "coverage": covered_total / sum(population.values()),
+        "strata": strata,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and export manual annotations.")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Annotation store")
+    parser.add_argument("--import", dest="import_files", nargs="+", type=Path, default=[],
+                        help="Old *_annotated.jsonl files to load")
+    parser.add_argument("--tagger-version", default=UNKNOWN_VERSION,
+                        help="Tagger version the imported files were tagged with")
+    parser.add_argument("--export", type=Path, help="Write every judgement to this jsonl file")
+    args = parser.parse_args()
+
+    with AnnotationStore(args.store) as store:
+        for path in args.import_files:
+            print(f"✅ {path.name}: {store.import_jsonl(path, tagger_version=args.tagger_version)} lines imported")
+        if args.export:
+            with open(args.export, "w", encoding="utf-8") as out:
+                print(f"✅ {store.export_jsonl(out)} annotations written to {args.export}")
+
+
+if __name__ == "__main__":
+    main()
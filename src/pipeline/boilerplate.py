@@ -0,0 +1,372 @@
+'''
+boilerplate lines and near-duplicate files across raw/, found before
+anything is tagged.
+
+subtitle files carry text that isn't dialogue: the title card (여신강림),
+"제 11 화", and the fansub credits ("동기화 및 자막 제공 The True Beauty
+팀 @ Viki.com"), worded a little differently from one episode to the
+next. scan() reads every file once and groups such lines with MinHash / LSH:
+
+  normalize   lower case, spaces and punctuation dropped, every number
+              "0" (so 제 3 화 and 제 11 화 are one line)
+  shingles    character 3-grams of each distinct normalized line
+  minhash     NUM_PERM multiply-shift hashes, the minimum per line, in
+              numpy over all distinct lines at once
+  lsh         BANDS bands of ROWS hashes; lines sharing a band are
+              candidates, and are grouped (union-find) when their
+              signatures agree on at least line_similarity of the hashes
+
+a group is boilerplate when it turns up in at least min_files files and
+at least edge_share of its occurrences are near the start or end of
+their file (the first or last edge_cues cues, or edge_fraction of the
+file if that is more): credits and title cards sit at the edges,
+while 네 or 뭐? are everywhere. a credit block spread over several cues
+comes out as several groups, one per cue. a line that is dialogue all
+the same (영광입니다. at the end of a few episodes) goes on the keep
+list (--keep), which later scans carry over and never flag.
+
+whole files go through the same minhash / lsh, on 5-gram shingles of
+their normalized text with the boilerplate left out. a file at least
+file_similarity alike to an earlier one (in source path order) is a
+duplicate of it, e.g. the same episode from two subtitle sources.
+
+the result is saved as a filter list (aux_data/boilerplate.json): every
+normalized form of every boilerplate group, with an example and counts,
+and the duplicate files with what they duplicate. it is plain json, to
+review and edit by hand. build_database.py loads it (LineFilter), drops
+matching lines at the edges of a file (where they were found; the same
+words mid-episode are dialogue) before they are tagged, skips duplicate files (--prune
+removes ones ingested before), and records the digest of the list in
+the manifest, so a changed list re-ingests the corpus, mostly from the
+tag cache.
+
+python boilerplate.py ../../raw              # scan, print what was found
+python boilerplate.py ../../raw --save       # ... and save it as the filter list
+python boilerplate.py --show                 # the saved filter list
+python boilerplate.py ../../raw --save --keep 영광입니다.   # never flag this line again
+'''
+
+import argparse
+import hashlib
+import json
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.srt_to_json import iter_subtitles
+from pipeline.subtitle_reader import find_subtitle_files
+
+ROOT = Path(__file__).resolve().parent.parent.parent
+RAW_DIR = ROOT / "raw"
+DEFAULT_FILTER_PATH = ROOT / "aux_data" / "boilerplate.json"
+
+NUM_PERM = 64
+BANDS, ROWS = 16, 4          # NUM_PERM = BANDS * ROWS, candidates from about 0.5 similarity
+LINE_SHINGLE = 3
+FILE_SHINGLE = 5
+LINE_SIMILARITY = 0.7
+FILE_SIMILARITY = 0.8
+MIN_FILES = 5
+EDGE_CUES = 20
+EDGE_FRACTION = 0.1
+EDGE_SHARE = 0.8
+SEED = 20240601
+
+_NOT_WORD = re.compile(r"[\W_]+")
+_NUMBER = re.compile(r"\d+")
+
+_rng = np.random.default_rng(SEED)
+_MUL = _rng.integers(1, np.iinfo(np.uint64).max, NUM_PERM, dtype=np.uint64) | np.uint64(1)
+_ADD = _rng.integers(0, np.iinfo(np.uint64).max, NUM_PERM, dtype=np.uint64)
+_EMPTY = np.iinfo(np.uint32).max
+
+
+def normalize(text):
+    """the form lines are compared in: lower case, no spaces / punctuation, numbers as 0"""
+    return _NUMBER.sub("0", _NOT_WORD.sub("", text.lower()))
+
+
+def shingle_hashes(texts, k):
+    """(hashes, owner): a uint64 per character k-gram of each text and the index of its text.
+    a text shorter than k is one shingle of itself, an empty one has none"""
+    lengths = np.fromiter(map(len, texts), dtype=np.int64, count=len(texts))
+    codes = np.frombuffer("".join(texts).encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    starts = np.cumsum(lengths) - lengths
+    counts = np.where(lengths >= k, lengths - k + 1, (lengths > 0).astype(np.int64))
+    owner = np.repeat(np.arange(len(texts)), counts)
+    first = np.repeat(starts, counts) + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    ends = np.repeat(starts + lengths, counts)
+    hashes = np.zeros(len(first), dtype=np.uint64)
+    for j in range(k):
+        pos = first + j
+        code = codes[np.minimum(pos, len(codes) - 1)] if len(codes) else np.zeros(0, dtype=np.uint64)
+        hashes = hashes * np.uint64(1000003) + np.where(pos < ends, code, np.uint64(0))
+    return hashes, owner
+
+
+def minhash(hashes, owner, n):
+    """(n, NUM_PERM) uint32 signatures, owner ascending. rows without shingles are all _EMPTY"""
+    signatures = np.full((n, NUM_PERM), _EMPTY, dtype=np.uint32)
+    if not len(hashes):
+        return signatures
+    rows, starts = np.unique(owner, return_index=True)
+    for j in range(NUM_PERM):
+        values = (_MUL[j] * hashes + _ADD[j]) >> np.uint64(32)
+        signatures[rows, j] = np.minimum.reduceat(values, starts)
+    return signatures
+
+
+def similarity(signatures, a, b):
+    """estimated jaccard similarity of rows a and b (arrays of row indexes)"""
+    return (signatures[a] == signatures[b]).mean(axis=1)
+
+
+def lsh_groups(signatures, threshold):
+    """group label per row: rows sharing an lsh band whose signatures agree on at least threshold
+    of their hashes end up in one group (union-find). rows without shingles stay on their own"""
+    n = len(signatures)
+    parent = list(range(n))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    valid = np.flatnonzero((signatures != _EMPTY).any(axis=1))
+    for band in range(BANDS):
+        block = np.ascontiguousarray(signatures[valid, band * ROWS:(band + 1) * ROWS])
+        keys = block.view(np.dtype((np.void, block.dtype.itemsize * ROWS))).ravel()
+        _, bucket, sizes = np.unique(keys, return_inverse=True, return_counts=True)
+        bucket = bucket.ravel()
+        shared = np.flatnonzero(sizes[bucket] > 1)
+        order = shared[np.argsort(bucket[shared], kind="stable")]
+        if not len(order):
+            continue
+        # every member of a bucket is compared with the bucket's first row
+        in_bucket = bucket[order]
+        is_head = np.r_[True, in_bucket[1:] != in_bucket[:-1]]
+        head = order[np.maximum.accumulate(np.where(is_head, np.arange(len(order)), 0))]
+        a, b = valid[head[~is_head]], valid[order[~is_head]]
+        close = similarity(signatures, a, b) >= threshold
+        for i, j in zip(a[close].tolist(), b[close].tolist()):
+            root_i, root_j = find(i), find(j)
+            if root_i != root_j:
+                parent[max(root_i, root_j)] = min(root_i, root_j)
+    return np.array([find(i) for i in range(n)], dtype=np.int64)
+
+
+def edge_window(cues, edge_cues=EDGE_CUES, edge_fraction=EDGE_FRACTION):
+    """cues at each end of a file of cues cues that count as its edge"""
+    return max(edge_cues, edge_fraction * cues)
+
+
+def scan(raw_dir=RAW_DIR, min_files=MIN_FILES, edge_cues=EDGE_CUES, edge_fraction=EDGE_FRACTION,
+         edge_share=EDGE_SHARE, line_similarity=LINE_SIMILARITY, file_similarity=FILE_SIMILARITY, keep=()):
+    """boilerplate line groups and duplicate files of every subtitle file under raw_dir.
+
+    a group with a line of keep in it (normalized or not) is never boilerplate.
+    returns the filter list as a dict (see save_filter), with "stats" added.
+    """
+    keep = sorted({normalize(text) for text in keep} - {""})
+    raw_dir = Path(raw_dir)
+    paths = find_subtitle_files(raw_dir)
+    sources = [path.relative_to(raw_dir).as_posix() for path in paths]
+
+    # every non-empty cue as (distinct normalized form, file, at an edge of it)
+    forms = {}
+    examples = []
+    occ_form, occ_file, occ_edge = [], [], []
+    cues = 0
+    for f, path in enumerate(paths):
+        texts = [sub["text"] for sub in iter_subtitles(path)]
+        cues += len(texts)
+        edge = edge_window(len(texts), edge_cues, edge_fraction)
+        for i, text in enumerate(texts):
+            form = normalize(text)
+            if not form:
+                continue
+            form_id = forms.setdefault(form, len(forms))
+            if form_id == len(examples):
+                examples.append(text)
+            occ_form.append(form_id)
+            occ_file.append(f)
+            occ_edge.append(i < edge or i >= len(texts) - edge)
+    form_list = list(forms)
+    n_forms, n_files = len(form_list), len(paths)
+    occ_form = np.array(occ_form, dtype=np.int64)
+    occ_file = np.array(occ_file, dtype=np.int64)
+    occ_edge = np.array(occ_edge, dtype=bool)
+
+    # group the distinct lines, then count each group's files and edge share
+    group = lsh_groups(minhash(*shingle_hashes(form_list, LINE_SHINGLE), n_forms), line_similarity)
+    occ_group = group[occ_form]
+    occurrences = np.bincount(occ_group, minlength=n_forms)
+    at_edge = np.bincount(occ_group, weights=occ_edge, minlength=n_forms)
+    files = np.bincount(np.unique(occ_group * n_files + occ_file) // n_files, minlength=n_forms)
+    is_boilerplate = (files >= min_files) & (at_edge >= edge_share * occurrences) & (occurrences > 0)
+    is_boilerplate[group[[forms[form] for form in keep if form in forms]]] = False
+
+    form_count = np.bincount(occ_form, minlength=n_forms)
+    lines = []
+    for g in np.flatnonzero(is_boilerplate).tolist():
+        members = np.flatnonzero(group == g)
+        members = members[np.argsort(-form_count[members], kind="stable")]
+        lines.append({
+            "example": examples[members[0]],
+            "forms": [form_list[m] for m in members.tolist()],
+            "files": int(files[g]),
+            "occurrences": int(occurrences[g]),
+        })
+    lines.sort(key=lambda line: -line["occurrences"])
+
+    # whole files, on the text that is left
+    left = ~(is_boilerplate[occ_group] & occ_edge)
+    file_texts = [""] * n_files
+    for f in range(n_files):
+        in_file = occ_form[left & (occ_file == f)]
+        file_texts[f] = "".join(form_list[m] for m in in_file.tolist())
+    file_signatures = minhash(*shingle_hashes(file_texts, FILE_SHINGLE), n_files)
+    file_group = lsh_groups(file_signatures, file_similarity)
+    duplicates = []
+    for f in range(n_files):
+        kept = int(file_group[f])
+        if kept != f:  # the group's label is its first file in path order
+            duplicates.append({
+                "source": sources[f],
+                "same_as": sources[kept],
+                "similarity": round(float(similarity(file_signatures, np.array([f]), np.array([kept]))[0]), 3),
+            })
+
+    dropped = int(at_edge[is_boilerplate].sum())
+    return {
+        "version": 1,
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "settings": {
+            "min_files": min_files, "edge_cues": edge_cues, "edge_fraction": edge_fraction, "edge_share": edge_share,
+            "line_similarity": line_similarity, "file_similarity": file_similarity,
+            "num_perm": NUM_PERM, "bands": BANDS, "rows": ROWS,
+        },
+        "lines": lines,
+        "keep": keep,
+        "duplicates": duplicates,
+        "stats": {"files": n_files, "cues": cues, "distinct_lines": n_forms, "boilerplate_cues": dropped},
+    }
+
+
+def save_filter(result, path=DEFAULT_FILTER_PATH):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    data = {key: value for key, value in result.items() if key != "stats"}
+    path.write_text(json.dumps(data, ensure_ascii=False, indent=1) + "\n", encoding="utf-8")
+    return path
+
+
+def load_keep(path=DEFAULT_FILTER_PATH):
+    """the keep list of the filter list at path, so a new scan carries it over"""
+    path = Path(path)
+    if not path.exists():
+        return []
+    return json.loads(path.read_text(encoding="utf-8")).get("keep", [])
+
+
+class LineFilter:
+    """the saved filter list, applied to cue dicts on their way to the tagger"""
+
+    def __init__(self, forms=(), duplicates=None, edge_cues=EDGE_CUES, edge_fraction=EDGE_FRACTION):
+        self.forms = frozenset(forms)
+        self.duplicates = dict(duplicates or {})  # source -> the source it duplicates
+        self.edge_cues = edge_cues
+        self.edge_fraction = edge_fraction
+        # over what the filter does, not when it was made, so re-saving the same list changes nothing
+        canonical = json.dumps([sorted(self.forms), sorted(self.duplicates.items()), edge_cues, edge_fraction],
+                               ensure_ascii=False)
+        self.digest = hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+        self.dropped = 0
+
+    @classmethod
+    def from_dict(cls, data):
+        settings = data.get("settings", {})
+        return cls((form for line in data.get("lines", []) for form in line["forms"]),
+                   {d["source"]: d["same_as"] for d in data.get("duplicates", [])},
+                   settings.get("edge_cues", EDGE_CUES), settings.get("edge_fraction", EDGE_FRACTION))
+
+    def drop(self, entries, cues):
+        """entries minus the boilerplate ones at the edges of the file, counted in self.dropped.
+        cues is how many entries there are (count_cues): it sets where the end edge starts,
+        so the entries themselves stream straight through"""
+        edge = edge_window(cues, self.edge_cues, self.edge_fraction)
+        for i, entry in enumerate(entries):
+            if (i < edge or i >= cues - edge) and normalize(entry["text"]) in self.forms:
+                self.dropped += 1
+                continue
+            yield entry
+
+
+def count_cues(path):
+    """cues in a subtitle file, a parsing pass ahead of LineFilter.drop"""
+    return sum(1 for _ in iter_subtitles(path))
+
+
+def load_filter(path=DEFAULT_FILTER_PATH):
+    """the LineFilter saved at path, or None if there isn't one"""
+    path = Path(path)
+    if not path.exists():
+        return None
+    return LineFilter.from_dict(json.loads(path.read_text(encoding="utf-8")))
+
+
+def print_result(result):
+    for line in result["lines"]:
+        variants = f", {len(line['forms'])} variants" if len(line["forms"]) > 1 else ""
+        print(f"{line['occurrences']:>5}x in {line['files']:>3} files{variants}:  {line['example']}")
+    for duplicate in result["duplicates"]:
+        print(f"duplicate: {duplicate['source']} ~ {duplicate['same_as']} ({duplicate['similarity']:.0%})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Find boilerplate lines and duplicate files before tagging.")
+    parser.add_argument("raw_dir", nargs="?", type=Path, default=RAW_DIR, help="Subtitle tree to scan")
+    parser.add_argument("--save", action="store_true", help="Save the result as the filter list")
+    parser.add_argument("--filter", type=Path, default=DEFAULT_FILTER_PATH, help="Filter list path")
+    parser.add_argument("--show", action="store_true", help="Print the saved filter list instead of scanning")
+    parser.add_argument("--min-files", type=int, default=MIN_FILES, help="Files a boilerplate line is in, at least")
+    parser.add_argument("--edge-cues", type=int, default=EDGE_CUES, help="Cues at each end of a file that count as its edge")
+    parser.add_argument("--edge-fraction", type=float, default=EDGE_FRACTION,
+                        help="Share of a file at each end that counts as its edge, if more than --edge-cues")
+    parser.add_argument("--edge-share", type=float, default=EDGE_SHARE,
+                        help="Share of a line's occurrences that must be at an edge")
+    parser.add_argument("--keep", nargs="+", default=[], metavar="LINE",
+                        help="Lines that are dialogue: never flag them (added to the filter list's keep list)")
+    parser.add_argument("--line-similarity", type=float, default=LINE_SIMILARITY)
+    parser.add_argument("--file-similarity", type=float, default=FILE_SIMILARITY)
+    args = parser.parse_args()
+
+    if args.show:
+        if not args.filter.exists():
+            print(f"❌ No filter list at {args.filter}")
+            return
+        print_result(json.loads(args.filter.read_text(encoding="utf-8")))
+        return
+
+    start = time.perf_counter()
+    result = scan(args.raw_dir, args.min_files, args.edge_cues, args.edge_fraction, args.edge_share,
+                  args.line_similarity, args.file_similarity, load_keep(args.filter) + args.keep)
+    print_result(result)
+    stats = result["stats"]
+    print(f"🧹 {len(result['lines'])} boilerplate lines ({stats['boilerplate_cues']} of {stats['cues']} cues), "
+          f"{len(result['duplicates'])} duplicate files, {stats['files']} files scanned "
+          f"in {time.perf_counter() - start:.2f}s")
+    if args.save:
+        print(f"✅ filter list saved to {save_filter(result, args.filter)}")
+
+
+if __name__ == "__main__":
+    main()
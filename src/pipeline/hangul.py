@@ -0,0 +1,60 @@
+'''
+hangul syllable <-> jamo arithmetic.
+
+a precomposed syllable is 0xAC00 + (initial * 21 + medial) * 28 + final,
+with final 0 meaning no final consonant. jamo here are indices into
+INITIALS / MEDIALS / FINALS (compatibility jamo, the ones people type).
+'''
+
+SYLLABLE_BASE = 0xAC00
+SYLLABLE_LAST = 0xD7A3
+
+INITIALS = "ㄱㄲㄴㄷㄸㄹㅁㅂㅃㅅㅆㅇㅈㅉㅊㅋㅌㅍㅎ"
+MEDIALS = "ㅏㅐㅑㅒㅓㅔㅕㅖㅗㅘㅙㅚㅛㅜㅝㅞㅟㅠㅡㅢㅣ"
+FINALS = " ㄱㄲㄳㄴㄵㄶㄷㄹㄺㄻㄼㄽㄾㄿㅀㅁㅂㅄㅅㅆㅇㅈㅊㅋㅌㅍㅎ"
+
+
+def is_syllable(ch):
+    return SYLLABLE_BASE <= ord(ch) <= SYLLABLE_LAST
+
+
+def decompose(ch):
+    """(initial, medial, final) indices of a syllable, final 0 = none"""
+    code = ord(ch) - SYLLABLE_BASE
+    return code // 588, (code % 588) // 28, code % 28
+
+
+def compose(initial, medial, final=0):
+    return chr(SYLLABLE_BASE + (initial * 21 + medial) * 28 + final)
+
+
+def medial(ch):
+    return MEDIALS[decompose(ch)[1]]
+
+
+def final(ch):
+    """the final consonant of a syllable as a jamo, "" when it has none"""
+    return FINALS[decompose(ch)[2]].strip()
+
+
+def with_final(ch, jamo):
+    """ch with its final consonant replaced by jamo ("" to drop it)"""
+    initial, med, _ = decompose(ch)
+    return compose(initial, med, FINALS.index(jamo) if jamo else 0)
+
+
+def with_medial(ch, jamo):
+    initial, _, fin = decompose(ch)
+    return compose(initial, MEDIALS.index(jamo), fin)
+
+
+def to_jamo(text):
+    """text with every syllable spelled out as its jamo, other characters kept"""
+    out = []
+    for ch in text:
+        if is_syllable(ch):
+            initial, med, fin = decompose(ch)
+            out.append(INITIALS[initial] + MEDIALS[med] + FINALS[fin].strip())
+        else:
+            out.append(ch)
+    return "".join(out)
@@ -0,0 +1,124 @@
+'''
+per-stage timing for the build.
+
+a video goes through a chain of generators (parse -> tag -> [write] ->
+match) that all run interleaved, a line at a time. StageClock wraps each
+link of the chain and times the next() calls into it; that time includes
+everything upstream, so the time of a stage on its own is its total
+minus the total of the stage before it. the consumer at the end of the
+chain (count_tokens) is timed as a whole with clock.call().
+
+every stage gets wall time (perf_counter) and cpu time (process_time, so
+the jvm's threads count towards tagging).
+'''
+
+import resource
+import sys
+import time
+
+
+def peak_rss_mb():
+    """high-water mark of this process's resident memory, since the last reset_peak_rss()
+    (or over its lifetime)"""
+    hwm = _proc_status_kb("VmHWM")
+    if hwm is not None:
+        return hwm / 1024
+    # ru_maxrss is KiB on linux, bytes on macos
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def rss_mb():
+    """this process's resident memory now, None where /proc isn't there"""
+    rss = _proc_status_kb("VmRSS")
+    return rss / 1024 if rss is not None else None
+
+
+def reset_peak_rss():
+    """start a new high-water mark for peak_rss_mb, so a long-lived worker can report the peak of
+    each video rather than of everything it has done. False where the kernel has no way to"""
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")  # resets VmHWM to the current RSS (linux 4.0+)
+    except OSError:
+        return False
+    return True
+
+
+def _proc_status_kb(field):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+class StageClock:
+    """wall / cpu seconds per stage of one generator chain"""
+
+    def __init__(self):
+        self._order = []
+        self._inclusive = {}
+
+    def _add(self, name, wall, cpu):
+        totals = self._inclusive.setdefault(name, [0.0, 0.0])
+        totals[0] += wall
+        totals[1] += cpu
+
+    def wrap(self, name, iterable):
+        """iterable, with each next() into it timed. wrap in chain order"""
+        # registered now rather than on the first next(), which comes from the far end of the chain
+        self._order.append(name)
+        self._inclusive.setdefault(name, [0.0, 0.0])
+        return self._timed(name, iter(iterable))
+
+    def _timed(self, name, iterator):
+        while True:
+            wall, cpu = time.perf_counter(), time.process_time()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                self._add(name, time.perf_counter() - wall, time.process_time() - cpu)
+                return
+            self._add(name, time.perf_counter() - wall, time.process_time() - cpu)
+            yield item
+
+    def call(self, name, fn, *args, **kwargs):
+        """time fn as the last stage of the chain (it consumes the wrapped iterators)"""
+        self._order.append(name)
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            self._add(name, time.perf_counter() - wall, time.process_time() - cpu)
+
+    def stages(self):
+        """{name: {"wall": s, "cpu": s}} with each stage's own time, upstream stages subtracted"""
+        result = {}
+        previous = (0.0, 0.0)
+        for name in self._order:
+            wall, cpu = self._inclusive[name]
+            result[name] = {"wall": max(wall - previous[0], 0.0), "cpu": max(cpu - previous[1], 0.0)}
+            previous = (wall, cpu)
+        return result
+
+
+def timed(fn, *args, **kwargs):
+    """(result, {"wall": s, "cpu": s}) of one call"""
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = fn(*args, **kwargs)
+    return result, {"wall": time.perf_counter() - wall, "cpu": time.process_time() - cpu}
+
+
+def sum_stages(records):
+    """total wall / cpu per stage over the "stages" of many per-video records"""
+    totals = {}
+    for record in records:
+        for name, times in record["stages"].items():
+            total = totals.setdefault(name, {"wall": 0.0, "cpu": 0.0})
+            total["wall"] += times["wall"]
+            total["cpu"] += times["cpu"]
+    return totals
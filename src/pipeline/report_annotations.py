@@ -1,60 +1,95 @@
-import json
+'''
+annotation accuracy from the running counts in the annotation store
+(annotation_store.py), without reading the files again.
+
+python report_annotations.py ../../tokens/TrueBeauty_ep1.tok    # one file
+python report_annotations.py                                    # every annotated video
+python report_annotations.py --sample pilot                     # corpus estimate from a stratified sample
+'''
+
+import argparse
 import sys
 from pathlib import Path
 
-def report_stats(jsonl_path):
-    path = Path(jsonl_path)
-    if not path.exists():
-        print(f"❌ File not found: {jsonl_path}")
-        return
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
 
-    # Derive the original file name
-    original_path = path.parent / (path.stem.replace("_annotated", "") + ".jsonl")
+from pipeline.annotation_store import AnnotationStore, DEFAULT_STORE_PATH, file_identity
+from pipeline.taggers import TAGGERS, DEFAULT_TAGGER, make_tagger
 
-    if not original_path.exists():
-        print(f"❌ Original file not found: {original_path}")
-        return
 
-    # Count total lines in the original file
-    with open(original_path, 'r', encoding='utf-8') as f:
-        original_total = sum(1 for _ in f)
-
-    total = 0
-    correct = 0
-    incorrect = 0
-    skipped = 0
-
-    # Read and count stats from the annotated file
-    with open(path, 'r', encoding='utf-8') as f:
-        for line in f:
-            total += 1
-            try:
-                data = json.loads(line)
-                if 'correct' not in data:
-                    skipped += 1
-                elif data['correct']:
-                    correct += 1
-                else:
-                    incorrect += 1
-            except json.JSONDecodeError:
-                skipped += 1  # Treat unreadable lines as skipped
-
-    if original_total == 0:
-        print("⚠️ Original file has no lines.")
+def print_totals(totals):
+    total = totals["annotated"]
+    if not total:
+        print(f"⚠️ Nothing annotated yet for {totals['video']}")
         return
 
     # Output the stats
-    annotated_percentage = (total / original_total) * 100
-    print(f"📊 Annotation Report for {path.name}")
-    print(f"Total lines annotated: {total}/{original_total} ({annotated_percentage:.1f}%)")
-    print(f"Correct (✅):     {correct} ({correct / total:.1%})")
-    print(f"Incorrect (❌):   {incorrect} ({incorrect / total:.1%})")
-    print(f"Skipped (⏭):     {skipped} ({skipped / total:.1%})")
+    print(f"📊 Annotation Report for {totals['video']} ({totals['tagger_version']})")
+    if totals["lines"]:
+        print(f"Total lines annotated: {total}/{totals['lines']} ({total / totals['lines']:.1%})")
+    else:
+        print(f"Total lines annotated: {total}")
+    print(f"Correct (✅):     {totals['correct']} ({totals['correct'] / total:.1%})")
+    print(f"Incorrect (❌):   {totals['incorrect']} ({totals['incorrect'] / total:.1%})")
+    print(f"Skipped (⏭):     {totals['skipped']} ({totals['skipped'] / total:.1%})")
 
 
-if __name__ == "__main__":
-    if len(sys.argv) != 2:
-        print("Usage: python report_annotation_stats.py <path_to_jsonl>")
+def report_stats(path=None, store_path=DEFAULT_STORE_PATH, tagger_version=None):
+    """the report for the video of a .tok / .jsonl file, or for every annotated video"""
+    with AnnotationStore(store_path) as store:
+        if path is None:
+            rows = store.totals()
+        else:
+            path = Path(path)
+            video, version = file_identity(path, tagger_version) if path.exists() else (path.name, tagger_version)
+            rows = store.totals(video, version)
+    if not rows:
+        print(f"❌ No annotations found{f' for {path}' if path else ''}")
+    for totals in rows:
+        print_totals(totals)
+        print()
+
+
+def report_sample(name, store_path=DEFAULT_STORE_PATH, tagger_version=None, tagger_name=DEFAULT_TAGGER):
+    """corpus accuracy estimated from stratified sample name, with a 95% confidence interval"""
+    tagger_version = tagger_version or make_tagger(tagger_name).version_string()
+    with AnnotationStore(store_path) as store:
+        if name not in store.samples():
+            print(f"❌ No sample called {name!r}")
+            return
+        estimate = store.estimate(name, tagger_version)
+    if estimate is None:
+        print(f"⚠️ Nothing in sample {name!r} judged yet for {tagger_version}")
+        return
+
+    print(f"📊 Sample {name!r} ({tagger_version})")
+    print(f"Judged: {estimate['judged']}/{estimate['sample_size']} lines")
+    print(f"Estimated accuracy: {estimate['accuracy']:.1%} "
+          f"(95% CI {estimate['low']:.1%} - {estimate['high']:.1%})")
+    if estimate["coverage"] < 1:
+        print(f"⚠️ only strata with judgements count: {estimate['coverage']:.1%} of the corpus")
+    for stratum in estimate["strata"]:
+        print(f"   {stratum['stratum']:<40} {stratum['correct']:>4}/{stratum['judged']:<4} "
+              f"{stratum['accuracy']:6.1%}  ({stratum['population']} lines)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Annotation accuracy reports.")
+    parser.add_argument("path", nargs="?", help="Report the video of this .tok / .jsonl file (default: all)")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Annotation store")
+    parser.add_argument("--tagger-version", help="Tagger version to report on")
+    parser.add_argument("--sample", help="Estimate the corpus accuracy from this stratified sample")
+    parser.add_argument("--tagger", choices=sorted(TAGGERS), default=DEFAULT_TAGGER,
+                        help="Tagger the sample was judged on (when no --tagger-version)")
+    args = parser.parse_args()
+
+    if args.sample:
+        report_sample(args.sample, args.store, args.tagger_version, args.tagger)
     else:
-        report_stats(sys.argv[1])
+        report_stats(args.path, args.store, args.tagger_version)
+
 
+if __name__ == "__main__":
+    main()
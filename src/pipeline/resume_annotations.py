@@ -1,53 +1,80 @@
+'''
+carry on judging a .tok / .jsonl file after the last line judged in
+order (by this tool or annotate_output.py; --sample judgements don't
+count). the resume point is one lookup in the annotation store
+(annotation_store.py), and a .tok file is entered right at that line
+instead of read from the top.
+
+python resume_annotations.py ../../tokens/TrueBeauty_ep1.tok
+'''
+
+import argparse
 import json
 from pathlib import Path
 import sys
 
-def annotate_jsonl(input_path, output_path):
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.annotation_store import (
+    AnnotationStore, DEFAULT_STORE_PATH, file_identity, count_lines, entries_after, entry_index,
+)
+
+
+def annotate_jsonl(input_path, output_path=None, store_path=DEFAULT_STORE_PATH, tagger_version=None):
     input_path = Path(input_path)
-    output_path = Path(output_path)
+    video, tagger_version = file_identity(input_path, tagger_version)
 
-    # Load previously annotated lines
-    annotated = {}
-    if output_path.exists():
-        with open(output_path, 'r', encoding='utf-8') as f:
-            for line in f:
-                try:
-                    data = json.loads(line)
-                    annotated[data['index']] = data
-                except json.JSONDecodeError:
-                    continue  # skip malformed lines
+    with AnnotationStore(store_path) as store:
+        store.set_lines(video, tagger_version, count_lines(input_path))
+        last = store.resume_point(video, tagger_version)
+        if last is not None:
+            print(f"Resuming {video} after segment {last}")
 
-    with open(input_path, 'r', encoding='utf-8') as fin, \
-         open(output_path, 'a', encoding='utf-8') as fout:
+        fout = open(output_path, 'a', encoding='utf-8') if output_path else None
+        try:
+            # input is a .jsonl or a .tok file
+            for line_num, data in entries_after(input_path, last):
+                idx = entry_index(data, line_num)
 
-        for line in fin:
-            data = json.loads(line)
-            idx = data['index']
+                print(f"\n--- Segment {idx} ---")
+                print("Original:", data['text'])
+                print("Filtered Tokens:", data['filtered'])
 
-            if idx in annotated:
-                continue  # already annotated
+                print("Is this annotation correct? (y/n): ", end='', flush=True)
+                ans = sys.stdin.readline()
+                if not ans:
+                    break  # end of input: stop here, the next run resumes
+                correct = ans.strip().lower() == 'y'
 
-            print(f"\n--- Segment {idx} ---")
-            print("Original:", data['text'])
-            print("Filtered Tokens:", data['filtered'])
+                print("Optional note: ", end='', flush=True)
+                note = sys.stdin.readline().strip()
 
-            print("Is this annotation correct? (y/n): ", end='', flush=True)
-            ans = sys.stdin.readline().strip().lower()
-            correct = ans == 'y'
+                store.record(video, tagger_version, idx, correct, note, data['text'], data['filtered'],
+                             sequential=True)
+                if fout is not None:
+                    data['correct'] = correct
+                    data['note'] = note
+                    fout.write(json.dumps(data, ensure_ascii=False) + '\n')
+        finally:
+            if fout is not None:
+                fout.close()
 
-            print("Optional note: ", end='', flush=True)
-            note = sys.stdin.readline().strip()
+    print(f"\n✅ Annotation saved to {store_path}")
 
-            data['correct'] = correct
-            data['note'] = note
 
-            fout.write(json.dumps(data, ensure_ascii=False) + '\n')
+def main():
+    parser = argparse.ArgumentParser(description="Resume judging a tagged file where it was left.")
+    parser.add_argument("input", nargs="?", help="Path to input JSONL (or .tok) file")
+    parser.add_argument("--export", type=Path, help="Also append the judgements to this jsonl file")
+    parser.add_argument("--store", type=Path, default=DEFAULT_STORE_PATH, help="Annotation store")
+    parser.add_argument("--tagger-version", help="Tagger version of a jsonl's tags (a .tok knows its own)")
+    args = parser.parse_args()
 
-    print(f"\n✅ Annotation complete. Output saved to {output_path}")
+    input_file = args.input or input("Path to input JSONL (or .tok) file: ").strip()
+    annotate_jsonl(input_file, args.export, args.store, args.tagger_version)
 
 
 if __name__ == "__main__":
-    input_file = input("Path to input JSONL file: ").strip()
-    output_file = input("Path to save annotations: ").strip()
-    annotate_jsonl(input_file, output_file)
-
+    main()
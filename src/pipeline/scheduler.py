@@ -0,0 +1,142 @@
+'''
+overlapped build scheduling: a process pool does the parsing / tagging /
+counting, one writer thread does every database write.
+
+  main thread    hands jobs to the pool, at most max_in_flight at a time
+  pool workers   job -> result (build_database._ingest_srt)
+  writer thread  result -> handle(conn, result), the only user of conn
+
+a job holds one of the max_in_flight slots from the moment it is handed to
+the pool until the writer is done with its result, so finished results
+can never pile up faster than they are written (backpressure: the main
+thread just stops submitting). the writer commits every commit_every
+results, or as soon as nothing else is waiting, so a busy writer batches
+its commits and an idle one never sits on written data.
+
+handle() has to leave the connection as it found it when it raises
+(bulk_load.savepoint), so one bad result never takes the rest of its
+batch down with it.
+
+Ctrl-C (or any error in the main thread) cancels: no more jobs go out, the
+writer finishes the result it is on, commits what it has written and
+stops, the pool is terminated and the exception carries on. every result
+is written whole or not at all, so an interrupted build leaves complete
+videos behind and a rerun picks up the rest. workers should ignore
+SIGINT (ignore_sigint as the pool initializer or inside it) so only the
+main thread sees it.
+'''
+
+import logging
+import queue
+import signal
+import threading
+import traceback
+
+COMMIT_EVERY = 16
+POLL_SECONDS = 0.5
+
+_DONE = object()
+
+
+def ignore_sigint():
+    """for pool workers: leave Ctrl-C to the main process"""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+class Writer(threading.Thread):
+    """the thread that owns conn while the pool runs.
+
+    handle(conn, item) writes one result without committing; the writer
+    commits in batches. errors that escape handle() stop the writer and
+    are raised again in the main thread by check().
+    """
+
+    def __init__(self, conn, handle, commit_every=COMMIT_EVERY, on_done=None):
+        super().__init__(name="db-writer", daemon=True)
+        self.conn = conn
+        self.handle = handle
+        self.commit_every = max(1, commit_every)
+        self.on_done = on_done  # called after every item, written or not
+        self.items = queue.Queue()
+        self.written = 0
+        self.commits = 0
+        self.error = None
+        self._cancelled = threading.Event()
+
+    def put(self, item):
+        self.items.put(item)
+
+    def close(self):
+        """no more items: write what is queued, commit and stop"""
+        self.items.put(_DONE)
+
+    def cancel(self):
+        """finish the current item, commit and stop, dropping whatever is still queued"""
+        self._cancelled.set()
+        self.items.put(_DONE)
+
+    def check(self):
+        if self.error is not None:
+            raise RuntimeError(f"database writer failed:\n{self.error}")
+
+    def run(self):
+        pending = 0
+        try:
+            while True:
+                item = self.items.get()
+                if item is _DONE or self._cancelled.is_set():
+                    break
+                try:
+                    self.handle(self.conn, item)
+                finally:
+                    if self.on_done is not None:
+                        self.on_done()
+                self.written += 1
+                pending += 1
+                if pending >= self.commit_every or self.items.empty():
+                    self.conn.commit()
+                    self.commits += 1
+                    pending = 0
+        except BaseException:
+            self.error = traceback.format_exc()
+        finally:
+            # whatever handle() finished is whole, keep it
+            if self.conn.in_transaction:
+                self.conn.commit()
+                self.commits += 1
+
+
+def run_overlapped(pool, fn, jobs, writer, max_in_flight, on_error):
+    """run fn over jobs on pool and feed every result to writer, in completion order.
+
+    on_error(job, exc) turns a job whose fn raised into an item for the
+    writer. returns once every result is written and committed; on Ctrl-C
+    (or an error) the build is cancelled as described above and the
+    exception is raised again.
+    """
+    slots = threading.BoundedSemaphore(max(1, max_in_flight))
+    writer.on_done = slots.release
+    writer.start()
+    try:
+        for job in jobs:
+            # wait for a free slot, but keep an eye on the writer while doing so
+            while not slots.acquire(timeout=POLL_SECONDS):
+                writer.check()
+            writer.check()
+            pool.apply_async(fn, (job,), callback=writer.put,
+                             error_callback=lambda exc, job=job: writer.put(on_error(job, exc)))
+        pool.close()
+        # every result has reached the writer once all slots are back
+        for _ in range(max(1, max_in_flight)):
+            while not slots.acquire(timeout=POLL_SECONDS):
+                writer.check()
+        writer.close()
+        writer.join()
+        writer.check()
+    except BaseException:
+        if writer.is_alive():
+            logging.warning(" ! stopping: finishing the video being written, dropping the rest")
+            writer.cancel()
+            writer.join()
+        pool.terminate()
+        raise
@@ -1,48 +1,109 @@
-import pysrt
 import json
-from konlpy.tag import Okt
 import sys
 import argparse
 from pathlib import Path
 
-def process_line(text, okt):
-    lemmas = okt.pos(text, stem=True)
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.tag_cache import TagCache
+from pipeline.subtitle_reader import read_subtitles
+from pipeline.taggers import TAGGERS, DEFAULT_TAGGER, DEFAULT_BATCH_SIZE, as_tagger, make_tagger
+
+
+def tagger_version(tagger=None):
+    """what produced the tags: recorded with each build so a tagger change re-ingests"""
+    return as_tagger(tagger).version_string()
+
+
+def open_tag_cache(tagger=None, **kwargs):
+    """tag cache keyed for the backend (name, version, options) that fills it"""
+    tagger = as_tagger(tagger)
+    return TagCache(tagger=tagger.name, version=tagger.version, options=tagger.options, **kwargs)
+
+
+def process_line(text, tagger, cache=None):
+    lemmas = cache.get(text) if cache is not None else None
+    if lemmas is None:
+        lemmas = as_tagger(tagger).tag(text)
+        if cache is not None:
+            cache.put(text, lemmas)
 #    filtered = [word for word, pos in lemmas if pos not in ['Punctuation']]
 #    filtered = [word for word, pos in lemmas if pos in ['Noun', 'Verb', 'Adjective', 'Adverb']]
 #    return lemmas, filtered
     return lemmas, lemmas
 
-def srt_to_jsonl(srt_path, jsonl_path):
+def iter_subtitles(srt_path):
+    """one dict (index, start, end, text) per subtitle, in file order.
+    start / end are in ms; .vtt and .ass files work too (subtitle_reader.py)"""
+    for sub in read_subtitles(srt_path):
+        sub["text"] = sub["text"].strip().replace('\n', ' ')
+        yield sub
+
+
+def tag_subtitles(subs, tagger, cache=None, batch_size=None):
+    """adds "lemmas" and "filtered" to each subtitle dict as it passes through.
+
+    tagger is a backend (pipeline/taggers.py), a backend name or a bare Okt.
+    lines go to it batch_size (default: the backend's) at a time, minus the
+    ones the cache already has.
+    """
+    tagger = as_tagger(tagger)
+    batch_size = batch_size or tagger.batch_size
+    batch = []
+    for sub in subs:
+        batch.append(sub)
+        if len(batch) >= batch_size:
+            yield from _tag_batch(batch, tagger, cache)
+            batch = []
+    if batch:
+        yield from _tag_batch(batch, tagger, cache)
+
+
+def _tag_batch(subs, tagger, cache):
+    tags = [cache.get(sub["text"]) if cache is not None else None for sub in subs]
+    missing = [i for i, lemmas in enumerate(tags) if lemmas is None]
+    if missing:
+        tagged = tagger.tag_lines([subs[i]["text"] for i in missing])
+        for i, lemmas in zip(missing, tagged):
+            tags[i] = lemmas
+            if cache is not None:
+                cache.put(subs[i]["text"], lemmas)
+    for sub, lemmas in zip(subs, tags):
+        sub["lemmas"] = lemmas
+        sub["filtered"] = lemmas
+        yield sub
+
+
+def tee_jsonl(entries, fout):
+    """pass entries through unchanged, writing each one to fout as a json line"""
+    for entry in entries:
+        fout.write(json.dumps(entry, ensure_ascii=False) + '\n')
+        yield entry
+
+
+def srt_to_jsonl(srt_path, jsonl_path, tagger=None, cache=None):
+    """tag every subtitle of srt_path and write one json object per line.
+
+    tagger is a backend or a backend name (default okt); pass in a
+    long-lived one to skip the jvm start / dictionary load (the build
+    workers keep one each), and a TagCache to only tag lines that have
+    not been seen before.
+    """
     srt_path = Path(srt_path)
     jsonl_path = Path(jsonl_path)
-    subs = pysrt.open(str(srt_path))  # pysrt needs str
-
-    subs = pysrt.open(srt_path)
-    okt = Okt()
+    tagger = as_tagger(tagger)
 
     with open(jsonl_path, 'w', encoding='utf-8') as fout:
-        for sub in subs:
-            index = sub.index
-            start = str(sub.start.to_time())
-            end = str(sub.end.to_time())
-            text = sub.text.strip().replace('\n', ' ')
-
-            lemmas, filtered = process_line(text, okt)
-
-            json_obj = {
-                "index": index,
-                "start": start,
-                "end": end,
-                "text": text,
-                "lemmas": lemmas,
-                "filtered": filtered
-            }
-
-            fout.write(json.dumps(json_obj, ensure_ascii=False) + '\n')
+        for _ in tee_jsonl(tag_subtitles(iter_subtitles(srt_path), tagger, cache), fout):
+            pass
 
+    if cache is not None:
+        cache.flush()
     print(f"✅ Processed and saved to {jsonl_path}")
 
-def run_ex():
+def run_ex(tagger=None, cache=None):
   # Example usage
   yt_srt = "../../raw/youtube/BTS_VLOG_RM_미술관.srt"
   yt_json = "../../json/BTS_VLOG_RM_미술관.jsonl"
@@ -50,9 +111,9 @@ def run_ex():
   cp_json = "../../json/Coffee_Prince_ep1.jsonl"
   tb_srt = "../../raw/drama/True_Beuty/ep1.srt"
   tb_json = "../../json/True_Beuty_ep1.jsonl"
-  srt_to_jsonl(yt_srt, yt_json)
-  srt_to_jsonl(cp_srt, cp_json)
-  srt_to_jsonl(tb_srt, tb_json)
+  srt_to_jsonl(yt_srt, yt_json, tagger, cache=cache)
+  srt_to_jsonl(cp_srt, cp_json, tagger, cache=cache)
+  srt_to_jsonl(tb_srt, tb_json, tagger, cache=cache)
 
 
 def main():
@@ -60,8 +121,21 @@ def main():
   parser.add_argument("--build-script", action="store_true", help="Run from build script")
   parser.add_argument("--srt", type=str, help="Path to .srt file")
   parser.add_argument("--json", type=str, help="Output path for .jsonl file")
+  parser.add_argument("--no-cache", action="store_true", help="Tag every line, skip the tag cache")
+  parser.add_argument("--tagger", choices=sorted(TAGGERS), default=DEFAULT_TAGGER,
+                      help="Tagger backend: okt (default) or fast (no jvm, approximate)")
+  parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                      help="Lines per Okt call (1 = one call per line)")
+  parser.add_argument("--verify-batches", action="store_true",
+                      help="Also tag every line on its own and report where batching changed the output")
   args = parser.parse_args()
 
+  if args.tagger == "okt":
+    tagger = make_tagger("okt", batch_size=args.batch_size, verify=args.verify_batches)
+  else:
+    tagger = make_tagger(args.tagger)
+  cache = None if args.no_cache or not tagger.cacheable else open_tag_cache(tagger)
+
   if args.build_script:
 # Resolve only if relative
     srt_path = Path(args.srt)
@@ -73,10 +147,17 @@ def main():
       json_path = (Path(__file__).resolve().parent.parent / json_path).resolve()
 
     print(f"🔧 [BUILD MODE] Converting {srt_path} -> {json_path}")
-    srt_to_jsonl(srt_path, json_path)
+    srt_to_jsonl(srt_path, json_path, tagger, cache=cache)
 
   else:
-    run_ex()
+    run_ex(tagger, cache)
+
+  if cache is not None:
+    cache.close()
+    print(f"🗃️ Tag cache: {cache.hits} hits, {cache.misses} misses")
+  if args.verify_batches:
+    print(f"🔗 batched tags checked on {tagger.stats.get('verified', 0)} lines, "
+          f"{tagger.stats.get('mismatches', 0)} differed")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,373 @@
+'''
+streaming subtitle reader for .srt, .vtt and .ass/.ssa files, used by
+srt_to_json.iter_subtitles in place of pysrt.
+
+read_subtitles(path) yields one dict per cue, in file order:
+  {"index": int or None, "start": ms, "end": ms, "text": str}
+with the timestamps as integer milliseconds and the text lines joined by
+"\\n", as in the file.
+
+the file is read and decoded a chunk at a time and each cue is yielded
+as soon as its block has been parsed, so memory stays bounded whatever
+the size of the file.
+
+- encoding: a BOM wins (utf-8 / utf-16 / utf-32), otherwise utf-8 if the
+  bytes decode as utf-8, otherwise cp949 (a superset of euc-kr, which
+  is what most older Korean subtitle files are in). without a BOM that
+  takes a first pass over the file, chunk by chunk, before parsing
+- srt: parsed the way pysrt does it (blocks split on blank lines, an
+  optional index line, "start --> end [position]", the rest is text,
+  lines right-stripped), so indexes, times and text match pysrt's. blocks
+  pysrt would drop (no timestamp line, bad timestamps) are skipped and
+  counted rather than failing the file
+- vtt: WEBVTT cues; NOTE / STYLE / REGION blocks are skipped, cue settings
+  and <...> tags dropped, the common entities decoded. index is the cue
+  identifier when it is a number, else the cue's position
+- ass/ssa: the Dialogue lines of [Events], in the column order its Format
+  line gives. {\\override} blocks dropped, \\N / \\n become line breaks
+
+python subtitle_reader.py ../../raw                # parse a tree, print counts and timing
+python subtitle_reader.py ../../raw --compare-pysrt
+'''
+
+import argparse
+import codecs
+import html
+import io
+import re
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+SUBTITLE_SUFFIXES = (".srt", ".vtt", ".ass", ".ssa")
+
+BOMS = (
+    (codecs.BOM_UTF32_LE, "utf-32-le"),
+    (codecs.BOM_UTF32_BE, "utf-32-be"),
+    (codecs.BOM_UTF8, "utf-8"),
+    (codecs.BOM_UTF16_LE, "utf-16-le"),
+    (codecs.BOM_UTF16_BE, "utf-16-be"),
+)
+FALLBACK_ENCODINGS = ("utf-8", "cp949")
+READ_SIZE = 1 << 16
+CHUNK_CUES = 256  # srt cues whose timing lines are converted together
+
+_TIME_SEP = re.compile(r"[:.,]")
+
+# the usual srt timing line. lines of exactly this shape (digits anywhere there
+# is a 0, "." allowed for ",") are converted CHUNK_CUES cues at a time with
+# numpy; anything else goes through the pysrt-compatible _srt_timing
+TIMING_TEMPLATE = np.frombuffer(b"00:00:00,000 --> 00:00:00,000", dtype=np.uint8)
+_DIGIT_COLUMNS = TIMING_TEMPLATE == ord("0")
+_SEPARATORS = TIMING_TEMPLATE[~_DIGIT_COLUMNS]
+_COMMA_COLUMNS = _SEPARATORS == ord(",")
+_DIGIT_WEIGHTS = np.array([36000000, 3600000, 600000, 60000, 10000, 1000, 100, 10, 1], dtype=np.int64)
+_LEADING_INT = re.compile(r"^(\d+)")
+_VTT_TAG = re.compile(r"<[^>]*>")
+_ASS_OVERRIDE = re.compile(r"\{[^}]*\}")
+
+
+class SubtitleFile:
+    """the cues of one file. iterate it for the dicts; encoding and
+    skipped (malformed blocks) are filled in once it has been read"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.encoding = None
+        self.skipped = 0
+
+    def __iter__(self):
+        self.encoding, bom_length = detect_encoding(self.path)
+        return self._cues(bom_length)
+
+    def _cues(self, bom_length):
+        with open(self.path, "rb") as raw:
+            raw.seek(bom_length)
+            text = io.TextIOWrapper(raw, encoding=self.encoding, errors="replace")
+            lines = (line.rstrip("\n") for line in text)
+            suffix = self.path.suffix.lower()
+            if suffix == ".vtt":
+                yield from self._vtt(lines)
+            elif suffix in (".ass", ".ssa"):
+                yield from self._ass(lines)
+            else:
+                yield from self._srt(lines)
+
+    def _srt(self, lines):
+        cues = []
+        for block in _blocks(lines):
+            cue = _srt_cue(block)
+            if cue is None:
+                self.skipped += 1
+                continue
+            cues.append(cue)
+            if len(cues) == CHUNK_CUES:
+                yield from self._srt_timed(cues)
+                cues = []
+        yield from self._srt_timed(cues)
+
+    def _srt_timed(self, cues):
+        # timestamps of the chunk at once; lines not in the usual fixed format get -1
+        times = _fixed_width_times([timing for _, timing, _ in cues]).tolist()
+        for (index, timing, text), (start_ms, end_ms) in zip(cues, times):
+            if start_ms < 0:
+                start_ms, end_ms = _srt_timing(timing)
+                if start_ms is None:
+                    self.skipped += 1
+                    continue
+            yield {"index": index, "start": start_ms, "end": end_ms, "text": text}
+
+    def _vtt(self, lines):
+        position = 0
+        for block in _blocks(lines):
+            first = block[0].strip()
+            if first.startswith(("WEBVTT", "NOTE", "STYLE", "REGION")) and "-->" not in first:
+                continue
+            identifier = None
+            if "-->" not in block[0]:
+                identifier, block = block[0].strip(), block[1:]
+            if not block or "-->" not in block[0]:
+                self.skipped += 1
+                continue
+            start, _, rest = block[0].partition("-->")
+            start_ms = _vtt_time(start.strip())
+            end_ms = _vtt_time(rest.strip().split(None, 1)[0] if rest.strip() else "")
+            if start_ms is None or end_ms is None:
+                self.skipped += 1
+                continue
+            position += 1
+            text = [html.unescape(_VTT_TAG.sub("", line.rstrip())) for line in block[1:]]
+            yield {
+                "index": int(identifier) if identifier and identifier.isdigit() else position,
+                "start": start_ms,
+                "end": end_ms,
+                "text": "\n".join(text),
+            }
+
+    def _ass(self, lines):
+        in_events = False
+        columns = None
+        position = 0
+        for line in lines:
+            line = line.strip()
+            if line.startswith("["):
+                in_events = line.lower() == "[events]"
+                continue
+            if not in_events:
+                continue
+            kind, _, value = line.partition(":")
+            if kind == "Format":
+                columns = [c.strip().lower() for c in value.split(",")]
+            elif kind == "Dialogue" and columns:
+                fields = dict(zip(columns, (f.strip() for f in value.split(",", len(columns) - 1))))
+                start_ms = _ass_time(fields.get("start", ""))
+                end_ms = _ass_time(fields.get("end", ""))
+                if start_ms is None or end_ms is None or "text" not in fields:
+                    self.skipped += 1
+                    continue
+                position += 1
+                body = _ASS_OVERRIDE.sub("", fields["text"])
+                body = body.replace("\\N", "\n").replace("\\n", "\n").replace("\\h", " ")
+                yield {"index": position, "start": start_ms, "end": end_ms, "text": body}
+
+
+def read_subtitles(path):
+    """the cues of a .srt / .vtt / .ass file as dicts (see the module docstring)"""
+    return iter(SubtitleFile(path))
+
+
+def detect_encoding(path):
+    """(encoding, length of its BOM) of a subtitle file"""
+    with open(path, "rb") as f:
+        head = f.read(4)
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, len(bom)
+    for encoding in FALLBACK_ENCODINGS:
+        if _decodes(path, encoding):
+            return encoding, 0
+    return "utf-8", 0  # undecodable bytes become U+FFFD
+
+
+def _decodes(path, encoding):
+    """whether the whole file decodes as encoding, checked a chunk at a time"""
+    decoder = codecs.getincrementaldecoder(encoding)()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(READ_SIZE), b""):
+                decoder.decode(chunk)
+        decoder.decode(b"", final=True)
+    except UnicodeDecodeError:
+        return False
+    return True
+
+
+def _blocks(lines):
+    """runs of non-blank lines"""
+    block = []
+    for line in lines:
+        if line.strip():
+            block.append(line)
+        elif block:
+            yield block
+            block = []
+    if block:
+        yield block
+
+
+def _parse_int(digits):
+    try:
+        return int(digits)
+    except ValueError:
+        match = _LEADING_INT.match(digits)
+        return int(match.group()) if match else 0
+
+
+def _srt_time(value):
+    """ms from "HH:MM:SS,mmm" (pysrt's leniency: any of : . , separate, junk after digits ignored)"""
+    if not value:
+        return 0
+    parts = _TIME_SEP.split(value)
+    if len(parts) != 4:
+        return None
+    hours, minutes, seconds, ms = (_parse_int(p) for p in parts)
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + ms
+
+
+def _srt_timing(line):
+    """(start_ms, end_ms) of a "start --> end [position]" line, (None, None) if pysrt would reject it"""
+    timestamps = line.split("-->")
+    if len(timestamps) != 2:
+        return None, None
+    start, end = timestamps[0].strip(), timestamps[1].lstrip().split(" ", 1)[0].strip()
+    start_ms, end_ms = _srt_time(start), _srt_time(end)
+    if start_ms is None or end_ms is None:
+        return None, None
+    return start_ms, end_ms
+
+
+def _fixed_width_times(timings):
+    """(n, 2) start / end ms of the timing lines, -1 for those not in TIMING_TEMPLATE's shape"""
+    times = np.full((len(timings), 2), -1, dtype=np.int64)
+    width = len(TIMING_TEMPLATE)
+    rows = [i for i, timing in enumerate(timings) if len(timing) == width]
+    if not rows:
+        return times
+    # non-ascii characters become "?" (one byte each) and fail the checks below
+    chars = np.frombuffer("".join(timings[i] for i in rows).encode("ascii", "replace"),
+                          dtype=np.uint8).reshape(-1, width)
+    digits = chars[:, _DIGIT_COLUMNS].astype(np.int64) - ord("0")
+    separators = chars[:, ~_DIGIT_COLUMNS]
+    ok = ((digits >= 0) & (digits <= 9)).all(axis=1)
+    ok &= ((separators == _SEPARATORS) | (_COMMA_COLUMNS & (separators == ord(".")))).all(axis=1)
+    ms = digits.reshape(-1, 2, len(_DIGIT_WEIGHTS)) @ _DIGIT_WEIGHTS
+    times[np.asarray(rows)[ok]] = ms[ok]
+    return times
+
+
+def _srt_cue(block):
+    """(index, timing line, text) of a block, None if it has no timing line"""
+    if len(block) < 2:
+        return None
+    lines = [line.rstrip() for line in block]
+    index = None
+    if "-->" not in lines[0]:
+        index = lines.pop(0)
+        if "-->" not in lines[0]:
+            return None
+    try:
+        index = int(index)
+    except (TypeError, ValueError):
+        index = None
+    return index, lines[0], "\n".join(lines[1:])
+
+
+def _vtt_time(value):
+    """ms from "HH:MM:SS.mmm" or "MM:SS.mmm" """
+    seconds, _, ms = value.partition(".")
+    parts = seconds.split(":")
+    if not 2 <= len(parts) <= 3 or not all(p.isdigit() for p in parts) or not ms[:3].isdigit():
+        return None
+    if len(parts) == 2:
+        parts.insert(0, "0")
+    hours, minutes, seconds = (int(p) for p in parts)
+    return ((hours * 60 + minutes) * 60 + seconds) * 1000 + int(ms[:3].ljust(3, "0"))
+
+
+def _ass_time(value):
+    """ms from "H:MM:SS.cc" """
+    parts = value.split(":")
+    if len(parts) != 3:
+        return None
+    try:
+        hours, minutes = int(parts[0]), int(parts[1])
+        seconds = float(parts[2])
+    except ValueError:
+        return None
+    return (hours * 60 + minutes) * 60000 + round(seconds * 1000)
+
+
+def find_subtitle_files(root):
+    return sorted(p for p in Path(root).rglob("*") if p.suffix.lower() in SUBTITLE_SUFFIXES and p.is_file())
+
+
+def _compare_pysrt(path, cues, encoding):
+    """differences from pysrt on the same srt, as printable strings.
+    pysrt finds BOMs and utf-8 itself, it is only told about the fallbacks (cp949)"""
+    import pysrt
+    if encoding in {name for _, name in BOMS}:
+        encoding = None
+    theirs = [
+        {"index": sub.index, "start": sub.start.ordinal, "end": sub.end.ordinal, "text": sub.text}
+        for sub in pysrt.open(str(path), encoding=encoding)
+    ]
+    problems = []
+    if len(theirs) != len(cues):
+        problems.append(f"{len(cues)} cues, pysrt has {len(theirs)}")
+    for ours, other in zip(cues, theirs):
+        if ours != other:
+            problems.append(f"{ours} != {other}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse every subtitle file under a directory.")
+    parser.add_argument("root", nargs="?", default="../../raw", help="Directory to scan (default ../../raw)")
+    parser.add_argument("--compare-pysrt", action="store_true", help="Check .srt results against pysrt")
+    args = parser.parse_args()
+
+    files = find_subtitle_files(args.root)
+    cue_count = skipped = 0
+    encodings = {}
+    t0 = time.perf_counter()
+    parsed = []
+    for path in files:
+        subtitles = SubtitleFile(path)
+        cues = list(subtitles)
+        parsed.append((path, cues, subtitles.encoding))
+        cue_count += len(cues)
+        skipped += subtitles.skipped
+        encodings[subtitles.encoding] = encodings.get(subtitles.encoding, 0) + 1
+    elapsed = time.perf_counter() - t0
+    print(f"✅ {len(files)} files, {cue_count} cues, {skipped} malformed block(s) skipped "
+          f"in {elapsed * 1000:.0f} ms ({encodings})")
+
+    if args.compare_pysrt:
+        t0 = time.perf_counter()
+        mismatched = 0
+        for path, cues, encoding in parsed:
+            if path.suffix.lower() != ".srt":
+                continue
+            problems = _compare_pysrt(path, cues, encoding)
+            if problems:
+                mismatched += 1
+                print(f"❌ {path}: {problems[0]}")
+        print(f"pysrt: {(time.perf_counter() - t0) * 1000:.0f} ms, {mismatched} file(s) differ")
+        if mismatched:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+'''
+disk-backed cache of tagger output, so a subtitle line we have already
+tagged once never goes through the jvm again.
+
+lines are keyed on a sha1 of the normalized text plus the tagger name,
+version and options, so upgrading konlpy or changing stem=True gives a
+fresh set of keys instead of stale tags. the cache is a small sqlite file
+holding at most max_entries rows; when it grows past that the least
+recently used rows are dropped.
+
+several build workers can share one cache file: reads go straight to the
+db, writes and "last used" bumps are buffered and flushed in one
+transaction per file.
+
+usage:
+    cache = TagCache(tagger="Okt", version="0.6.0", options="stem=True")
+    tags = cache.get(text)
+    if tags is None:
+        tags = okt.pos(text, stem=True)
+        cache.put(text, tags)
+    ...
+    cache.close()
+    print(cache.hits, cache.misses)
+'''
+
+import hashlib
+import json
+import re
+import sqlite3
+import time
+import unicodedata
+from pathlib import Path
+
+DEFAULT_CACHE_PATH = Path(__file__).resolve().parent.parent.parent / "cache" / "tag_cache.db"
+DEFAULT_MAX_ENTRIES = 500_000
+FLUSH_EVERY = 1000
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text):
+    """NFC + collapsed whitespace, so trivially different copies of a line share a key"""
+    return _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+
+
+class TagCache:
+    def __init__(self, path=DEFAULT_CACHE_PATH, tagger="Okt", version="", options="",
+                 max_entries=DEFAULT_MAX_ENTRIES):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_entries = max_entries
+        self._prefix = f"{tagger}\x1f{version}\x1f{options}\x1f"
+
+        self.hits = 0
+        self.misses = 0
+        self._pending = {}    # key -> json tags, not written yet
+        self._touched = set()  # keys hit since the last flush
+
+        self.conn = sqlite3.connect(self.path, timeout=60)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS TagCache (
+                key BLOB PRIMARY KEY,
+                tags TEXT NOT NULL,
+                last_used REAL NOT NULL
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS idx_tagcache_last_used ON TagCache(last_used);
+        """)
+
+    def key(self, text):
+        return hashlib.sha1((self._prefix + normalize_text(text)).encode("utf-8")).digest()
+
+    def get(self, text):
+        """cached tags for text as a list of [word, pos] pairs, or None"""
+        key = self.key(text)
+        tags = self._pending.get(key)
+        if tags is None:
+            row = self.conn.execute("SELECT tags FROM TagCache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            tags = row[0]
+            self._touched.add(key)
+        self.hits += 1
+        return json.loads(tags)
+
+    def put(self, text, tags):
+        self._pending[self.key(text)] = json.dumps(tags, ensure_ascii=False)
+        if len(self._pending) >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self):
+        """write buffered entries, bump last_used of hits, then evict down to max_entries"""
+        if not self._pending and not self._touched:
+            return
+        now = time.time()
+        with self.conn:
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO TagCache (key, tags, last_used) VALUES (?, ?, ?)",
+                [(key, tags, now) for key, tags in self._pending.items()])
+            self.conn.executemany(
+                "UPDATE TagCache SET last_used = ? WHERE key = ?",
+                [(now, key) for key in self._touched])
+            self._evict()
+        self._pending.clear()
+        self._touched.clear()
+
+    def _evict(self):
+        (count,) = self.conn.execute("SELECT COUNT(*) FROM TagCache").fetchone()
+        excess = count - self.max_entries
+        if excess > 0:
+            self.conn.execute("""
+                DELETE FROM TagCache WHERE key IN (
+                    SELECT key FROM TagCache ORDER BY last_used ASC LIMIT ?
+                )
+            """, (excess,))
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+    def close(self):
+        self.flush()
+        self.conn.close()
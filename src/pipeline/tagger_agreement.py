@@ -0,0 +1,202 @@
+'''
+how close a tagger backend gets to Okt, line by line.
+
+the reference is the Okt output already stored in the files: annotation
+files (annotation_store.py --export, or old *_annotated.jsonl) and the build's .tok /
+jsonl side outputs all carry each line's text and its "filtered" tags.
+every line is tagged again with --tagger (default fast) and compared:
+
+  tokens    precision / recall / F1 over the (word, pos_tag) pairs of each line
+  lexicon   the same, but only over pairs that are in the TOPIK lexicon:
+            the ones that end up in WordFrequency
+  lines     share of lines tagged exactly like the reference
+  per pos   recall of the reference pairs by pos tag
+
+in annotation files the lines a person marked correct (or satisfactory)
+are reported on their own as well. --retag tags the text with Okt again
+instead of trusting the stored tags (needs the jvm).
+
+python tagger_agreement.py ../../annotations/*_annotated.jsonl
+python tagger_agreement.py ../../tokens/*.tok --limit 5000 --show 10
+python tagger_agreement.py ../../tokens/TrueBeauty_ep1.tok --retag
+'''
+
+import argparse
+import json
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from pipeline.taggers import TAGGERS, make_tagger
+from pipeline.token_store import iter_entries
+from database.lexicon_snapshot import ensure_snapshot, load_snapshot
+
+
+class Agreement:
+    """running precision / recall of one tagger's pairs against the reference"""
+
+    def __init__(self):
+        self.lines = 0
+        self.exact = 0
+        self.common = 0
+        self.predicted = 0
+        self.reference = 0
+        self.pos_common = Counter()
+        self.pos_reference = Counter()
+
+    def add(self, predicted, reference):
+        predicted, reference = Counter(predicted), Counter(reference)
+        common = predicted & reference
+        self.lines += 1
+        self.exact += predicted == reference
+        self.common += sum(common.values())
+        self.predicted += sum(predicted.values())
+        self.reference += sum(reference.values())
+        for (_, pos_tag), n in reference.items():
+            self.pos_reference[pos_tag] += n
+        for (_, pos_tag), n in common.items():
+            self.pos_common[pos_tag] += n
+
+    @property
+    def precision(self):
+        return self.common / self.predicted if self.predicted else 0.0
+
+    @property
+    def recall(self):
+        return self.common / self.reference if self.reference else 0.0
+
+    @property
+    def f1(self):
+        p, r = self.precision, self.recall
+        return 2 * p * r / (p + r) if p + r else 0.0
+
+    def summary(self):
+        return {
+            "lines": self.lines,
+            "exact_lines": self.exact / self.lines if self.lines else 0.0,
+            "precision": self.precision,
+            "recall": self.recall,
+            "f1": self.f1,
+        }
+
+
+def is_verified(entry):
+    """True / False when a person judged the line's reference tags, None when nobody did"""
+    for field in ("correct", "satisfactory"):
+        if field in entry:
+            return bool(entry[field])
+    return None
+
+
+def read_reference(paths, limit=None):
+    """(text, [(word, pos_tag)], verified) for every line with text in paths"""
+    n = 0
+    for path in paths:
+        for entry in iter_entries(path):
+            text = entry.get("text")
+            if not text or entry.get("filtered") is None:
+                continue
+            yield text, [tuple(pair) for pair in entry["filtered"]], is_verified(entry)
+            n += 1
+            if limit and n >= limit:
+                return
+
+
+def compare(lines, tagger, reference_tagger=None, lexicon=None, batch_size=256, show=0):
+    """Agreement over all lines, over the verified ones and over lexicon words, plus timings"""
+    results = {"all": Agreement(), "verified": Agreement(), "lexicon": Agreement()}
+    seconds = {"tagger": 0.0, "reference": 0.0}
+    shown = 0
+    batch = []
+
+    def flush():
+        nonlocal shown
+        texts = [text for text, _, _ in batch]
+        t0 = time.perf_counter()
+        predicted = tagger.tag_lines(texts)
+        seconds["tagger"] += time.perf_counter() - t0
+        references = [reference for _, reference, _ in batch]
+        if reference_tagger is not None:
+            t0 = time.perf_counter()
+            references = [[tuple(pair) for pair in tags] for tags in reference_tagger.tag_lines(texts)]
+            seconds["reference"] += time.perf_counter() - t0
+        for (text, _, verified), tags, reference in zip(batch, predicted, references):
+            tags = [tuple(pair) for pair in tags]
+            results["all"].add(tags, reference)
+            if verified:
+                results["verified"].add(tags, reference)
+            if lexicon is not None:
+                results["lexicon"].add([pair for pair in tags if pair in lexicon],
+                                       [pair for pair in reference if pair in lexicon])
+            if shown < show and Counter(tags) != Counter(reference):
+                shown += 1
+                print(f"--- {text}\n  reference: {reference}\n  {tagger.name:>9}: {tags}")
+        batch.clear()
+
+    for line in lines:
+        batch.append(line)
+        if len(batch) >= batch_size:
+            flush()
+    if batch:
+        flush()
+    return results, seconds
+
+
+def topik_lexicon():
+    """the lexicon from the compiled snapshot of the csv, no database needed"""
+    return load_snapshot(ensure_snapshot()).lexicon()
+
+
+def print_results(results, seconds, tagger_name):
+    for name in ("all", "verified", "lexicon"):
+        agreement = results[name]
+        if not agreement.lines:
+            continue
+        s = agreement.summary()
+        print(f"{name:<9} {s['lines']:>7} lines  exact {s['exact_lines']:6.1%}  "
+              f"precision {s['precision']:6.1%}  recall {s['recall']:6.1%}  F1 {s['f1']:6.1%}")
+    agreement = results["all"]
+    print("recall by pos tag:")
+    for pos_tag, n in agreement.pos_reference.most_common(12):
+        print(f"  {pos_tag:<15} {agreement.pos_common[pos_tag] / n:6.1%}  ({n} tokens)")
+    lines = agreement.lines
+    for name, elapsed in seconds.items():
+        if elapsed:
+            label = tagger_name if name == "tagger" else "okt (retag)"
+            print(f"⏱️ {label}: {elapsed:.2f}s, {lines / elapsed:,.0f} lines/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare a tagger backend's output to the stored Okt tags.")
+    parser.add_argument("files", nargs="+", help="Annotation jsonl, .tok or .jsonl files with text and tags")
+    parser.add_argument("--tagger", choices=sorted(TAGGERS), default="fast", help="Backend to compare (default fast)")
+    parser.add_argument("--retag", action="store_true", help="Tag the text with Okt again as the reference")
+    parser.add_argument("--limit", type=int, help="Only the first N lines")
+    parser.add_argument("--show", type=int, default=0, help="Print the first N lines that disagree")
+    parser.add_argument("--json", action="store_true", help="Print the numbers as JSON")
+    args = parser.parse_args()
+
+    tagger = make_tagger(args.tagger)
+    tagger.warm_up()
+    reference_tagger = None
+    if args.retag:
+        reference_tagger = make_tagger("okt")
+        reference_tagger.warm_up()
+
+    lines = read_reference(args.files, args.limit)
+    results, seconds = compare(lines, tagger, reference_tagger, topik_lexicon(), show=args.show)
+    if args.json:
+        summary = {name: agreement.summary() for name, agreement in results.items()}
+        summary["seconds"] = seconds
+        print(json.dumps(summary, indent=2))
+    else:
+        print_results(results, seconds, args.tagger)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,583 @@
+'''
+tagger backends: what turns subtitle text into (word, pos_tag) pairs.
+
+every backend has a name, version and options (together they key the
+tag cache and the build manifest, so switching backends re-tags instead
+of mixing outputs) and one method, tag_lines(texts), that tags a batch of
+lines at once. srt_to_json.py and build_database.py pick one by name
+(--tagger):
+
+  okt    konlpy's Okt with stem=True, the reference. needs a jvm
+  fast   LexiconTagger: pure python, no jvm. a longest-match trie over
+         the TOPIK words in cleaned_topik.csv (predicates under their
+         conjugated stems too) plus rules that strip particles and verb
+         endings. approximate, for quick corpus scans; tagger_agreement.py
+         measures how close it gets to Okt.
+
+tags come out the way Okt gives them with stem=True: predicates as their
+dictionary form (먹었어요 -> 먹다/Verb), noun + 하다 split in two
+(공부했어요 -> 공부/Noun 하다/Verb), particles as one Josa token.
+
+Okt is called with many lines at once (OktTagger, --tag-batch-size)
+rather than once per line; running this file checks on real subtitles
+that batching changes nothing.
+
+    tagger = make_tagger("fast")
+    tagger.tag_lines(["학교에서 공부했어요"])
+    # [[('학교', 'Noun'), ('에서', 'Josa'), ('공부', 'Noun'), ('하다', 'Verb')]]
+
+python taggers.py ../../raw --batch-size 64 --limit 5000
+'''
+
+import argparse
+import hashlib
+import logging
+import re
+import time
+import sys
+from functools import lru_cache
+from pathlib import Path
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.insert_words import read_words, CLEANED_CSV_PATH
+from pipeline.hangul import INITIALS, is_syllable, decompose, final, medial, with_final, with_medial
+
+DEFAULT_TAGGER = "okt"
+
+# lines per tag_lines() call (and per okt.pos() call in OktTagger), and what goes between them
+DEFAULT_BATCH_SIZE = 64
+BATCH_DELIMITER = "\u241e"  # ␞, symbol for record separator
+DELIMITER_TAG = (BATCH_DELIMITER, "Foreign")
+
+
+class Tagger:
+    """a tagger backend. subclasses set name / options and implement tag_lines"""
+
+    name = None
+    options = ""
+    cacheable = True  # worth looking lines up in the tag cache before tagging them
+    batch_size = DEFAULT_BATCH_SIZE  # lines tag_subtitles hands over per tag_lines() call
+    stats = {}  # running counters a backend wants reported (calls, fallbacks, ...)
+
+    @property
+    def version(self):
+        return ""
+
+    def version_string(self):
+        """name, version and options in one string, as recorded in the build manifest"""
+        return " ".join(part for part in (self.name, self.version, self.options) if part)
+
+    def tag_lines(self, texts):
+        """[[(word, pos_tag), ...] for each text]"""
+        raise NotImplementedError
+
+    def tag(self, text):
+        return self.tag_lines([text])[0]
+
+    def warm_up(self):
+        """load whatever the first call would (dictionaries, the jvm)"""
+        self.tag_lines(["안녕하세요"])
+
+
+class OktTagger(Tagger):
+    """Okt, batch_size lines per call into the jvm.
+
+    every okt.pos() call is a python -> jpype -> java round trip with its
+    own string conversions, so tag_lines joins batch_size lines into one
+    text with BATCH_DELIMITER between them, tags that once and cuts the
+    result back into lines at the delimiter tokens. Okt tags the lone ␞
+    as its own Foreign token and never merges it with a neighbour, and
+    its tags don't reach across it, so the output is the same as tagging
+    line by line. lines that contain the delimiter themselves are tagged
+    alone, and a batch that doesn't split back into as many lines as went
+    in is redone line by line (counted in stats["fallbacks"]).
+
+    verify=True tags every line on its own as well, keeps that result and
+    counts the lines where the batched one differed (stats["mismatches"]).
+    batch_size=1 turns batching off.
+    """
+
+    name = "Okt"
+    options = "stem=True"
+
+    def __init__(self, okt=None, batch_size=DEFAULT_BATCH_SIZE, verify=False):
+        self._okt = okt
+        self.batch_size = max(1, batch_size)
+        self.verify = verify
+        self.stats = {"calls": 0, "lines": 0, "fallbacks": 0, "verified": 0, "mismatches": 0}
+
+    @property
+    def version(self):
+        import konlpy
+        return konlpy.__version__
+
+    @property
+    def okt(self):
+        if self._okt is None:
+            from konlpy.tag import Okt
+            self._okt = Okt()
+        return self._okt
+
+    def _pos(self, text):
+        self.stats["calls"] += 1
+        return self.okt.pos(text, stem=True)
+
+    def tag_lines(self, texts):
+        self.stats["lines"] += len(texts)
+        if self.batch_size == 1:
+            return [self._pos(text) for text in texts]
+        tags = []
+        for i in range(0, len(texts), self.batch_size):
+            tags.extend(self._tag_batch(texts[i:i + self.batch_size]))
+        return tags
+
+    def _tag_batch(self, texts):
+        tags = [None] * len(texts)
+        joined = [i for i, text in enumerate(texts) if BATCH_DELIMITER not in text]
+        if len(joined) > 1:
+            parts = split_batch(self._pos(f" {BATCH_DELIMITER} ".join(texts[i] for i in joined)))
+            if len(parts) == len(joined):
+                for i, part in zip(joined, parts):
+                    tags[i] = part
+            else:
+                self.stats["fallbacks"] += 1
+        for i, text in enumerate(texts):
+            if tags[i] is None:
+                tags[i] = self._pos(text)
+            elif self.verify:
+                single = self._pos(text)
+                self.stats["verified"] += 1
+                if single != tags[i]:
+                    self.stats["mismatches"] += 1
+                    logging.warning(f" ! batched Okt tags differ for {text!r}:\n   {tags[i]}\n   {single}")
+                    tags[i] = single
+        return tags
+
+
+def split_batch(tags):
+    """the tags of a batch of lines joined with BATCH_DELIMITER, cut back into one list per line"""
+    lines = [[]]
+    for pair in tags:
+        if pair == DELIMITER_TAG:
+            lines.append([])
+        else:
+            lines[-1].append(pair)
+    return lines
+
+
+# ---------------------------------------------------------------- fast mode
+
+# bump when the rules below change: it is part of the version, so cached /
+# manifest entries from older rules are not reused
+FAST_RULES_VERSION = "1"
+
+PREDICATES = {"Verb", "Adjective"}
+# when a surface is in the lexicon under several nominal tags, Okt mostly says Noun
+NOMINAL_PRIORITY = {"Noun": 0, "Adverb": 1, "Determiner": 2, "Exclamation": 3}
+
+JOSA = (
+    "이 가 을 를 은 는 의 에 에서 에게 에게서 한테 한테서 께 께서 로 으로 와 과 랑 이랑 하고 "
+    "도 만 까지 부터 보다 처럼 같이 이나 나 요 밖에 마다 조차 라도 이라도 든지 이든지 "
+    "이야 야 이에요 예요 이고 이지 인데 이라 라 이라고 라고 이라서 라서 이었 였 이니까 니까 "
+    "이면 면 이죠 죠 이네 네 이랑 이며 며 인 인지 이잖아 잖아 이거든 거든 이래 래 이냐 냐 이니 니"
+).split()
+# the copula forms Okt tags as 이다/Adjective rather than Josa
+COPULA = ("입니다", "입니까", "이다", "이었다", "였다", "입니다만")
+ENDINGS = (
+    "요 어 아 여 었 았 였 겠 시 셔 셨 세 신 실 십 고 지 죠 네 다 는 은 을 면 으면 서 니 니까 "
+    "으니까 까 데 는데 은데 게 기 음 도 만 나 냐 자 야 라 래 려 려고 러 며 으며 던 든 거 걸 건 "
+    "께 습 니다 습니다 읍 세요 으세요 에요 예요 잖 잖아 군 구나 구요 구 더 더라 냬 냐고 다고 "
+    "라고 자고 대 대요 단 란 잔 죠 지요 는지 은지 을지 ㄴ지 던데 을까 까요 래요 게요 거든 거든요 "
+    "어서 아서 어도 아도 어야 아야 으러 으려고 으면서 면서 므로 으므로 도록 듯 듯이 던가 는가 은가 "
+    "소 오 오니 사오니 옵니다 압니다 랍니다 답니다 냅니다 야지 어야지 아야지 있 다가 고서 자마자"
+).split()
+
+BUILTIN_PREDICATES = (
+    ("하다", "Verb"), ("되다", "Verb"), ("있다", "Adjective"), ("없다", "Adjective"),
+    ("싶다", "Verb"), ("않다", "Verb"), ("주다", "Verb"), ("보다", "Verb"),
+)
+
+# bound nouns Okt gives on their own that the csv only has inside longer words
+BUILTIN_NOUNS = ("때문", "그다음", "이건", "그건", "저건", "이게", "그게", "뭘", "건", "게")
+
+# particles that never come straight after a plain stem: 배가 is 배 가, not 배다
+NOT_AFTER_STEM = frozenset("서 요 가 이 도 만 에 의 를 와 과 로 야 여 랑 께 한테 에서 에게 처럼 까지 부터 보다".split())
+
+_PIECES = frozenset(JOSA) | frozenset(ENDINGS)
+_LONGEST_PIECE = max(map(len, _PIECES))
+_JOSA_SET = frozenset(JOSA)
+
+_TOKEN = re.compile(
+    r"(?P<hangul>[가-힣]+)"
+    r"|(?P<jamo>[ㄱ-ㅎㅏ-ㅣ]+)"
+    r"|(?P<number>\d[\d.,]*(?:[가-힣](?![가-힣]))?)"
+    r"|(?P<alpha>[A-Za-z]+)"
+    r"|(?P<punct>[^\w\s]+)"
+    r"|(?P<foreign>[^\W\d_]+)"
+)
+_RUN_TAGS = {"jamo": "KoreanParticle", "number": "Number", "alpha": "Alpha", "punct": "Punctuation",
+             "foreign": "Foreign"}
+
+
+@lru_cache(maxsize=65536)
+def _is_chain(text):
+    """text is a run of particles / endings, e.g. 었어요, 에서는, 으니까요"""
+    if not text:
+        return True
+    for n in range(min(len(text), _LONGEST_PIECE), 0, -1):
+        if text[:n] in _PIECES and _is_chain(text[n:]):
+            return True
+    return False
+
+
+@lru_cache(maxsize=65536)
+def _is_stem_chain(text):
+    """a chain that can start right after a plain stem (먹-었어요, not 먹-요)"""
+    return any(text[:n] in _PIECES and text[:n] not in NOT_AFTER_STEM and _is_chain(text[n:])
+               for n in range(min(len(text), _LONGEST_PIECE), 0, -1))
+
+
+def _infinitive(stem):
+    """stem + 아/어, contracted the way it is written (가 -> 가, 보 -> 봐, 모르 -> 몰라), or None
+    when the 아/어 stays its own syllable (먹 -> 먹어)"""
+    last = stem[-1]
+    if stem.endswith("하"):
+        return stem[:-1] + "해"
+    fin = final(last)
+    if fin:
+        return None
+    vowel = medial(last)
+    if vowel in "ㅏㅓㅐㅔㅕㅒㅖ":
+        return stem
+    contracted = {"ㅗ": "ㅘ", "ㅜ": "ㅝ", "ㅣ": "ㅕ", "ㅚ": "ㅙ"}.get(vowel)
+    if contracted:
+        return stem[:-1] + with_medial(last, contracted)
+    if vowel == "ㅡ":
+        bright = len(stem) > 1 and is_syllable(stem[-2]) and medial(stem[-2]) in "ㅏㅗ"
+        if last == "르" and len(stem) > 1:
+            # 르 irregular: 모르 -> 몰라, 부르 -> 불러
+            return stem[:-2] + with_final(stem[-2], "ㄹ") + ("라" if bright else "러")
+        return stem[:-1] + with_medial(last, "ㅏ" if bright else "ㅓ")
+    return None
+
+
+# what has to follow a stem variant (see _fits)
+FREE = None       # a full form: stands alone or takes more endings (가, 갔, 먹어)
+ENDING = "ending"   # the plain stem: needs an ending (먹-, 가-)
+VOWEL = "vowel"     # an irregular stem that only shows up before 어 / 아 / 으 (들-어, 지-어)
+NBS = "nbs"         # a ㄹ stem that lost its ㄹ before ㄴ / ㅂ / ㅅ / 오 (사-는, 사-세요)
+
+
+def stem_variants(lemma, pos):
+    """{surface: what must follow it} for the written forms a predicate's stem takes"""
+    stem = lemma[:-1]
+    if not stem:
+        return {}
+    last = stem[-1]
+    variants = {stem: ENDING}
+
+    def add(surface, need=FREE):
+        if surface and surface not in variants:
+            variants[surface] = need
+
+    fin = final(last)
+    if not fin:
+        # attached ㄴ / ㄹ / ㅂ: 간, 갈, 갑니다
+        for jamo in "ㄴㄹㅂ":
+            add(stem[:-1] + with_final(last, jamo))
+    elif fin == "ㄹ":
+        # ㄹ drops before ㄴ / ㅂ / ㅅ: 사는, 산다, 삽니다, 사세요
+        add(stem[:-1] + with_final(last, ""), NBS)
+        add(stem[:-1] + with_final(last, "ㄴ"))
+        add(stem[:-1] + with_final(last, "ㅂ"))
+    elif fin == "ㅂ":
+        # ㅂ irregular: 춥 -> 추워, 추운, 추우면; 돕 -> 도와
+        opened = stem[:-1] + with_final(last, "")
+        add(opened + "우", ENDING)
+        add(opened + "운")
+        add(opened + "울")
+        add(opened + ("와" if medial(last) == "ㅗ" else "워"))
+        add(opened + ("왔" if medial(last) == "ㅗ" else "웠"))
+    elif fin == "ㄷ" and pos == "Verb":
+        # ㄷ irregular: 듣 -> 들어, 걷 -> 걸어
+        add(stem[:-1] + with_final(last, "ㄹ"), VOWEL)
+    elif fin == "ㅅ":
+        # ㅅ irregular: 낫 -> 나아, 짓 -> 지어
+        add(stem[:-1] + with_final(last, ""), VOWEL)
+    elif fin == "ㅎ" and pos == "Adjective" and stem != "좋":
+        # ㅎ irregular: 그렇 -> 그래, 그런, 그럴, 그러면; 하얗 -> 하얘
+        add(stem[:-1] + with_final(last, "ㄴ"))
+        add(stem[:-1] + with_final(last, "ㄹ"))
+        add(stem[:-1] + with_final(last, ""), ENDING)
+        vowel = {"ㅑ": "ㅒ"}.get(medial(last), "ㅐ")
+        add(stem[:-1] + with_medial(with_final(last, ""), vowel))
+        add(stem[:-1] + with_medial(with_final(last, "ㅆ"), vowel))
+
+    infinitive = _infinitive(stem)
+    if infinitive:
+        # 가 / 서 / 보내 are their own infinitive, so they can stand alone too (가!)
+        variants[infinitive] = FREE
+        # past: 가 -> 갔, 해 -> 했, 봐 -> 봤
+        add(infinitive[:-1] + with_final(infinitive[-1], "ㅆ"))
+    return variants
+
+
+def _fits(need, remainder):
+    """remainder (the rest of the word) can follow a stem variant that needs need"""
+    if not remainder:
+        return need is FREE
+    if not (_is_chain(remainder) if need is FREE else _is_stem_chain(remainder)):
+        return False
+    if need == VOWEL:
+        return is_syllable(remainder[0]) and INITIALS[decompose(remainder[0])[0]] == "ㅇ"
+    if need == NBS:
+        return remainder[0] == "오" or (is_syllable(remainder[0])
+                                        and INITIALS[decompose(remainder[0])[0]] in "ㄴㅂㅅ")
+    return True
+
+
+class _Trie:
+    """character trie: surface -> list of values"""
+
+    _END = ""
+
+    def __init__(self):
+        self.root = {}
+
+    def add(self, surface, value):
+        node = self.root
+        for ch in surface:
+            node = node.setdefault(ch, {})
+        node.setdefault(self._END, []).append(value)
+
+    def prefixes(self, text, start=0):
+        """[(end, values)] for every surface in the trie that text[start:] starts with, shortest first"""
+        found = []
+        node = self.root
+        for i in range(start, len(text)):
+            node = node.get(text[i])
+            if node is None:
+                break
+            values = node.get(self._END)
+            if values:
+                found.append((i + 1, values))
+        return found
+
+
+class LexiconTagger(Tagger):
+    """longest match over the TOPIK lexicon with particle / ending rules, no jvm"""
+
+    name = "Lexicon"
+    cacheable = False  # a trie walk is cheaper than the cache lookup
+
+    def __init__(self, csv_path=CLEANED_CSV_PATH):
+        self.csv_path = Path(csv_path)
+        self._trie = None
+        self._version = None
+
+    @property
+    def version(self):
+        if self._version is None:
+            digest = hashlib.sha1(self.csv_path.read_bytes()).hexdigest()[:12]
+            self._version = f"{FAST_RULES_VERSION}-{digest}"
+        return self._version
+
+    @property
+    def trie(self):
+        if self._trie is None:
+            self._trie = self._build_trie()
+        return self._trie
+
+    def _build_trie(self):
+        trie = _Trie()
+        words = [(word, pos) for word, pos, _, _ in read_words(self.csv_path)]
+        nouns = {word for word, pos in words if pos == "Noun"}
+        seen = set()
+        for word, pos in words:
+            if (word, pos) in seen or not word or not all(map(is_syllable, word)):
+                continue
+            seen.add((word, pos))
+            if pos in PREDICATES:
+                if not word.endswith("다"):
+                    continue
+                # Okt splits noun + 하다 (공부하다 -> 공부 하다), so leave those to the noun and 하다
+                if word.endswith("하다") and word[:-2] in nouns:
+                    continue
+                for surface, need in stem_variants(word, pos).items():
+                    trie.add(surface, (word, pos, need))
+            elif pos in NOMINAL_PRIORITY:
+                trie.add(word, (word, pos, FREE))
+        # predicates Okt gives all the time that the csv may lack (하다 / 되다 after a noun, auxiliaries)
+        for word, pos in BUILTIN_PREDICATES:
+            if (word, pos) not in seen:
+                for surface, need in stem_variants(word, pos).items():
+                    trie.add(surface, (word, pos, need))
+        for word in BUILTIN_NOUNS:
+            if (word, "Noun") not in seen:
+                trie.add(word, (word, "Noun", FREE))
+        for node_values in self._iter_values(trie.root):
+            node_values.sort(key=lambda v: (v[1] not in PREDICATES, NOMINAL_PRIORITY.get(v[1], 0)))
+        return trie
+
+    @classmethod
+    def _iter_values(cls, node):
+        stack = [node]
+        while stack:
+            node = stack.pop()
+            for key, child in node.items():
+                if key == _Trie._END:
+                    yield child
+                else:
+                    stack.append(child)
+
+    def tag_lines(self, texts):
+        trie = self.trie
+        return [self._tag_text(text, trie) for text in texts]
+
+    def _tag_text(self, text, trie):
+        tags = []
+        for match in _TOKEN.finditer(text):
+            kind = match.lastgroup
+            if kind == "hangul":
+                word = match.group()
+                segments = self._segment(word, trie)
+                # a word cut into one-syllable nouns (무 방 비, 바 젤) is one the lexicon doesn't know
+                fragments = sum(1 for w, pos in segments if len(w) == 1 and pos not in PREDICATES and pos != "Josa")
+                tags.extend(self._unknown(word) if fragments > 1 else segments)
+            else:
+                tags.append((match.group(), _RUN_TAGS[kind]))
+        return tags
+
+    @staticmethod
+    def _tail(rest):
+        """the tags of what follows a noun (particles, the copula), or None when it isn't one"""
+        if rest in COPULA:
+            return [("이다", "Adjective")]
+        for n in range(min(len(rest), _LONGEST_PIECE), 0, -1):
+            if rest[:n] in _JOSA_SET and _is_chain(rest[n:]):
+                return [(rest, "Josa")]
+        return None
+
+    def _segment(self, word, trie):
+        out = []
+        starts = []  # where each nominal in out starts
+        i = 0
+        while i < len(word):
+            rest = word[i:]
+            if out and out[-1][1] not in PREDICATES:
+                tail = self._tail(rest)
+                if tail is not None:
+                    out.extend(tail)
+                    return out
+            advanced = False
+            for end, values in reversed(trie.prefixes(word, i)):
+                remainder = word[end:]
+                nominal = next((v for v in values if v[1] not in PREDICATES), None)
+                predicate = next((v for v in values if v[1] in PREDICATES and _fits(v[2], remainder)), None)
+                if nominal and predicate:
+                    # a whole word is the noun (but 와 / 아, Exclamations, go to the verb), and
+                    # noun + particle beats an irregular stem (저는 is 저 는, not 절다)
+                    if (not remainder and nominal[1] == "Noun") or (
+                            predicate[2] in (VOWEL, NBS) and self._tail(remainder) is not None):
+                        predicate = None
+                if predicate:
+                    out.append(predicate[:2])
+                    return out
+                if nominal:
+                    out.append(nominal[:2])
+                    starts.append(i)
+                    i = end
+                    advanced = True
+                    break
+            if not advanced:
+                if out and out[-1][1] not in PREDICATES:
+                    # 암 + 스테르담이고요: the noun before an unknown word was just its first syllables
+                    out.pop()
+                    rest = word[starts.pop():]
+                out.extend(self._unknown(rest))
+                return out
+        return out
+
+    def _unknown(self, rest):
+        """a word the lexicon doesn't know: a Noun, minus a particle at its end"""
+        for n in range(len(rest) - 1, 0, -1):
+            tail = self._tail(rest[n:])
+            if tail is not None:
+                return [(rest[:n], "Noun")] + tail
+        return [(rest, "Noun")]
+
+
+TAGGERS = {
+    "okt": OktTagger,
+    "fast": LexiconTagger,
+}
+
+
+def make_tagger(name=DEFAULT_TAGGER, **options):
+    """a backend by name. options go to its constructor (batch_size / verify for okt)"""
+    try:
+        cls = TAGGERS[name]
+    except KeyError:
+        raise ValueError(f"unknown tagger {name!r}, expected one of {', '.join(TAGGERS)}") from None
+    return cls(**options)
+
+
+def as_tagger(tagger):
+    """a Tagger from a backend, a backend name or a bare Okt-like object with .pos()"""
+    if isinstance(tagger, Tagger):
+        return tagger
+    if tagger is None or isinstance(tagger, str):
+        return make_tagger(tagger or DEFAULT_TAGGER)
+    return OktTagger(okt=tagger)
+
+
+def verify_batching(texts, batch_size=DEFAULT_BATCH_SIZE):
+    """tag texts batched and line by line.
+    returns (batched seconds, single seconds, [(text, batched, single)] that differ, batched stats)"""
+    single = OktTagger(batch_size=1)
+    batched = OktTagger(okt=single.okt, batch_size=batch_size)
+    single.warm_up()
+    t0 = time.perf_counter()
+    expected = single.tag_lines(texts)
+    single_seconds = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    got = batched.tag_lines(texts)
+    batched_seconds = time.perf_counter() - t0
+    mismatches = [(text, a, b) for text, a, b in zip(texts, got, expected) if a != b]
+    return batched_seconds, single_seconds, mismatches, batched.stats
+
+
+def main():
+    from pipeline.subtitle_reader import find_subtitle_files
+    from pipeline.srt_to_json import iter_subtitles
+
+    parser = argparse.ArgumentParser(description="Check that batched Okt calls tag exactly like one call per line.")
+    parser.add_argument("root", type=Path, help="Subtitle file, or folder of them (e.g. ../../raw)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Lines per Okt call")
+    parser.add_argument("--limit", type=int, default=5000, help="Lines to check (default 5000)")
+    args = parser.parse_args()
+
+    files = [args.root] if args.root.is_file() else find_subtitle_files(args.root)
+    texts = []
+    for path in files:
+        texts.extend(sub["text"] for sub in iter_subtitles(path))
+        if len(texts) >= args.limit:
+            break
+    texts = texts[:args.limit]
+
+    batched, single, mismatches, stats = verify_batching(texts, args.batch_size)
+    print(f"{len(texts)} lines: one call per line {single:.2f}s, batches of {args.batch_size} {batched:.2f}s "
+          f"({single / batched:.1f}x), {stats['calls']} calls, {stats['fallbacks']} fallbacks")
+    for text, got, expected in mismatches[:10]:
+        print(f"--- {text}\n  batched: {got}\n  single:  {expected}")
+    if mismatches:
+        print(f"❌ {len(mismatches)} line(s) tagged differently in batches")
+        sys.exit(1)
+    print("✅ batched output matches line-by-line tagging")
+
+
+if __name__ == "__main__":
+    main()
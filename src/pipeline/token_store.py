@@ -0,0 +1,307 @@
+'''
+compact binary token files (.tok), the replacement for the json/ *.jsonl
+side output.
+
+a jsonl line stores every token twice ("lemmas" and "filtered" are the
+same list) as json strings. a .tok file stores each video once, as
+columns:
+
+  words / pos tags     interned: each distinct one once, tokens refer to ids
+  token_word, token_pos  one entry per token
+  line_tokens          offsets: tokens of line i are [line_tokens[i], line_tokens[i+1])
+  line_index, line_start, line_end   subtitle index and start / end in ms (-1 = missing)
+  text_offsets, text_bytes           the utf-8 line text, same offset scheme
+
+file layout: 8 byte magic, little-endian u64 header length, a json
+header (meta, pos tags, and dtype / offset / count of each array), then
+the arrays, each 8-byte aligned. TokenStore maps the file once and takes
+numpy views of it, so opening a file parses nothing but the header.
+
+iter_entries() reads either format and yields the same dicts as the
+jsonl (index, start, end, text, lemmas, filtered), so process_tokens.py
+and the annotation tools take .tok and .jsonl alike.
+
+python token_store.py convert ../../json/*.jsonl            # writes a .tok next to each
+python token_store.py convert ../../json/*.jsonl --out-dir ../../tokens
+python token_store.py dump ../../tokens/Coffee_Prince_ep1.tok   # back to jsonl on stdout
+python token_store.py info ../../tokens/Coffee_Prince_ep1.tok
+'''
+
+import argparse
+import json
+import mmap
+import struct
+import sys
+from array import array
+from pathlib import Path
+
+import numpy as np
+
+if __package__ in (None, ""):
+    # run as a script: make src/ importable
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from database.occurrences import time_to_ms
+
+MAGIC = b"KTOK\x00\x00\x00\x01"
+FORMAT_VERSION = 1
+ALIGN = 8
+SUFFIX = ".tok"
+
+# name -> (dtype, array.array typecode used while writing)
+ARRAYS = {
+    "token_word": ("<u4", "I"),
+    "token_pos": ("<u2", "H"),
+    "line_tokens": ("<u4", "I"),
+    "line_index": ("<i4", "i"),
+    "line_start": ("<i4", "i"),
+    "line_end": ("<i4", "i"),
+    "text_offsets": ("<u4", "I"),
+    "text_bytes": ("u1", "B"),
+    "word_offsets": ("<u4", "I"),
+    "word_bytes": ("u1", "B"),
+}
+
+
+def _or_missing(value):
+    return -1 if value is None else value
+
+
+class TokenStoreWriter:
+    """collects tagged subtitle dicts and writes them as one .tok file on close()"""
+
+    def __init__(self, path, meta=None):
+        self.path = Path(path)
+        self.meta = dict(meta or {})
+        self.word_ids = {}
+        self.pos_ids = {}
+        self.columns = {name: array(typecode) for name, (_, typecode) in ARRAYS.items()}
+        self.columns["line_tokens"].append(0)
+        self.columns["text_offsets"].append(0)
+        self.columns["word_offsets"].append(0)
+
+    def _intern_word(self, word):
+        word_id = self.word_ids.get(word)
+        if word_id is None:
+            word_id = self.word_ids[word] = len(self.word_ids)
+            self.columns["word_bytes"].frombytes(word.encode("utf-8"))
+            self.columns["word_offsets"].append(len(self.columns["word_bytes"]))
+        return word_id
+
+    def _intern_pos(self, pos_tag):
+        pos_id = self.pos_ids.get(pos_tag)
+        if pos_id is None:
+            pos_id = self.pos_ids[pos_tag] = len(self.pos_ids)
+        return pos_id
+
+    def add(self, entry):
+        c = self.columns
+        for word, pos_tag in entry.get("filtered", []):
+            c["token_word"].append(self._intern_word(word))
+            c["token_pos"].append(self._intern_pos(pos_tag))
+        c["line_tokens"].append(len(c["token_word"]))
+        c["line_index"].append(_or_missing(entry.get("index")))
+        c["line_start"].append(_or_missing(time_to_ms(entry.get("start"))))
+        c["line_end"].append(_or_missing(time_to_ms(entry.get("end"))))
+        c["text_bytes"].frombytes((entry.get("text") or "").encode("utf-8"))
+        c["text_offsets"].append(len(c["text_bytes"]))
+
+    def close(self):
+        """write the file (via a temp file, so a reader never sees half of one)"""
+        arrays = {}
+        body = bytearray()
+        for name, (dtype, _) in ARRAYS.items():
+            body.extend(b"\0" * (-len(body) % ALIGN))
+            data = np.frombuffer(self.columns[name], dtype=self.columns[name].typecode).astype(dtype)
+            arrays[name] = {"dtype": dtype, "offset": len(body), "count": len(data)}
+            body.extend(data.tobytes())
+
+        header = json.dumps({
+            "version": FORMAT_VERSION,
+            "meta": self.meta,
+            "pos_tags": list(self.pos_ids),
+            "arrays": arrays,
+        }, ensure_ascii=False).encode("utf-8")
+        header += b" " * (-(len(MAGIC) + 8 + len(header)) % ALIGN)
+
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "wb") as f:
+            f.write(MAGIC)
+            f.write(struct.pack("<Q", len(header)))
+            f.write(header)
+            f.write(body)
+        tmp_path.replace(self.path)
+        return self.path
+
+
+def write_token_store(entries, path, meta=None):
+    """write tagged subtitle dicts to path, returns the number of lines"""
+    writer = TokenStoreWriter(path, meta)
+    n = 0
+    for entry in entries:
+        writer.add(entry)
+        n += 1
+    writer.close()
+    return n
+
+
+def tee_token_store(entries, path, meta=None):
+    """pass entries through unchanged, writing them to a .tok file once they run out"""
+    writer = TokenStoreWriter(path, meta)
+    for entry in entries:
+        writer.add(entry)
+        yield entry
+    writer.close()
+
+
+class TokenStore:
+    """read-only view of a .tok file. the arrays are numpy views of one mmap"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        with open(self.path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{self.path} is not a token store file")
+            (header_len,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_len).decode("utf-8"))
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if header["version"] != FORMAT_VERSION:
+            raise ValueError(f"{self.path}: format version {header['version']}, expected {FORMAT_VERSION}")
+
+        self.meta = header["meta"]
+        self.pos_tags = header["pos_tags"]
+        buf = np.frombuffer(self._mmap, dtype=np.uint8)
+        start = len(MAGIC) + 8 + header_len
+        for name, spec in header["arrays"].items():
+            dtype = np.dtype(spec["dtype"])
+            offset = start + spec["offset"]
+            setattr(self, name, buf[offset:offset + spec["count"] * dtype.itemsize].view(dtype))
+        self._words = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        # drop the views first, the mmap can't close while they point into it
+        for name in ARRAYS:
+            self.__dict__.pop(name, None)
+        try:
+            self._mmap.close()
+        except BufferError:
+            pass  # a caller still holds one of the arrays, the map goes when it does
+
+    def __len__(self):
+        return len(self.line_tokens) - 1
+
+    @property
+    def words(self):
+        """interned words, decoded on first use"""
+        if self._words is None:
+            blob = self.word_bytes.tobytes()
+            offsets = self.word_offsets.tolist()
+            self._words = [blob[a:b].decode("utf-8") for a, b in zip(offsets, offsets[1:])]
+        return self._words
+
+    def text(self, i):
+        return self.text_bytes[self.text_offsets[i]:self.text_offsets[i + 1]].tobytes().decode("utf-8")
+
+    def tokens(self, i):
+        """[(word, pos_tag)] of line i"""
+        a, b = self.line_tokens[i], self.line_tokens[i + 1]
+        words, pos_tags = self.words, self.pos_tags
+        return [(words[w], pos_tags[p]) for w, p in zip(self.token_word[a:b].tolist(), self.token_pos[a:b].tolist())]
+
+    def entry(self, i):
+        """line i as the dict srt_to_json yields (start / end in ms)"""
+        tokens = self.tokens(i)
+        index, start, end = int(self.line_index[i]), int(self.line_start[i]), int(self.line_end[i])
+        return {
+            "index": None if index < 0 else index,
+            "start": None if start < 0 else start,
+            "end": None if end < 0 else end,
+            "text": self.text(i),
+            "lemmas": tokens,
+            "filtered": tokens,
+        }
+
+    def __iter__(self):
+        # same dicts as entry(i), but with every column converted to python once
+        words, pos_tags = self.words, self.pos_tags
+        tokens = list(zip([words[w] for w in self.token_word.tolist()],
+                          [pos_tags[p] for p in self.token_pos.tolist()]))
+        line_tokens = self.line_tokens.tolist()
+        text_offsets = self.text_offsets.tolist()
+        blob = self.text_bytes.tobytes()
+        for i, (index, start, end) in enumerate(zip(self.line_index.tolist(), self.line_start.tolist(),
+                                                     self.line_end.tolist())):
+            line = tokens[line_tokens[i]:line_tokens[i + 1]]
+            yield {
+                "index": None if index < 0 else index,
+                "start": None if start < 0 else start,
+                "end": None if end < 0 else end,
+                "text": blob[text_offsets[i]:text_offsets[i + 1]].decode("utf-8"),
+                "lemmas": line,
+                "filtered": line,
+            }
+
+
+def iter_entries(path):
+    """tagged subtitle dicts from a .tok or a .jsonl file"""
+    path = Path(path)
+    if path.suffix == SUFFIX:
+        with TokenStore(path) as store:
+            yield from store
+        return
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def convert_jsonl(jsonl_path, out_path=None):
+    """jsonl -> .tok (next to it unless out_path is given). returns (out_path, lines)"""
+    jsonl_path = Path(jsonl_path)
+    out_path = Path(out_path) if out_path is not None else jsonl_path.with_suffix(SUFFIX)
+    n = write_token_store(iter_entries(jsonl_path), out_path, meta={"source": jsonl_path.name})
+    return out_path, n
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert, dump and inspect .tok token files.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    convert = sub.add_parser("convert", help="jsonl -> .tok")
+    convert.add_argument("files", nargs="+", help="jsonl files")
+    convert.add_argument("--out-dir", type=Path, help="Write the .tok files here instead of next to the jsonl")
+    dump = sub.add_parser("dump", help=".tok -> jsonl on stdout")
+    dump.add_argument("file")
+    info = sub.add_parser("info", help="Sizes and counts of a .tok file")
+    info.add_argument("file")
+    args = parser.parse_args()
+
+    if args.command == "convert":
+        if args.out_dir:
+            args.out_dir.mkdir(parents=True, exist_ok=True)
+        for jsonl_path in map(Path, args.files):
+            out_path = args.out_dir / jsonl_path.with_suffix(SUFFIX).name if args.out_dir else None
+            out_path, n = convert_jsonl(jsonl_path, out_path)
+            ratio = out_path.stat().st_size / max(jsonl_path.stat().st_size, 1)
+            print(f"✅ {jsonl_path.name} -> {out_path} ({n} lines, {ratio:.0%} of the jsonl size)")
+
+    elif args.command == "dump":
+        for entry in iter_entries(args.file):
+            sys.stdout.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    else:
+        with TokenStore(args.file) as store:
+            print(f"{store.path.name}: {len(store)} lines, {len(store.token_word)} tokens, "
+                  f"{len(store.words)} distinct words, {len(store.pos_tags)} pos tags, "
+                  f"{store.path.stat().st_size} bytes")
+            if store.meta:
+                print(f"meta: {store.meta}")
+
+
+if __name__ == "__main__":
+    main()